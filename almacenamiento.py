@@ -0,0 +1,42 @@
+import hashlib
+import os
+import tempfile
+
+# --- ALMACENAMIENTO DE ADJUNTOS POR CONTENIDO ---
+# Cada archivo se guarda una sola vez, con su SHA-256 como nombre, repartido en subcarpetas
+# (fotos_activos/ab/cd/abcd...jpg) para que ningún directorio crezca sin límite. La tabla blobs
+# lleva cuántas filas de fotos/documentos apuntan a cada archivo (la mantienen los triggers).
+
+CARPETAS = {'foto': 'fotos_activos', 'doc': 'docs_activos'}
+TAMANO_BLOQUE = 1024 * 1024
+
+def ruta_blob(carpeta, sha256, ext):
+    return os.path.join(carpeta, sha256[:2], sha256[2:4], f"{sha256}{ext.lower()}")
+
+def guardar_blob(archivo, tipo, nombre=None):
+    # Se escribe a un temporal mientras se calcula el hash, bloque a bloque, sin copiar todo en memoria
+    carpeta = CARPETAS[tipo]
+    ext = os.path.splitext(nombre or getattr(archivo, 'name', ''))[1]
+    if hasattr(archivo, 'seek'): archivo.seek(0)
+    sha, tamano = hashlib.sha256(), 0
+    with tempfile.NamedTemporaryFile(dir=carpeta, prefix='.subida_', delete=False) as tmp:
+        for bloque in iter(lambda: archivo.read(TAMANO_BLOQUE), b''):
+            sha.update(bloque)
+            tmp.write(bloque)
+            tamano += len(bloque)
+    digest = sha.hexdigest()
+    ruta = ruta_blob(carpeta, digest, ext)
+    try:
+        # Contenido repetido: se reutiliza el archivo existente. La fecha nueva evita que mantenimiento.py
+        # lo tome por huérfano antes de que se registre la nueva referencia.
+        os.utime(ruta)
+        os.remove(tmp.name)
+        return ruta, digest, tamano, False
+    except FileNotFoundError:
+        pass
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    os.replace(tmp.name, ruta)
+    return ruta, digest, tamano, True
+
+def registrar_blob(conn, ruta, sha256, tamano):
+    conn.execute("INSERT OR IGNORE INTO blobs (path, sha256, tamano) VALUES (?,?,?)", (ruta, sha256, tamano))
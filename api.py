@@ -0,0 +1,217 @@
+import argparse
+import gzip
+import hashlib
+import hmac
+import json
+import logging
+import os
+import re
+from datetime import date, datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+import base_datos
+from base_datos import conectar_db
+from consultas import construir_filtros, filtros_historial
+
+# --- API JSON DE SOLO LECTURA ---
+# Servicio HTTP aparte de app.py para integraciones (mantenimiento, GPS de flota) que hoy leen la
+# interfaz o copian inventario.db. Usa el mismo pool y los mismos filtros que el dashboard; sus
+# conexiones abren con PRAGMA query_only, así que nunca escribe ni toma el bloqueo de escritura.
+# Cada respuesta lleva un ETag armado con contador_cambios: quien repite la consulta con
+# If-None-Match recibe 304 sin que se ejecute la consulta, mientras los datos no hayan cambiado.
+# Uso: python api.py --puerto 8502   (con INVENTARIO_API_TOKEN se exige "Authorization: Bearer ...")
+#
+#   GET /activos?categoria=&pais=&estado=&ubicacion=&q=&cambiados_desde=&despues=&limite=
+#   GET /activos/<id>            activo con sus fotos y documentos
+#   GET /ubicaciones?pais=
+#   GET /historial?id_activo=&pais=&destino=&desde=&hasta=&despues=&limite=
+#   GET /fotos?id_activo=&despues=&limite=    GET /documentos?id_activo=&despues=&limite=
+# Las listas se paginan por rowid: "siguiente" es el valor de "despues" para la página que sigue.
+
+TOKEN = os.environ.get('INVENTARIO_API_TOKEN')
+LIMITE_POR_DEFECTO = 100
+LIMITE_MAXIMO = 1000
+MIN_BYTES_GZIP = 1024
+NIVEL_GZIP = 5
+COLUMNAS_ACTIVOS = "id, placa, marca, modelo, categoria, pais, ubicacion, estado, motivo_estado, descripcion, ultima_revision, proxima_revision, version"
+
+_log = logging.getLogger('inventario.api')
+
+class ErrorApi(Exception):
+    def __init__(self, estado, mensaje):
+        super().__init__(mensaje)
+        self.estado = estado
+
+def _solo_lectura(conn):
+    conn.execute("PRAGMA query_only=ON")
+
+# --- PARÁMETROS ---
+def _texto(params, nombre):
+    valor = params.get(nombre, [""])[0].strip()
+    return valor or None
+
+def _entero(params, nombre, defecto=None, maximo=None):
+    valor = _texto(params, nombre)
+    if valor is None: return defecto
+    try: numero = int(valor)
+    except ValueError: raise ErrorApi(400, f"'{nombre}' debe ser un número entero")
+    if numero < 0: raise ErrorApi(400, f"'{nombre}' no puede ser negativo")
+    return min(numero, maximo) if maximo else numero
+
+def _fecha(params, nombre):
+    valor = _texto(params, nombre)
+    if valor is None: return None
+    try: return date.fromisoformat(valor)
+    except ValueError: raise ErrorApi(400, f"'{nombre}' debe tener formato AAAA-MM-DD")
+
+def _limite(params):
+    limite = _entero(params, "limite", LIMITE_POR_DEFECTO, LIMITE_MAXIMO)
+    if limite < 1: raise ErrorApi(400, "'limite' debe ser al menos 1")
+    return limite
+
+def _pagina(conn, sql, condiciones, params_sql, despues, limite, rowid="rowid"):
+    # Keyset sobre rowid: cada página cuesta lo mismo sin importar en qué punto de la tabla esté
+    condiciones, params_sql = list(condiciones), list(params_sql)
+    if despues is not None:
+        condiciones.append(f"{rowid} > ?"); params_sql.append(despues)
+    where = f" WHERE {' AND '.join(condiciones)}" if condiciones else ""
+    cursor = conn.execute(f"{sql}{where} ORDER BY {rowid} LIMIT ?", params_sql + [limite + 1])
+    columnas = [d[0] for d in cursor.description]
+    filas = [dict(zip(columnas, f)) for f in cursor]
+    siguiente = None
+    if len(filas) > limite:
+        filas = filas[:limite]
+        siguiente = filas[-1]["rowid_k"]
+    for fila in filas: del fila["rowid_k"]
+    return {"datos": filas, "siguiente": siguiente}
+
+def _adjuntos(conn, tabla, id_activo, despues, limite):
+    # Metadatos del archivo (hash y tamaño) desde blobs; el contenido no se sirve por la API
+    nombre = "t.nombre_real" if tabla == "documentos" else "NULL"
+    condiciones, params_sql = (["t.id_activo = ?"], [id_activo]) if id_activo else ([], [])
+    return _pagina(conn, f"""SELECT t.rowid AS rowid_k, t.id_activo, t.path, {nombre} AS nombre, b.sha256, b.tamano
+                             FROM {tabla} t LEFT JOIN blobs b ON b.path = t.path""",
+                   condiciones, params_sql, despues, limite, rowid="t.rowid")
+
+# --- RECURSOS ---
+def _activos(conn, params):
+    where, params_sql = construir_filtros(categoria=_texto(params, "categoria"), pais=_texto(params, "pais"),
+                                          estado=_texto(params, "estado"), ubicacion=_texto(params, "ubicacion"),
+                                          busqueda=_texto(params, "q"))
+    condiciones = [where[len(" WHERE "):]] if where else []
+    cambiados_desde = _entero(params, "cambiados_desde")
+    if cambiados_desde is not None:
+        condiciones.append("version > ?"); params_sql.append(cambiados_desde)
+    return _pagina(conn, f"SELECT rowid AS rowid_k, {COLUMNAS_ACTIVOS} FROM activos", condiciones, params_sql,
+                   _entero(params, "despues"), _limite(params))
+
+def _activo(conn, params, id_activo):
+    cursor = conn.execute(f"SELECT {COLUMNAS_ACTIVOS} FROM activos WHERE id = ?", (id_activo,))
+    fila = cursor.fetchone()
+    if fila is None: raise ErrorApi(404, f"No existe el activo '{id_activo}'")
+    activo = dict(zip([d[0] for d in cursor.description], fila))
+    for tabla in ("fotos", "documentos"):
+        activo[tabla] = _adjuntos(conn, tabla, id_activo, None, LIMITE_MAXIMO)["datos"]
+    return activo
+
+def _ubicaciones(conn, params):
+    pais = _texto(params, "pais")
+    where, params_sql = (" WHERE pais = ?", [pais]) if pais else ("", [])
+    return {"datos": [{"nombre": n, "pais": p} for n, p in conn.execute(f"SELECT nombre, pais FROM ubicaciones{where} ORDER BY pais, nombre", params_sql)]}
+
+def _historial(conn, params):
+    condiciones, params_sql = filtros_historial(id_activo=_texto(params, "id_activo"), pais=_texto(params, "pais"),
+                                                destino=_texto(params, "destino"), desde=_fecha(params, "desde"), hasta=_fecha(params, "hasta"))
+    return _pagina(conn, "SELECT rowid AS rowid_k, rowid AS id, id_activo, origen, destino, fecha, motivo FROM historial",
+                   condiciones, params_sql, _entero(params, "despues"), _limite(params))
+
+def _lista_adjuntos(tabla):
+    def responder(conn, params):
+        return _adjuntos(conn, tabla, _texto(params, "id_activo"), _entero(params, "despues"), _limite(params))
+    return responder
+
+# Ruta, contadores de contador_cambios de los que depende la respuesta (ETag) y función que responde
+RUTAS = [
+    (re.compile(r"^/activos$"), ("activos",), _activos),
+    (re.compile(r"^/activos/(?P<id_activo>[^/]+)$"), ("activos", "fotos", "documentos"), _activo),
+    (re.compile(r"^/ubicaciones$"), ("ubicaciones",), _ubicaciones),
+    (re.compile(r"^/historial$"), ("historial",), _historial),
+    (re.compile(r"^/fotos$"), ("fotos",), _lista_adjuntos("fotos")),
+    (re.compile(r"^/documentos$"), ("documentos",), _lista_adjuntos("documentos")),
+]
+
+# --- HTTP ---
+def _json(valor):
+    if isinstance(valor, (datetime, date)): return valor.isoformat()
+    raise TypeError(f"No se puede convertir {type(valor).__name__} a JSON")
+
+class ManejadorApi(BaseHTTPRequestHandler):
+    server_version = "InventarioAPI/1.0"
+
+    def _enviar(self, estado, cuerpo=None, etag=None):
+        datos = b"" if cuerpo is None else json.dumps(cuerpo, ensure_ascii=False, default=_json).encode("utf-8")
+        self.send_response(estado)
+        if etag:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")  # se puede guardar, pero siempre se revalida
+        if cuerpo is not None:
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Vary", "Accept-Encoding")
+            if len(datos) >= MIN_BYTES_GZIP and "gzip" in self.headers.get("Accept-Encoding", ""):
+                datos = gzip.compress(datos, NIVEL_GZIP)
+                self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def _autorizado(self):
+        if not TOKEN: return True
+        return hmac.compare_digest(self.headers.get("Authorization", ""), f"Bearer {TOKEN}")
+
+    def do_GET(self):
+        try:
+            if not self._autorizado(): raise ErrorApi(401, "Token inválido o ausente")
+            partes = urlsplit(self.path)
+            ruta = unquote(partes.path).rstrip("/") or "/"
+            for patron, tablas, responder in RUTAS:
+                coincidencia = patron.match(ruta)
+                if coincidencia: break
+            else:
+                raise ErrorApi(404, f"Ruta desconocida: {ruta}")
+            params = parse_qs(partes.query)
+            with conectar_db() as conn:
+                # Contadores y datos en la misma transacción de lectura: el ETag describe lo que se envía
+                conn.execute("BEGIN")
+                versiones = dict(conn.execute(f"SELECT tabla, version FROM contador_cambios WHERE tabla IN ({','.join('?' * len(tablas))})", tablas))
+                firma = json.dumps([ruta, sorted(partes.query.split("&")), [versiones.get(t) for t in tablas]])
+                etag = f'W/"{hashlib.sha1(firma.encode()).hexdigest()[:20]}"'
+                if etag in [e.strip() for e in self.headers.get("If-None-Match", "").split(",")]:
+                    self._enviar(304, etag=etag)
+                    return
+                cuerpo = responder(conn, params, **coincidencia.groupdict())
+            self._enviar(200, cuerpo, etag)
+        except ErrorApi as e:
+            self._enviar(e.estado, {"error": str(e)})
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # el cliente cerró la conexión
+        except Exception:
+            # Nunca se corta la conexión sin respuesta: el detalle queda en el log del servidor
+            _log.exception("Error no controlado en %s", self.path)
+            self._enviar(500, {"error": "Error interno del servidor"})
+
+def crear_servidor(host, puerto):
+    base_datos.inicializar_db()  # las migraciones escriben: antes de que las conexiones queden en solo lectura
+    base_datos.cerrar_pool()
+    base_datos.al_conectar(_solo_lectura)
+    return ThreadingHTTPServer((host, puerto), ManejadorApi)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="API JSON de solo lectura sobre el inventario.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=8502)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    servidor = crear_servidor(args.host, args.puerto)
+    print(f"API en http://{args.host}:{args.puerto}")
+    try: servidor.serve_forever()
+    except KeyboardInterrupt: pass
@@ -1,9 +1,26 @@
 import streamlit as st
 import sqlite3
 import pandas as pd
+import plotly.express as px
 import os
-import base64
-from datetime import datetime
+import uuid
+import hmac
+import html
+import zlib
+from datetime import date, datetime, timedelta
+from almacenamiento import guardar_blob
+from base_datos import BaseOcupada, conectar_db, inicializar_db
+from consultas import (DIAS_SEMANA, adjuntos_por_activo, buscar_activos, contar_activos, conteos_por_pais, eliminados_por_mes,
+                       en_reparacion_por_mes, estado_por_pais, historial_por_activo, intervalos_revision, pagina_activos,
+                       pagina_eliminados, pagina_grilla, pagina_historial, pagina_revisiones, resumen_revisiones, revisiones_csv)
+import diagnostico
+import mantenimiento
+from documentos import encolar_portadas, portada_disponible, url_documento, url_miniatura
+from imagenes import encolar_rendiciones, ruta_para_mostrar
+from importacion import insertar, leer_archivo, plantilla_csv, validar
+from instantanea import activos_en_cache, ubicaciones_en_cache
+from operaciones import (actualizar_intervalos, cambiar_estado_activos, crear_ubicacion, editar_activo, eliminar_activo,
+                         eliminar_ubicacion, registrar_activo, renombrar_ubicacion, trasladar_activos)
 
 # --- CONFIGURACIÓN ---
 st.set_page_config(page_title="SISTEMA GESTIÓN TRIMECA", layout="wide", initial_sidebar_state="collapsed")
@@ -12,90 +29,96 @@ for carpeta in ['fotos_activos', 'docs_activos']:
     if not os.path.exists(carpeta): os.makedirs(carpeta)
 
 # --- BASE DE DATOS ---
-def conectar_db():
-    return sqlite3.connect('inventario.db', check_same_thread=False, timeout=60)
-
-def inicializar_db():
-    with conectar_db() as conn:
-        c = conn.cursor()
-        c.execute('''CREATE TABLE IF NOT EXISTS activos (
-                        id TEXT PRIMARY KEY, descripcion TEXT, ubicacion TEXT, 
-                        ultima_revision DATE, estado TEXT, modelo TEXT, 
-                        marca TEXT, motivo_estado TEXT, categoria TEXT, pais TEXT,
-                        placa TEXT)''') # Se agrega campo placa a la creación inicial
-        
-        # Lista de columnas para actualización automática de DB existente
-        for col in [("categoria", "TEXT"), ("pais", "TEXT"), ("placa", "TEXT")]:
-            try: c.execute(f"ALTER TABLE activos ADD COLUMN {col[0]} {col[1]}")
-            except sqlite3.OperationalError: pass
-
-        c.execute('''CREATE TABLE IF NOT EXISTS ubicaciones (
-                        nombre TEXT, 
-                        pais TEXT, 
-                        PRIMARY KEY (nombre, pais))''')
-        conn.commit()
-
-        c.execute('''CREATE TABLE IF NOT EXISTS fotos (id_activo TEXT, path TEXT)''')
-        c.execute('''CREATE TABLE IF NOT EXISTS documentos (id_activo TEXT, path TEXT, nombre_real TEXT)''')
-        c.execute('''CREATE TABLE IF NOT EXISTS historial (id_activo TEXT, origen TEXT, destino TEXT, fecha TIMESTAMP, motivo TEXT)''')
-        c.execute('''CREATE TABLE IF NOT EXISTS activos_eliminados (id TEXT, ubicacion TEXT, fecha_eliminacion TIMESTAMP, motivo TEXT)''')
-        conn.commit()
-
 inicializar_db()
+mantenimiento.iniciar_programador()
 
 # --- LISTAS DE DATOS ---
 CATEGORIAS_LISTA = ["Maquinaria Pesada", "Maquinaria Ligera", "Vehículos (Flota)", "Equipos Industriales/Planta", "Equipos de T.I."]
 PAISES_LISTA = ["VENEZUELA", "COLOMBIA", "ESTADOS UNIDOS"]
 ITEMS_POR_PAGINA = 5
+FILAS_POR_PAGINA_GRILLA = [50, 100, 200, 500]
+ICONOS_ESTADO = {"OPERATIVO": "🟢", "DAÑADO": "🔴"}  # cualquier otro estado (REPARACION) va en amarillo
+COLUMNAS_GRILLA = {"miniatura": st.column_config.ImageColumn("FOTO", width="small"), "estado": "ESTADO", "id": "ID", "placa": "PLACA",
+                   "ubicacion": "UBICACIÓN", "marca": "MARCA", "modelo": "MODELO", "ultima_revision": "REVISIÓN", "proxima_revision": "PRÓXIMA"}
+FILAS_REVISIONES = 50
+VENTANAS_REVISION = {"VENCIDOS": (None, 0), "VENCIDOS Y ESTA SEMANA": (None, DIAS_SEMANA),
+                     "PRÓXIMOS 30 DÍAS": (0, 30)}  # (desde, hasta) en días contados desde hoy
 
 # --- FUNCIONES DE APOYO ---
-def display_pdf(file_path):
-    with open(file_path, "rb") as f:
-        base64_pdf = base64.b64encode(f.read()).decode('utf-8')
-    pdf_display = f'<iframe src="data:application/pdf;base64,{base64_pdf}" width="100%" height="600" type="application/pdf"></iframe>'
-    st.markdown(pdf_display, unsafe_allow_html=True)
-
-def guardar_archivos(id_activo, archivos, tipo):
-    carpeta = 'fotos_activos' if tipo == 'foto' else 'docs_activos'
-    with conectar_db() as conn:
-        for idx, arc in enumerate(archivos):
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            ext = os.path.splitext(arc.name)[1]
-            ruta = os.path.join(carpeta, f"{id_activo}_{idx}_{timestamp}{ext}")
-            with open(ruta, "wb") as f: f.write(arc.getbuffer())
-            if tipo == 'foto': conn.execute("INSERT INTO fotos (id_activo, path) VALUES (?,?)", (id_activo, ruta))
-            else: conn.execute("INSERT INTO documentos (id_activo, path, nombre_real) VALUES (?,?,?)", (id_activo, ruta, arc.name))
-        conn.commit()
+def guardar(operacion, *args):
+    # Toda escritura desde la interfaz pasa por aquí: si la base está ocupada se avisa y se corta el rerun
+    try: return operacion(*args)
+    except BaseOcupada as e:
+        st.warning(f"⏳ {e}"); st.stop()
+
+def display_pdf(url):
+    # El navegador pide el archivo al servidor estático (por rangos); no pasa por el websocket
+    pdf_display = f'<iframe src="{url}" width="100%" height="600" type="application/pdf"></iframe>'
+    with diagnostico.seccion("pdf"): st.markdown(pdf_display, unsafe_allow_html=True)
+
+def paginar_por_cursor(clave, cargar_pagina, firma_filtros=None, mostrar=None):
+    # Guarda el cursor de inicio de cada página visitada; al cambiar los filtros se vuelve a la primera.
+    # Se usa dentro de un fragmento: cambiar de página solo re-ejecuta ese listado.
+    if st.session_state.get(f"{clave}_firma") != firma_filtros or f"{clave}_cursores" not in st.session_state:
+        st.session_state[f"{clave}_cursores"] = [None]
+        st.session_state[f"{clave}_firma"] = firma_filtros
+    cursores = st.session_state[f"{clave}_cursores"]
+    df_pag, siguiente = cargar_pagina(cursores[-1])
+    if df_pag.empty and len(cursores) == 1: return df_pag
+    if mostrar: mostrar(df_pag, cursores[-1])
+    else: st.dataframe(df_pag, use_container_width=True, hide_index=True)
+    c_p1, c_p2, c_p3 = st.columns([1, 2, 1])
+    if len(cursores) > 1:
+        c_p1.button("⬅️ Anterior", key=f"prev_{clave}", use_container_width=True, on_click=cursores.pop)
+    c_p2.caption(f"<center>Página {len(cursores)}</center>", unsafe_allow_html=True)
+    if siguiente is not None:
+        c_p3.button("Siguiente ➡️", key=f"next_{clave}", use_container_width=True, on_click=cursores.append, args=(siguiente,))
+    return df_pag
+
+def guardar_archivos(archivos, tipo):
+    # Los archivos se escriben antes de encolar la escritura en la base; el mismo contenido se guarda una sola vez
+    guardados = []
+    for arc in archivos or []:
+        ruta, sha, tamano, _ = guardar_blob(arc, tipo)
+        guardados.append((ruta, sha, tamano, arc.name))
+    return guardados
+
+def procesar_archivos(fotos, docs):
+    # Miniatura, vista y portada de PDF se generan en segundo plano; mientras tanto se muestra el original
+    encolar_rendiciones([ruta for ruta, _, _, _ in fotos])
+    encolar_portadas([ruta for ruta, _, _, _ in docs])
 
 # --- DIÁLOGOS ---
 @st.dialog("VISOR")
 def visor_documento(path, nombre):
     st.write(f"### {nombre}")
-    if path.lower().endswith('.pdf'): display_pdf(path)
+    if not os.path.exists(path):
+        st.error("❌ **El archivo ya no existe en el servidor.**"); return
+    url = url_documento(path)
+    if path.lower().endswith('.pdf'):
+        portada = portada_disponible(path)
+        # Con portada, el PDF completo solo se pide si el usuario lo abre
+        if portada and not st.session_state.get(f"pdf_completo_{path}"):
+            st.image(portada, use_container_width=True)
+            if st.button("📖 VER DOCUMENTO COMPLETO", key=f"ver_pdf_{path}", use_container_width=True):
+                st.session_state[f"pdf_completo_{path}"] = True; st.rerun(scope="fragment")
+        else: display_pdf(url)
     else: st.info("**Vista previa solo disponible para archivos PDF.**")
-    with open(path, "rb") as f: st.download_button("📥 DESCARGAR", f, file_name=nombre, key=f"dl_{path}")
+    # Enlace al archivo estático (no pasa por la memoria del proceso); "download" guarda con el nombre original
+    st.markdown(f'<a href="{html.escape(url)}" download="{html.escape(nombre)}">📥 DESCARGAR {html.escape(nombre)}</a>', unsafe_allow_html=True)
 
 @st.dialog("ELIMINAR ACTIVO")
 def confirmar_eliminar_activo(activo_id):
     st.error(f"⚠️ ¿Desea eliminar permanentemente el activo **{activo_id}**?")
     if st.button("ELIMINAR", use_container_width=True):
-        with conectar_db() as conn:
-            res = conn.execute("SELECT ubicacion FROM activos WHERE id=?", (activo_id,)).fetchone()
-            ubi_act = res[0] if res else "DESCONOCIDA"
-            conn.execute("INSERT INTO activos_eliminados (id, ubicacion, fecha_eliminacion, motivo) VALUES (?, ?, ?, ?)", (activo_id, ubi_act, datetime.now(), "ELIMINACIÓN MANUAL"))
-            conn.execute("DELETE FROM activos WHERE id=?", (activo_id,))
-            conn.execute("DELETE FROM fotos WHERE id_activo=?", (activo_id,))
-            conn.execute("DELETE FROM documentos WHERE id_activo=?", (activo_id,))
-            conn.commit()
+        guardar(eliminar_activo, activo_id)
         st.success("Activo eliminado."); st.rerun()
 
 @st.dialog("ELIMINAR UBICACIÓN")
 def confirmar_eliminacion_ubi(nombre, pais):
     st.warning(f"¿Eliminar **{nombre}** en **{pais}**?")
     if st.button("ELIMINAR"):
-        with conectar_db() as conn:
-            conn.execute("DELETE FROM ubicaciones WHERE nombre=? AND pais=?", (nombre, pais))
-            conn.commit()
+        guardar(eliminar_ubicacion, nombre, pais)
         st.success("Ubicación eliminada."); st.rerun()
 
 @st.dialog("EDITAR UBICACIÓN")
@@ -104,19 +127,290 @@ def editar_ubicacion_dialog(nombre_actual, pais_actual):
     nuevo_nombre = st.text_input("NUEVO NOMBRE", value=nombre_actual).upper()
     if st.button("GUARDAR CAMBIOS", use_container_width=True):
         if nuevo_nombre and nuevo_nombre != nombre_actual:
-            with conectar_db() as conn:
-                try:
-                    conn.execute("UPDATE ubicaciones SET nombre=? WHERE nombre=? AND pais=?", (nuevo_nombre, nombre_actual, pais_actual))
-                    conn.execute("UPDATE activos SET ubicacion=? WHERE ubicacion=? AND pais=?", (nuevo_nombre, nombre_actual, pais_actual))
-                    conn.commit()
-                    st.success("**Ubicación actualizada con éxito.**"); st.rerun()
-                except sqlite3.IntegrityError:
-                    st.error(f"❌ **Error: Ya existe una ubicación llamada '{nuevo_nombre}' en {pais_actual}.**")
+            try:
+                guardar(renombrar_ubicacion, nombre_actual, pais_actual, nuevo_nombre)
+                st.success("**Ubicación actualizada con éxito.**"); st.rerun()
+            except sqlite3.IntegrityError:
+                st.error(f"❌ **Error: Ya existe una ubicación llamada '{nuevo_nombre}' en {pais_actual}.**")
+
+
+# --- FRAGMENTOS ---
+# La pestaña de cada país, cada tarjeta de activo y su carrusel, el historial de movimientos y los
+# listados se re-ejecutan por separado: un filtro, un cambio de página o de foto solo vuelve a correr
+# el fragmento que lo contiene. Los botones cambian el estado con on_click en lugar de st.rerun(),
+# que volvería a ejecutar el script completo.
+
+def desplazar(clave, paso):
+    st.session_state[clave] = st.session_state.get(clave, 0) + paso
+
+def alternar_edicion(id_activo):
+    if st.session_state.pop(f"edit_{id_activo}", None) is None: st.session_state[f"edit_{id_activo}"] = True
+
+@st.fragment
+def carrusel_fotos(id_activo, fotos):
+    idx = st.session_state.get(f"idx_{id_activo}", 0)
+    with diagnostico.seccion("imagen"): st.image(ruta_para_mostrar(fotos[idx % len(fotos)]), use_container_width=True)
+    ca, cb = st.columns(2)
+    ca.button("⬅️", key=f"prev_{id_activo}", on_click=desplazar, args=(f"idx_{id_activo}", -1))
+    cb.button("➡️", key=f"next_{id_activo}", on_click=desplazar, args=(f"idx_{id_activo}", 1))
+
+@st.fragment
+def tarjeta_activo(row, fotos_activo, docs_activo, movimientos, df_todas_ubis, expandida=False):
+    color = ICONOS_ESTADO.get(row['estado'], "🟡")
+    with st.expander(f"{color} ID: {row['id']} | {row['categoria']} | {row['marca']}", expanded=expandida):
+
+        if f"edit_{row['id']}" in st.session_state:
+            with st.form(f"form_edit_{row['id']}"):
+                st.subheader("✏️ EDITAR ACTIVO")
+                # --- NOTA: PLACA NO SE AGREGO A EDICIÓN POR PETICIÓN ESTRICTA DE SOLO MODIFICAR REGISTRO ---
+                c1, c2 = st.columns(2)
+                emarc = c1.text_input("MARCA", str(row['marca'] or "")).upper()
+                emod = c2.text_input("MODELO", str(row['modelo'] or "")).upper()
+                ecat = st.selectbox("CATEGORÍA", CATEGORIAS_LISTA, index=CATEGORIAS_LISTA.index(row['categoria']) if row['categoria'] in CATEGORIAS_LISTA else 0)
+                epais = st.selectbox("PAÍS", PAISES_LISTA, index=PAISES_LISTA.index(row['pais']) if row['pais'] in PAISES_LISTA else 0)
+                est_list = ["OPERATIVO", "DAÑADO", "REPARACION"]
+                eest = st.selectbox("ESTADO", est_list, index=est_list.index(row['estado']) if row['estado'] in est_list else 0)
+
+                try: fecha_actual = datetime.strptime(str(row['ultima_revision']), '%Y-%m-%d').date()
+                except: fecha_actual = datetime.now().date()
+                erev = st.date_input("FECHA ÚLTIMA REVISIÓN", fecha_actual)
+
+                emot = st.text_input("MOTIVO / ESTADO", str(row['motivo_estado'] or "")).upper()
+                ubis_edit = df_todas_ubis[df_todas_ubis['pais'] == epais]['nombre'].tolist()
+                eubi = st.selectbox("UBICACIÓN", ubis_edit, index=ubis_edit.index(row['ubicacion']) if row['ubicacion'] in ubis_edit else 0)
+                edesc = st.text_area("DESCRIPCIÓN", str(row['descripcion'] or "")).upper()
+
+                st.write("---")
+                st.write("🗑️ **ELIMINAR ARCHIVOS EXISTENTES**")
+                eliminar_fotos = []
+                for f_p in fotos_activo:
+                    if st.checkbox(f"**ELIMINAR FOTO**: {os.path.basename(f_p)}", key=f"del_f_box_{row['id']}_{f_p}"):
+                        eliminar_fotos.append(f_p)
+
+                eliminar_docs = []
+                for d_p, d_n in docs_activo:
+                    if st.checkbox(f"**ELIMINAR DOCUMENTO**: {d_n}", key=f"del_d_box_{row['id']}_{d_p}"):
+                        eliminar_docs.append(d_p)
+
+                st.write("➕ **AÑADIR ARCHIVOS**")
+                f, cd = st.columns(2)
+                nuevas_fotos = f.file_uploader("SUBIR FOTOS", accept_multiple_files=True, type=['png', 'jpg', 'jpeg', 'webp'], key=f"nf_edit_{row['id']}")
+                nuevos_docs = cd.file_uploader("SUBIR DOCUMENTOS", accept_multiple_files=True, type=['pdf', 'docx', 'xlsx', 'xls', 'txt'], key=f"nd_edit_{row['id']}")
+
+                if st.form_submit_button("💾 GUARDAR CAMBIOS"):
+                    fotos_nuevas, docs_nuevos = guardar_archivos(nuevas_fotos, 'foto'), guardar_archivos(nuevos_docs, 'doc')
+                    # Datos, archivos quitados y archivos nuevos se aplican en una sola transacción
+                    guardar(editar_activo, row['id'], dict(marca=emarc, modelo=emod, estado=eest, motivo_estado=emot, ubicacion=eubi, descripcion=edesc,
+                                                  categoria=ecat, ultima_revision=erev, pais=epais),
+                                  eliminar_fotos, eliminar_docs, fotos_nuevas, docs_nuevos)
+                    procesar_archivos(fotos_nuevas, docs_nuevos)
+                    del st.session_state[f"edit_{row['id']}"]
+                    st.rerun()
+
+            st.button("CANCELAR EDICIÓN", key=f"canc_btn_{row['id']}", on_click=alternar_edicion, args=(row['id'],))
+
+        else:
+            col_img, col_info = st.columns([1, 1.2])
+            with col_img:
+                if fotos_activo: carrusel_fotos(row['id'], fotos_activo)
+                else: st.info("Sin fotos registradas.")
+
+            with col_info:
+                st.write(f"**MARCA:** {row['marca']} | **MODELO:** {row['modelo']}")
+                st.write(f"**ESTADO:** {row['estado']} | **UBICACIÓN:** {row['ubicacion']}")
+                st.write(f"**REVISIÓN:** {row['ultima_revision']}")
+                # Se muestra la placa si existe
+                if row['placa']: st.write(f"**PLACA:** {row['placa']}")
+                st.write("📄 **DOCUMENTOS**")
+                for i, (d_path, d_nom) in enumerate(docs_activo):
+                    if st.button(f"👁️ Abrir {d_nom}", key=f"btn_v_{row['id']}_{d_path}_{i}"): visor_documento(d_path, d_nom)
+                if movimientos:
+                    st.write("🕒 **ÚLTIMOS MOVIMIENTOS**")
+                    for m_origen, m_destino, m_fecha, m_motivo in movimientos:
+                        st.caption(f"{str(m_fecha)[:16]} · {m_origen} → {m_destino}" + (f" · {m_motivo}" if m_motivo else ""))
+
+            st.divider()
+            c_b1, c_b2 = st.columns(2)
+            c_b1.button("✏️ EDITAR ACTIVO", key=f"btn_edit_act_{row['id']}", use_container_width=True, on_click=alternar_edicion, args=(row['id'],))
+            if c_b2.button("🗑️ ELIMINAR ACTIVO", key=f"btn_del_act_{row['id']}", use_container_width=True):
+                confirmar_eliminar_activo(row['id'])
+
+@st.fragment
+def pestana_pais(f_cat, pais_nombre, df_todas_ubis):
+    with st.container(border=True):
+        st.markdown(f"###   ESTAS EN {pais_nombre}:")
+        c_f1, c_f2, c_f3 = st.columns(3)
+
+        ubis_pais = df_todas_ubis[df_todas_ubis['pais'] == pais_nombre]['nombre'].tolist()
+
+        f_est = c_f1.selectbox("🔍 ESTADO", ["TODOS", "OPERATIVO", "DAÑADO", "REPARACION"], key=f"est_{pais_nombre}")
+        f_ubi = c_f2.selectbox("🔍 UBICACIÓN", ["TODAS"] + ubis_pais, key=f"ubi_{pais_nombre}")
+        f_busq = c_f3.text_input("🔍 CÓDIGO, PLACA, MARCA O MODELO", key=f"busq_{pais_nombre}").upper()
+        c_v1, c_v2 = st.columns([1, 2])
+        vista = c_v1.segmented_control("VISTA", ["TARJETAS", "GRILLA"], default="TARJETAS", key=f"vista_{pais_nombre}") or "TARJETAS"
+        if vista == "GRILLA":
+            filas_grilla = c_v2.select_slider("FILAS POR PÁGINA", FILAS_POR_PAGINA_GRILLA, key=f"filas_{pais_nombre}")
+
+    filtros = dict(categoria=f_cat, pais=pais_nombre,
+                   estado=f_est if f_est != "TODOS" else None,
+                   ubicacion=f_ubi if f_ubi != "TODAS" else None,
+                   busqueda=f_busq or None)
+    with diagnostico.seccion("conteo"): total_activos = contar_activos(**filtros)
+
+    if total_activos == 0:
+        st.info(f"No hay activos que coincidan con los filtros en {pais_nombre}.")
+    elif vista == "GRILLA":
+        st.caption(f"{total_activos} activos")
+        grilla_activos(f"grilla_{pais_nombre}_{f_cat}", filtros, filas_grilla, df_todas_ubis)
+    else:
+        items_por_pag = ITEMS_POR_PAGINA
+        pag_key = f"pag_dash_{pais_nombre}_{f_cat}"
+
+        if pag_key not in st.session_state:
+            st.session_state[pag_key] = 0
+
+        total_paginas = (total_activos - 1) // items_por_pag + 1
+
+        if st.session_state[pag_key] >= total_paginas:
+            st.session_state[pag_key] = 0
+
+        inicio = st.session_state[pag_key] * items_por_pag
+        with diagnostico.seccion("consultas_pagina"):
+            df_pagina = pagina_activos(items_por_pag, inicio, **filtros)
+            fotos_pagina, docs_pagina = adjuntos_por_activo(df_pagina['id'].tolist())
+            movimientos_pagina = historial_por_activo(df_pagina['id'].tolist())
+
+        st.caption(f"Mostrando {len(df_pagina)} de {total_activos} activos (Página {st.session_state[pag_key] + 1} de {total_paginas})")
+
+        with diagnostico.seccion("tarjetas"):
+            for _, row in df_pagina.iterrows():
+                tarjeta_activo(row, fotos_pagina[row['id']], docs_pagina[row['id']], movimientos_pagina[row['id']], df_todas_ubis)
+
+        with diagnostico.seccion("paginacion"):
+            if total_paginas > 1:
+                st.write("---")
+                c_nav1, c_nav2, c_nav3 = st.columns([1, 2, 1])
+                if st.session_state[pag_key] > 0:
+                    c_nav1.button("⬅️ Anterior", key=f"btn_prev_{pais_nombre}", use_container_width=True, on_click=desplazar, args=(pag_key, -1))
+                if st.session_state[pag_key] < total_paginas - 1:
+                    c_nav3.button("Siguiente ➡️", key=f"btn_next_{pais_nombre}", use_container_width=True, on_click=desplazar, args=(pag_key, 1))
+
+def grilla_activos(clave, filtros, filas, df_todas_ubis):
+    # Una sola tabla por página (hasta 500 filas) en lugar de una tarjeta con sus widgets por activo;
+    # la tarjeta de detalle y edición se arma solo para la fila seleccionada
+    firma, tabla = repr((filtros, filas)), {}
+    def mostrar(df_pag, cursor):
+        # La clave cambia con la página y los filtros: la selección de una página no se arrastra a otra
+        tabla["clave"] = f"{clave}_{zlib.crc32(f'{firma}|{cursor}'.encode()):08x}"
+        df_vista = df_pag.assign(estado=[f"{ICONOS_ESTADO.get(e, '🟡')} {e}" for e in df_pag["estado"]],
+                                 miniatura=[url_miniatura(f) if pd.notna(f) else None for f in df_pag["foto"]])
+        with diagnostico.seccion("grilla"):
+            st.dataframe(df_vista, key=tabla["clave"], use_container_width=True, hide_index=True, height=min(len(df_vista), 15) * 35 + 38,
+                         column_order=list(COLUMNAS_GRILLA), column_config=COLUMNAS_GRILLA,
+                         on_select="rerun", selection_mode="single-row")
+
+    with diagnostico.seccion("consultas_pagina"):
+        df_pag = paginar_por_cursor(clave, lambda cursor: pagina_grilla(filas, cursor, **filtros), firma, mostrar)
+    clave_tabla = tabla.get("clave")
+    seleccion = st.session_state[clave_tabla].selection.rows if clave_tabla in st.session_state else []
+    if not seleccion or seleccion[0] >= len(df_pag):
+        st.caption("Selecciona una fila para ver el detalle del activo.")
+        return
+    row = df_pag.iloc[seleccion[0]]
+    fotos_activo, docs_activo = adjuntos_por_activo([row['id']])
+    movimientos = historial_por_activo([row['id']])
+    tarjeta_activo(row, fotos_activo[row['id']], docs_activo[row['id']], movimientos[row['id']], df_todas_ubis, expandida=True)
+
+@st.fragment
+def historial_movimientos(df_u):
+    st.write("### HISTORIAL DE MOVIMIENTOS")
+    c_h1, c_h2, c_h3, c_h4, c_h5 = st.columns([1.2, 1, 1.2, 1, 1])
+    h_id = c_h1.text_input("🔍 ACTIVO", key="h_id").upper().strip()
+    h_pais = c_h2.selectbox("🔍 PAÍS", ["TODOS"] + PAISES_LISTA, key="h_pais")
+    h_dest_list = df_u[df_u['pais'] == h_pais]['nombre'].tolist() if h_pais != "TODOS" else []
+    h_dest = c_h3.selectbox("🔍 DESTINO", ["TODOS"] + h_dest_list, key="h_dest")
+    h_desde = c_h4.date_input("DESDE", value=None, key="h_desde")
+    h_hasta = c_h5.date_input("HASTA", value=None, key="h_hasta")
+    filtros_hist = dict(id_activo=h_id or None, pais=h_pais if h_pais != "TODOS" else None,
+                        destino=f"{h_pais}-{h_dest}" if h_dest != "TODOS" else None, desde=h_desde, hasta=h_hasta)
+    with diagnostico.seccion("historial"): df_hist = paginar_por_cursor("hist", lambda cursor: pagina_historial(ITEMS_POR_PAGINA, cursor, **filtros_hist), repr(filtros_hist))
+    if df_hist.empty: st.info("Sin movimientos registrados.")
+
+@st.fragment
+def lista_ubicaciones(banderas):
+    with conectar_db() as conn:
+        ubis_db = conn.execute("SELECT nombre, pais FROM ubicaciones ORDER BY rowid DESC").fetchall()
+
+    if ubis_db:
+        if "pag_ubi" not in st.session_state: 
+            st.session_state.pag_ubi = 0
+
+        total_u = len(ubis_db)
+        total_pags_u = (total_u - 1) // ITEMS_POR_PAGINA + 1
+
+        if st.session_state.pag_ubi >= total_pags_u:
+            st.session_state.pag_ubi = 0
+
+        inicio_u = st.session_state.pag_ubi * ITEMS_POR_PAGINA
+        fin_u = inicio_u + ITEMS_POR_PAGINA
+
+        # --- LISTADO CON DIVISORES ---
+        for u in ubis_db[inicio_u : fin_u]:
+            col_i, col_e, col_d = st.columns([4, 0.5, 0.5])
+            bandera_actual = banderas.get(u[1], "🚩")
+
+            with col_i:
+                st.markdown(f"#### {bandera_actual} {u[0]}")
+                st.caption(f"País: {u[1]}")
+
+            if col_e.button("✏️", key=f"ed_u_{u[0]}_{u[1]}", help="Editar"): 
+                editar_ubicacion_dialog(u[0], u[1])
+
+            if col_d.button("🗑️", key=f"de_u_{u[0]}_{u[1]}", help="Eliminar"): 
+                confirmar_eliminacion_ubi(u[0], u[1])
+
+            st.divider() # <--- Divisor añadido para separar cada registro
+
+        # Navegación de páginas
+        if total_pags_u > 1:
+            c_u1, c_u2, c_u3 = st.columns([1, 2, 1])
+            if st.session_state.pag_ubi > 0:
+                c_u1.button("⬅️ Anterior", key="prev_u", use_container_width=True, on_click=desplazar, args=("pag_ubi", -1))
+
+            c_u2.caption(f"<center>Página {st.session_state.pag_ubi + 1} de {total_pags_u}</center>", unsafe_allow_html=True)
+
+            if st.session_state.pag_ubi < total_pags_u - 1:
+                c_u3.button("Siguiente ➡️", key="next_u", use_container_width=True, on_click=desplazar, args=("pag_ubi", 1))
+    else:
+        st.info("Aún no has registrado ninguna ubicación.")
+
+@st.fragment
+def lista_eliminados():
+    with diagnostico.seccion("listado"): df_elim = paginar_por_cursor("elim", lambda cursor: pagina_eliminados(ITEMS_POR_PAGINA, cursor))
+    if df_elim.empty: st.info("No hay historial de activos eliminados.")
+
+@st.fragment
+def lista_revisiones():
+    hoy = date.today()
+    c_r1, c_r2, c_r3 = st.columns(3)
+    r_pais = c_r1.selectbox("**PAÍS**", ["TODOS"] + PAISES_LISTA, key="rev_pais")
+    r_cat = c_r2.selectbox("**CATEGORÍA**", ["TODAS"] + CATEGORIAS_LISTA, key="rev_cat")
+    r_ventana = c_r3.selectbox("**MOSTRAR**", list(VENTANAS_REVISION), key="rev_ventana")
+    desde, hasta = VENTANAS_REVISION[r_ventana]
+    filtros_rev = dict(hasta=hoy + timedelta(days=hasta), desde=None if desde is None else hoy + timedelta(days=desde),
+                       pais=r_pais if r_pais != "TODOS" else None, categoria=r_cat if r_cat != "TODAS" else None)
+    with diagnostico.seccion("revisiones"):
+        df_rev = paginar_por_cursor("rev", lambda cursor: pagina_revisiones(FILAS_REVISIONES, cursor, **filtros_rev), repr(filtros_rev))
+    if df_rev.empty: st.success("✅ No hay revisiones pendientes con estos filtros.")
+    # El CSV se arma recién al hacer clic, no en cada rerun del listado
+    st.download_button("⬇️ DESCARGAR CSV", data=lambda: revisiones_csv(**filtros_rev), file_name=f"revisiones_{hoy}.csv",
+                       mime="text/csv", key="rev_csv", disabled=df_rev.empty)
 
 
 # --- NAVEGACIÓN ---
 
-opciones_menu = ["DASHBOARD", "REGISTRAR ACTIVO", "TRASLADOS", "GESTIONAR UBICACIONES", "HISTORIAL ELIMINADOS"]
+opciones_menu = ["DASHBOARD", "REGISTRAR ACTIVO", "IMPORTAR ACTIVOS", "TRASLADOS", "GESTIONAR UBICACIONES", "HISTORIAL ELIMINADOS", "ANALÍTICA", "REVISIONES"]
+if diagnostico.ACTIVO: opciones_menu.append("DIAGNÓSTICO")
 
 if "navegacion_interna" not in st.session_state:
     st.session_state.navegacion_interna = "DASHBOARD"
@@ -128,6 +422,7 @@ except ValueError:
 
 menu = st.sidebar.radio("MENÚ", opciones_menu, index=indice_actual)
 st.session_state.navegacion_interna = menu
+diagnostico.iniciar_pagina(menu)
 
 
 
@@ -140,175 +435,36 @@ if menu == "DASHBOARD":
     with col_logo:
        st.title("ACTIVOS") 
     
-    with conectar_db() as conn:
-        df = pd.read_sql_query("SELECT * FROM activos", conn)
-        df_todas_ubis = pd.read_sql_query("SELECT nombre, pais FROM ubicaciones", conn)
+    df_todas_ubis = ubicaciones_en_cache()
+
+    # Búsqueda global sobre el índice FTS: todos los países y categorías, por relevancia
+    busq_global = st.text_input("🔎 **BUSCAR EN TODO EL INVENTARIO** (código, placa, marca, modelo, descripción o motivo)", key="busq_global").upper()
+    if busq_global.strip():
+        with diagnostico.seccion("busqueda_global"): df_resultados = buscar_activos(busq_global)
+        if df_resultados.empty: st.info(f"Sin resultados para '{busq_global}'.")
+        else:
+            st.caption(f"{len(df_resultados)} resultado(s) más relevantes")
+            st.dataframe(df_resultados[['id', 'placa', 'categoria', 'pais', 'ubicacion', 'marca', 'modelo', 'estado']], use_container_width=True, hide_index=True)
+        st.divider()
 
     f_cat = st.selectbox("**SELECCIONAR CATEGORÍA**", ["SELECCIONAR"] + CATEGORIAS_LISTA)
 
     if f_cat != "SELECCIONAR":
         st.subheader(f"🟦 {f_cat}")
         
-        df_f_base = df[df['categoria'] == f_cat]
+        with diagnostico.seccion("metricas"): conteos_pais = conteos_por_pais(f_cat)
         
         c_res1, c_res2, c_res3, c_res4 = st.columns(4)
-        c_res4.metric("**TOTAL**", len(df_f_base))
-        c_res1.metric("**VENEZUELA** 🇻🇪", len(df_f_base[df_f_base['pais'] == "VENEZUELA"]))
-        c_res2.metric("**COLOMBIA** 🇨🇴", len(df_f_base[df_f_base['pais'] == "COLOMBIA"]))
-        c_res3.metric("**EE.UU.** 🇺🇸", len(df_f_base[df_f_base['pais'] == "ESTADOS UNIDOS"]))
+        c_res4.metric("**TOTAL**", sum(conteos_pais.values()))
+        c_res1.metric("**VENEZUELA** 🇻🇪", conteos_pais.get("VENEZUELA", 0))
+        c_res2.metric("**COLOMBIA** 🇨🇴", conteos_pais.get("COLOMBIA", 0))
+        c_res3.metric("**EE.UU.** 🇺🇸", conteos_pais.get("ESTADOS UNIDOS", 0))
         st.divider()
 
         tabs_paises = st.tabs(PAISES_LISTA)
 
         for i, pais_nombre in enumerate(PAISES_LISTA):
-            with tabs_paises[i]:
-                with st.container(border=True):
-                    st.markdown(f"###   ESTAS EN {pais_nombre}:")
-                    c_f1, c_f2, c_f3 = st.columns(3)
-                    
-                    ubis_pais = df_todas_ubis[df_todas_ubis['pais'] == pais_nombre]['nombre'].tolist()
-                    
-                    f_est = c_f1.selectbox("🔍 ESTADO", ["TODOS", "OPERATIVO", "DAÑADO", "REPARACION"], key=f"est_{pais_nombre}")
-                    f_ubi = c_f2.selectbox("🔍 UBICACIÓN", ["TODAS"] + ubis_pais, key=f"ubi_{pais_nombre}")
-                    f_busq = c_f3.text_input("🔍 CÓDIGO O MARCA", key=f"busq_{pais_nombre}").upper()
-                
-                df_display = df_f_base[df_f_base['pais'] == pais_nombre]
-
-                if f_est != "TODOS": 
-                    df_display = df_display[df_display['estado'] == f_est]
-                if f_ubi != "TODAS": 
-                    df_display = df_display[df_display['ubicacion'] == f_ubi]
-                if f_busq: 
-                    df_display = df_display[df_display['id'].str.contains(f_busq, na=False) | 
-                                            df_display['marca'].str.contains(f_busq, na=False)]
-
-                if df_display.empty:
-                    st.info(f"No hay activos que coincidan con los filtros en {pais_nombre}.")
-                else:
-                    items_por_pag = 5
-                    pag_key = f"pag_dash_{pais_nombre}_{f_cat}"
-                    
-                    if pag_key not in st.session_state:
-                        st.session_state[pag_key] = 0
-                    
-                    total_activos = len(df_display)
-                    total_paginas = (total_activos - 1) // items_por_pag + 1
-                    
-                    if st.session_state[pag_key] >= total_paginas:
-                        st.session_state[pag_key] = 0
-                        
-                    inicio = st.session_state[pag_key] * items_por_pag
-                    fin = inicio + items_por_pag
-                    df_pagina = df_display.iloc[inicio:fin]
-                    
-                    st.caption(f"Mostrando {len(df_pagina)} de {total_activos} activos (Página {st.session_state[pag_key] + 1} de {total_paginas})")
-
-                    for _, row in df_pagina.iterrows():
-                        color = "🟢" if row['estado'] == "OPERATIVO" else "🔴" if row['estado'] == "DAÑADO" else "🟡"
-                        with st.expander(f"{color} ID: {row['id']} | {row['categoria']} | {row['marca']}"):
-                            
-                            if f"edit_{row['id']}" in st.session_state:
-                                with st.form(f"form_edit_{row['id']}"):
-                                    st.subheader("✏️ EDITAR ACTIVO")
-                                    # --- NOTA: PLACA NO SE AGREGO A EDICIÓN POR PETICIÓN ESTRICTA DE SOLO MODIFICAR REGISTRO ---
-                                    c1, c2 = st.columns(2)
-                                    emarc = c1.text_input("MARCA", str(row['marca'] or "")).upper()
-                                    emod = c2.text_input("MODELO", str(row['modelo'] or "")).upper()
-                                    ecat = st.selectbox("CATEGORÍA", CATEGORIAS_LISTA, index=CATEGORIAS_LISTA.index(row['categoria']) if row['categoria'] in CATEGORIAS_LISTA else 0)
-                                    epais = st.selectbox("PAÍS", PAISES_LISTA, index=PAISES_LISTA.index(row['pais']) if row['pais'] in PAISES_LISTA else 0)
-                                    est_list = ["OPERATIVO", "DAÑADO", "REPARACION"]
-                                    eest = st.selectbox("ESTADO", est_list, index=est_list.index(row['estado']) if row['estado'] in est_list else 0)
-                                    
-                                    try: fecha_actual = datetime.strptime(str(row['ultima_revision']), '%Y-%m-%d').date()
-                                    except: fecha_actual = datetime.now().date()
-                                    erev = st.date_input("FECHA ÚLTIMA REVISIÓN", fecha_actual)
-                                    
-                                    emot = st.text_input("MOTIVO / ESTADO", str(row['motivo_estado'] or "")).upper()
-                                    ubis_edit = df_todas_ubis[df_todas_ubis['pais'] == epais]['nombre'].tolist()
-                                    eubi = st.selectbox("UBICACIÓN", ubis_edit, index=ubis_edit.index(row['ubicacion']) if row['ubicacion'] in ubis_edit else 0)
-                                    edesc = st.text_area("DESCRIPCIÓN", str(row['descripcion'] or "")).upper()
-
-                                    st.write("---")
-                                    st.write("🗑️ **ELIMINAR ARCHIVOS EXISTENTES**")
-                                    with conectar_db() as conn:
-                                        fotos_actuales = conn.execute("SELECT path FROM fotos WHERE id_activo=?", (row['id'],)).fetchall()
-                                        docs_actuales = conn.execute("SELECT path, nombre_real FROM documentos WHERE id_activo=?", (row['id'],)).fetchall()
-                                    
-                                    eliminar_fotos = []
-                                    for f_p in fotos_actuales:
-                                        if st.checkbox(f"**ELIMINAR FOTO**: {os.path.basename(f_p[0])}", key=f"del_f_box_{f_p[0]}"):
-                                            eliminar_fotos.append(f_p[0])
-                                    
-                                    eliminar_docs = []
-                                    for d_p, d_n in docs_actuales:
-                                        if st.checkbox(f"**ELIMINAR DOCUMENTO**: {d_n}", key=f"del_d_box_{d_p}"):
-                                            eliminar_docs.append(d_p)
-                                            
-                                    st.write("➕ **AÑADIR ARCHIVOS**")
-                                    f, cd = st.columns(2)
-                                    nuevas_fotos = f.file_uploader("SUBIR FOTOS", accept_multiple_files=True, type=['png', 'jpg', 'jpeg', 'webp'], key=f"nf_edit_{row['id']}")
-                                    nuevos_docs = cd.file_uploader("SUBIR DOCUMENTOS", accept_multiple_files=True, type=['pdf', 'docx', 'xlsx', 'xls', 'txt'], key=f"nd_edit_{row['id']}")
-
-                                    if st.form_submit_button("💾 GUARDAR CAMBIOS"):
-                                        with conectar_db() as conn:
-                                            conn.execute("""UPDATE activos SET marca=?, modelo=?, estado=?, motivo_estado=?, 
-                                                           ubicacion=?, descripcion=?, categoria=?, ultima_revision=?, pais=? WHERE id=?""", 
-                                                         (emarc, emod, eest, emot, eubi, edesc, ecat, erev, epais, row['id']))
-                                            for path in eliminar_fotos: conn.execute("DELETE FROM fotos WHERE path=?", (path,))
-                                            for path in eliminar_docs: conn.execute("DELETE FROM documentos WHERE path=?", (path,))
-                                        if nuevas_fotos: guardar_archivos(row['id'], nuevas_fotos, 'foto')
-                                        if nuevos_docs: guardar_archivos(row['id'], nuevos_docs, 'doc')
-                                        del st.session_state[f"edit_{row['id']}"]
-                                        st.rerun()
-                                
-                                if st.button("CANCELAR EDICIÓN", key=f"canc_btn_{row['id']}"):
-                                    del st.session_state[f"edit_{row['id']}"]
-                                    st.rerun()
-
-                            else:
-                                col_img, col_info = st.columns([1, 1.2])
-                                with col_img:
-                                    with conectar_db() as conn:
-                                        fotos = [f[0] for f in conn.execute("SELECT path FROM fotos WHERE id_activo=?", (row['id'],)).fetchall()]
-                                    if fotos:
-                                        idx = st.session_state.get(f"idx_{row['id']}", 0)
-                                        st.image(fotos[idx % len(fotos)], use_container_width=True)
-                                        ca, cb = st.columns(2)
-                                        if ca.button("⬅️", key=f"prev_{row['id']}"): st.session_state[f"idx_{row['id']}"] = idx - 1; st.rerun()
-                                        if cb.button("➡️", key=f"next_{row['id']}"): st.session_state[f"idx_{row['id']}"] = idx + 1; st.rerun()
-                                    else: st.info("Sin fotos registradas.")
-
-                                with col_info:
-                                    st.write(f"**MARCA:** {row['marca']} | **MODELO:** {row['modelo']}")
-                                    st.write(f"**ESTADO:** {row['estado']} | **UBICACIÓN:** {row['ubicacion']}")
-                                    st.write(f"**REVISIÓN:** {row['ultima_revision']}")
-                                    # Se muestra la placa si existe
-                                    if row['placa']: st.write(f"**PLACA:** {row['placa']}")
-                                    st.write("📄 **DOCUMENTOS**")
-                                    with conectar_db() as conn:
-                                        docs = conn.execute("SELECT path, nombre_real FROM documentos WHERE id_activo=?", (row['id'],)).fetchall()
-                                    for i, (d_path, d_nom) in enumerate(docs):
-                                        if st.button(f"👁️ Abrir {d_nom}", key=f"btn_v_{d_path}_{i}"): visor_documento(d_path, d_nom)
-                                
-                                st.divider()
-                                c_b1, c_b2 = st.columns(2)
-                                if c_b1.button("✏️ EDITAR ACTIVO", key=f"btn_edit_act_{row['id']}", use_container_width=True): 
-                                    st.session_state[f"edit_{row['id']}"] = True
-                                    st.rerun()
-                                if c_b2.button("🗑️ ELIMINAR ACTIVO", key=f"btn_del_act_{row['id']}", use_container_width=True):
-                                    confirmar_eliminar_activo(row['id'])
-
-                    if total_paginas > 1:
-                        st.write("---")
-                        c_nav1, c_nav2, c_nav3 = st.columns([1, 2, 1])
-                        if st.session_state[pag_key] > 0:
-                            if c_nav1.button("⬅️ Anterior", key=f"btn_prev_{pais_nombre}", use_container_width=True):
-                                st.session_state[pag_key] -= 1
-                                st.rerun()
-                        if st.session_state[pag_key] < total_paginas - 1:
-                            if c_nav3.button("Siguiente ➡️", key=f"btn_next_{pais_nombre}", use_container_width=True):
-                                st.session_state[pag_key] += 1
-                                st.rerun()
+            with tabs_paises[i]: pestana_pais(f_cat, pais_nombre, df_todas_ubis)
     else:
         st.info("👋 Bienvenido. Por favor, selecciona una **Categoría**.")
 
@@ -329,8 +485,7 @@ elif menu == "REGISTRAR ACTIVO":
         time.sleep(1.2)
         st.rerun()
 
-    with conectar_db() as conn:
-        df_todas_ubis = pd.read_sql_query("SELECT nombre, pais FROM ubicaciones", conn)
+    df_todas_ubis = ubicaciones_en_cache()
     
     with st.container(border=True):
         if df_todas_ubis.empty: 
@@ -376,14 +531,12 @@ elif menu == "REGISTRAR ACTIVO":
         if st.button("💾 GUARDAR", use_container_width=True):
             if rid and ubis_filtradas and rubi != "SIN UBICACIÓN" and rcat and (rest == "OPERATIVO" or rmot):
                 try:
-                    with conectar_db() as conn:
-                        conn.execute("""INSERT INTO activos (id, placa, marca, modelo, ubicacion, estado, motivo_estado, descripcion, ultima_revision, categoria, pais) 
-                                     VALUES (?,?,?,?,?,?,?,?,?,?,?)""", 
-                                     (rid, rplaca, rmarc, rmod, rubi, rest, rmot, rdesc, datetime.now().date(), rcat, rpais))
-                        conn.commit()
-                    
-                    if rfotos: guardar_archivos(rid, rfotos, 'foto')
-                    if rdocs: guardar_archivos(rid, rdocs, 'doc')
+                    fotos_reg, docs_reg = guardar_archivos(rfotos, 'foto'), guardar_archivos(rdocs, 'doc')
+                    # El activo y sus adjuntos se registran juntos: si el ID ya existe no queda nada a medias
+                    guardar(registrar_activo, dict(id=rid, placa=rplaca, marca=rmarc, modelo=rmod, ubicacion=rubi, estado=rest, motivo_estado=rmot,
+                                          descripcion=rdesc, ultima_revision=datetime.now().date(), categoria=rcat, pais=rpais),
+                                     fotos_reg, docs_reg)
+                    procesar_archivos(fotos_reg, docs_reg)
                     realizar_limpieza_y_exito(rid)
                 except sqlite3.IntegrityError:
                     st.error(f"❌ El ID '{rid}' ya existe en la base de datos.")
@@ -392,53 +545,120 @@ elif menu == "REGISTRAR ACTIVO":
 
 
 
+#--- IMPORTAR ACTIVOS ---
+
+elif menu == "IMPORTAR ACTIVOS":
+    st.title("📥 IMPORTACIÓN MASIVA DE ACTIVOS")
+    st.caption("Columnas: id, placa, marca, modelo, categoria, pais, ubicacion, estado, motivo_estado, descripcion, ultima_revision. "
+               "Obligatorias: **id, categoria, pais, ubicacion**. Las ubicaciones deben existir previamente.")
+    st.download_button("📄 DESCARGAR PLANTILLA CSV", plantilla_csv(), file_name="plantilla_activos.csv", mime="text/csv")
+
+    archivo_imp = st.file_uploader("**CARGAR ARCHIVO (CSV / XLSX)**", type=['csv', 'xlsx'], key="imp_archivo")
+    if archivo_imp:
+        try:
+            df_imp = leer_archivo(archivo_imp, archivo_imp.name)
+        except (ValueError, pd.errors.ParserError) as e:
+            st.error(f"❌ **No se pudo leer el archivo:** {e}")
+            df_imp = None
+
+        if df_imp is not None:
+            df_validos, df_rechazados = validar(df_imp, CATEGORIAS_LISTA, PAISES_LISTA, ubicaciones_en_cache(), activos_en_cache()['id'])
+            c_i1, c_i2, c_i3 = st.columns(3)
+            c_i1.metric("**FILAS LEÍDAS**", len(df_imp))
+            c_i2.metric("**VÁLIDAS**", len(df_validos))
+            c_i3.metric("**RECHAZADAS**", len(df_rechazados))
+
+            if not df_rechazados.empty:
+                st.warning("⚠️ **Filas rechazadas** (se muestran las primeras 100):")
+                st.dataframe(df_rechazados.head(100), use_container_width=True)
+                st.download_button("📥 DESCARGAR REPORTE DE RECHAZADOS", df_rechazados.to_csv(index=False).encode('utf-8-sig'),
+                                   file_name="activos_rechazados.csv", mime="text/csv")
+
+            if not df_validos.empty and st.button(f"💾 IMPORTAR {len(df_validos)} ACTIVOS VÁLIDOS", use_container_width=True):
+                barra = st.progress(0.0, text="Importando...")
+                insertados, omitidos = guardar(insertar, df_validos, lambda hechos, total: barra.progress(hechos / total, text=f"Importando {hechos} de {total}..."))
+                st.success(f"✅ **{insertados} activos importados.**")
+                if omitidos: st.warning(f"⚠️ {omitidos} filas omitidas: el ID fue registrado por otro usuario durante la importación.")
+
+
+
 #--- TRASLADOS ---
 
 elif menu == "TRASLADOS":
     st.title("🚚 TRASLADOS")
-    with conectar_db() as conn:
-        activos = pd.read_sql_query("SELECT id, ubicacion, pais FROM activos", conn)
-        df_u = pd.read_sql_query("SELECT * FROM ubicaciones", conn)
-        df_hist = pd.read_sql_query("SELECT * FROM historial ORDER BY fecha DESC", conn)
+    df_activos = activos_en_cache()
+    activos = df_activos[['id', 'ubicacion', 'pais']]
+    df_u = ubicaciones_en_cache()
     
-    opais = st.selectbox("**SELECCIONAR ORIGEN**", PAISES_LISTA)
-    activos_f = activos[activos['pais'] == opais]
+    def seleccionar_activos(prefijo):
+        # Selección para operaciones masivas: por lista o todos los que cumplan los filtros
+        c_s1, c_s2, c_s3 = st.columns(3)
+        spais = c_s1.selectbox("**PAÍS**", PAISES_LISTA, key=f"{prefijo}_pais")
+        subi = c_s2.selectbox("**UBICACIÓN ACTUAL**", ["TODAS"] + df_u[df_u['pais'] == spais]['nombre'].tolist(), key=f"{prefijo}_ubi")
+        scat = c_s3.selectbox("**CATEGORÍA**", ["TODAS"] + CATEGORIAS_LISTA, key=f"{prefijo}_cat")
+        df_sel = df_activos[df_activos['pais'] == spais]
+        if subi != "TODAS": df_sel = df_sel[df_sel['ubicacion'] == subi]
+        if scat != "TODAS": df_sel = df_sel[df_sel['categoria'] == scat]
+        if st.checkbox(f"**SELECCIONAR LOS {len(df_sel)} ACTIVOS FILTRADOS**", key=f"{prefijo}_todos"):
+            return df_sel['id'].tolist()
+        return st.multiselect("**ACTIVOS**", df_sel['id'].tolist(), key=f"{prefijo}_ids")
+
+    def id_operacion(prefijo):
+        # Se mantiene entre reruns hasta que la operación se aplica: un reintento no la duplica
+        if f"{prefijo}_op" not in st.session_state: st.session_state[f"{prefijo}_op"] = uuid.uuid4().hex
+        return st.session_state[f"{prefijo}_op"]
+
+    def resultado_operacion(prefijo, cantidad, mensaje):
+        del st.session_state[f"{prefijo}_op"]
+        if cantidad is None: st.toast("Esta operación ya había sido aplicada.", icon="ℹ️")
+        else: st.toast(mensaje.format(cantidad), icon="✅")
+        st.rerun()
+
+    tab_ind, tab_masivo, tab_estado = st.tabs(["INDIVIDUAL", "TRASLADO MASIVO", "CAMBIO DE ESTADO MASIVO"])
+
+    with tab_ind:
+        opais = st.selectbox("**SELECCIONAR ORIGEN**", PAISES_LISTA)
+        activos_f = activos[activos['pais'] == opais]
     
-    if not activos_f.empty:
-        sel_id = st.selectbox("**SELECCIONAR ACTIVO**", activos_f['id'])
-        curr = activos_f[activos_f['id'] == sel_id].iloc[0]
-        st.info(f"📍 Ubicación Actual: {curr['pais']} - {curr['ubicacion']}")
-        tpais = st.selectbox("**ELEGIR DESTINO**", PAISES_LISTA)
-        u_dest_list = df_u[df_u['pais'] == tpais]['nombre'].tolist()
-        tubi = st.selectbox("**UBICACIÓN DESTINO**", u_dest_list if u_dest_list else ["SIN OPCIONES"])
-        mot = st.text_input("**MOTIVO**").upper()
-        if st.button("PROCESAR TRASLADO", use_container_width=True):
-            if tubi != "SIN OPCIONES":
-                with conectar_db() as conn:
-                    conn.execute("UPDATE activos SET ubicacion=?, pais=? WHERE id=?", (tubi, tpais, sel_id))
-                    conn.execute("INSERT INTO historial (id_activo, origen, destino, fecha, motivo) VALUES (?,?,?,?,?)", 
-                                 (sel_id, f"{curr['pais']}-{curr['ubicacion']}", f"{tpais}-{tubi}", datetime.now(), mot))
-                    conn.commit()
-                st.success("Traslado exitoso."); st.rerun()
+        if not activos_f.empty:
+            sel_id = st.selectbox("**SELECCIONAR ACTIVO**", activos_f['id'])
+            curr = activos_f[activos_f['id'] == sel_id].iloc[0]
+            st.info(f"📍 Ubicación Actual: {curr['pais']} - {curr['ubicacion']}")
+            tpais = st.selectbox("**ELEGIR DESTINO**", PAISES_LISTA)
+            u_dest_list = df_u[df_u['pais'] == tpais]['nombre'].tolist()
+            tubi = st.selectbox("**UBICACIÓN DESTINO**", u_dest_list if u_dest_list else ["SIN OPCIONES"])
+            mot = st.text_input("**MOTIVO**").upper()
+            if st.button("PROCESAR TRASLADO", use_container_width=True):
+                if tubi != "SIN OPCIONES":
+                    if guardar(trasladar_activos, [sel_id], tpais, tubi, mot): st.success("Traslado exitoso."); st.rerun()
+                    else: st.warning("El activo ya está en esa ubicación.")
+
+    with tab_masivo:
+        ids_tras = seleccionar_activos("tm")
+        c_d1, c_d2 = st.columns(2)
+        mpais = c_d1.selectbox("**PAÍS DESTINO**", PAISES_LISTA, key="tm_dest_pais")
+        m_dest_list = df_u[df_u['pais'] == mpais]['nombre'].tolist()
+        mubi = c_d2.selectbox("**UBICACIÓN DESTINO**", m_dest_list if m_dest_list else ["SIN OPCIONES"], key="tm_dest_ubi")
+        mmot = st.text_input("**MOTIVO**", key="tm_mot").upper()
+        op_tras = id_operacion("tm")
+        if st.button(f"PROCESAR TRASLADO DE {len(ids_tras)} ACTIVOS", key="tm_btn", use_container_width=True, disabled=not ids_tras):
+            if mubi != "SIN OPCIONES":
+                resultado_operacion("tm", guardar(trasladar_activos, ids_tras, mpais, mubi, mmot, op_tras), "{} activos trasladados.")
+            else: st.error("⚠️ **Seleccione una ubicación destino válida.**")
+
+    with tab_estado:
+        ids_est = seleccionar_activos("em")
+        c_e1, c_e2 = st.columns(2)
+        nest = c_e1.selectbox("**NUEVO ESTADO**", ["OPERATIVO", "DAÑADO", "REPARACION"], key="em_estado")
+        nmot = c_e2.text_input("**MOTIVO / ESTADO**", key="em_mot").upper()
+        op_est = id_operacion("em")
+        if st.button(f"APLICAR ESTADO A {len(ids_est)} ACTIVOS", key="em_btn", use_container_width=True, disabled=not ids_est):
+            if nest == "OPERATIVO" or nmot:
+                resultado_operacion("em", guardar(cambiar_estado_activos, ids_est, nest, nmot, op_est), "Estado actualizado en {} activos.")
+            else: st.error("⚠️ **Indique el motivo de daño / reparación.**")
 
     st.divider()
-    st.write("### HISTORIAL DE MOVIMIENTOS")
-    if not df_hist.empty:
-        # PAGINACIÓN HISTORIAL TRASLADOS
-        if "pag_hist" not in st.session_state: st.session_state.pag_hist = 0
-        total_hist = len(df_hist)
-        total_pags_hist = (total_hist - 1) // ITEMS_POR_PAGINA + 1
-        inicio_h = st.session_state.pag_hist * ITEMS_POR_PAGINA
-        st.dataframe(df_hist.iloc[inicio_h : inicio_h + ITEMS_POR_PAGINA], use_container_width=True)
-        
-        c_h1, c_h2, c_h3 = st.columns([1, 2, 1])
-        if st.session_state.pag_hist > 0:
-            if c_h1.button("⬅️ Anterior", key="prev_hist", use_container_width=True):
-                st.session_state.pag_hist -= 1; st.rerun()
-        if st.session_state.pag_hist < total_pags_hist - 1:
-            if c_h3.button("Siguiente ➡️", key="next_hist", use_container_width=True):
-                st.session_state.pag_hist += 1; st.rerun()
-    else: st.info("Sin movimientos registrados.")
+    historial_movimientos(df_u)
 
 
 
@@ -467,67 +687,17 @@ elif menu == "GESTIONAR UBICACIONES":
         
         if st.form_submit_button("💾 GUARDAR UBICACIÓN", use_container_width=True):
             if unombre:
-                with conectar_db() as conn:
-                    try:
-                        conn.execute("INSERT INTO ubicaciones (nombre, pais) VALUES (?, ?)", (unombre, upais))
-                        conn.commit()
-                        st.success(f"✅ ¡{unombre} guardada con éxito en {upais}!")
-                        st.rerun()
-                    except sqlite3.IntegrityError: 
-                        st.error("❌ Esta ubicación ya existe en este país.")
+                try:
+                    guardar(crear_ubicacion, unombre, upais)
+                    st.success(f"✅ ¡{unombre} guardada con éxito en {upais}!")
+                    st.rerun()
+                except sqlite3.IntegrityError: 
+                    st.error("❌ Esta ubicación ya existe en este país.")
 
     st.divider()
     st.subheader("Lista de Ubicaciones")
     
-    with conectar_db() as conn:
-        ubis_db = conn.execute("SELECT nombre, pais FROM ubicaciones ORDER BY rowid DESC").fetchall()
-        
-        if ubis_db:
-            if "pag_ubi" not in st.session_state: 
-                st.session_state.pag_ubi = 0
-            
-            total_u = len(ubis_db)
-            total_pags_u = (total_u - 1) // ITEMS_POR_PAGINA + 1
-            
-            if st.session_state.pag_ubi >= total_pags_u:
-                st.session_state.pag_ubi = 0
-                
-            inicio_u = st.session_state.pag_ubi * ITEMS_POR_PAGINA
-            fin_u = inicio_u + ITEMS_POR_PAGINA
-            
-            # --- LISTADO CON DIVISORES ---
-            for u in ubis_db[inicio_u : fin_u]:
-                col_i, col_e, col_d = st.columns([4, 0.5, 0.5])
-                bandera_actual = banderas.get(u[1], "🚩")
-                
-                with col_i:
-                    st.markdown(f"#### {bandera_actual} {u[0]}")
-                    st.caption(f"País: {u[1]}")
-                
-                if col_e.button("✏️", key=f"ed_u_{u[0]}_{u[1]}", help="Editar"): 
-                    editar_ubicacion_dialog(u[0], u[1])
-                
-                if col_d.button("🗑️", key=f"de_u_{u[0]}_{u[1]}", help="Eliminar"): 
-                    confirmar_eliminacion_ubi(u[0], u[1])
-                
-                st.divider() # <--- Divisor añadido para separar cada registro
-            
-            # Navegación de páginas
-            if total_pags_u > 1:
-                c_u1, c_u2, c_u3 = st.columns([1, 2, 1])
-                if st.session_state.pag_ubi > 0:
-                    if c_u1.button("⬅️ Anterior", key="prev_u", use_container_width=True):
-                        st.session_state.pag_ubi -= 1
-                        st.rerun()
-                
-                c_u2.caption(f"<center>Página {st.session_state.pag_ubi + 1} de {total_pags_u}</center>", unsafe_allow_html=True)
-                
-                if st.session_state.pag_ubi < total_pags_u - 1:
-                    if c_u3.button("Siguiente ➡️", key="next_u", use_container_width=True):
-                        st.session_state.pag_ubi += 1
-                        st.rerun()
-        else:
-            st.info("Aún no has registrado ninguna ubicación.")
+    lista_ubicaciones(banderas)
 
 
 
@@ -537,23 +707,92 @@ elif menu == "GESTIONAR UBICACIONES":
 
 elif menu == "HISTORIAL ELIMINADOS":
     st.title("🗑️ ACTIVOS ELIMINADOS")
-    with conectar_db() as conn:
-        df_elim = pd.read_sql_query("SELECT * FROM activos_eliminados ORDER BY fecha_eliminacion DESC", conn)
-    
-    if not df_elim.empty:
-        # PAGINACIÓN ACTIVOS ELIMINADOS
-        if "pag_elim" not in st.session_state: st.session_state.pag_elim = 0
-        total_e = len(df_elim)
-        total_pags_e = (total_e - 1) // ITEMS_POR_PAGINA + 1
-        inicio_e = st.session_state.pag_elim * ITEMS_POR_PAGINA
-        
-        st.dataframe(df_elim.iloc[inicio_e : inicio_e + ITEMS_POR_PAGINA], use_container_width=True)
-        
-        c_e1, c_e2, c_e3 = st.columns([1, 2, 1])
-        if st.session_state.pag_elim > 0:
-            if c_e1.button("⬅️ Anterior", key="prev_elim", use_container_width=True):
-                st.session_state.pag_elim -= 1; st.rerun()
-        if st.session_state.pag_elim < total_pags_e - 1:
-            if c_e3.button("Siguiente ➡️", key="next_elim", use_container_width=True):
-                st.session_state.pag_elim += 1; st.rerun()
-    else: st.info("No hay historial de activos eliminados.")
+    lista_eliminados()
+
+
+
+
+#--- ANALÍTICA ---
+
+elif menu == "ANALÍTICA":
+    st.title("📊 ANALÍTICA")
+    a_cat = st.selectbox("**CATEGORÍA**", ["TODAS"] + CATEGORIAS_LISTA, key="ana_cat")
+
+    df_estado = estado_por_pais(a_cat if a_cat != "TODAS" else None)
+    st.subheader("Estado de la flota por país")
+    if df_estado.empty: st.info("Sin activos registrados.")
+    else:
+        fig = px.bar(df_estado, x="pais", y="cantidad", color="estado", barmode="stack",
+                     color_discrete_map={"OPERATIVO": "#2ca02c", "DAÑADO": "#d62728", "REPARACION": "#ffbf00"},
+                     labels={"pais": "PAÍS", "cantidad": "ACTIVOS", "estado": "ESTADO"})
+        st.plotly_chart(fig, use_container_width=True)
+
+    c_a1, c_a2 = st.columns(2)
+    with c_a1:
+        st.subheader("Activos en reparación")
+        df_rep = en_reparacion_por_mes()
+        if df_rep.empty: st.info("Sin cambios de estado registrados.")
+        else: st.plotly_chart(px.line(df_rep, x="mes", y="en_reparacion", markers=True, labels={"mes": "MES", "en_reparacion": "EN REPARACIÓN"}), use_container_width=True)
+    with c_a2:
+        st.subheader("Eliminaciones por mes")
+        df_elim_mes = eliminados_por_mes()
+        if df_elim_mes.empty: st.info("No hay activos eliminados.")
+        else: st.plotly_chart(px.bar(df_elim_mes, x="mes", y="eliminados", labels={"mes": "MES", "eliminados": "ELIMINADOS"}), use_container_width=True)
+
+
+
+#--- REVISIONES ---
+
+elif menu == "REVISIONES":
+    st.title("🛠️ REVISIONES PROGRAMADAS")
+    df_res = resumen_revisiones(date.today()).set_index("pais")
+    for col, pais in zip(st.columns(len(PAISES_LISTA)), PAISES_LISTA):
+        vencidos, semana = (int(df_res.loc[pais, c]) for c in ("vencidos", "esta_semana")) if pais in df_res.index else (0, 0)
+        col.metric(pais, f"{vencidos} vencidos", f"{semana} vencen esta semana", delta_color="off")
+    lista_revisiones()
+
+    with st.expander("⚙️ INTERVALOS DE REVISIÓN POR CATEGORÍA"):
+        df_int = st.data_editor(intervalos_revision(), hide_index=True, disabled=["categoria"], key="rev_intervalos",
+                                column_config={"dias": st.column_config.NumberColumn("DÍAS", min_value=1, step=1, required=True)})
+        if st.button("GUARDAR INTERVALOS", key="rev_guardar"):
+            dias = pd.to_numeric(df_int["dias"], errors="coerce")
+            if dias.isna().any() or (dias < 1).any() or (dias % 1 != 0).any():
+                st.error("Cada categoría necesita un intervalo de al menos 1 día (número entero).")
+            else:
+                guardar(actualizar_intervalos, {c: int(d) for c, d in zip(df_int["categoria"], dias)})
+                st.success("Intervalos actualizados."); st.rerun()
+
+
+
+#--- DIAGNÓSTICO (solo con INVENTARIO_DIAGNOSTICO=1) ---
+
+elif menu == "DIAGNÓSTICO":
+    st.title("🩺 DIAGNÓSTICO DE RENDIMIENTO")
+    clave_admin = os.environ.get('INVENTARIO_CLAVE_ADMIN')
+    if not clave_admin:
+        st.warning("Defina INVENTARIO_CLAVE_ADMIN en el servidor para habilitar este panel.")
+    elif not st.session_state.get("admin_diagnostico"):
+        clave = st.text_input("**CLAVE DE ADMINISTRADOR**", type="password", key="clave_diag")
+        if clave:
+            if hmac.compare_digest(clave, clave_admin): st.session_state.admin_diagnostico = True; st.rerun()
+            else: st.error("Clave incorrecta.")
+    else:
+        st.caption(f"Consultas lentas (≥ {diagnostico.UMBRAL_LENTA_MS:.0f} ms) en {os.path.abspath(diagnostico.RUTA_LOG_LENTAS)}")
+        if st.button("🔄 REINICIAR MEDICIONES", key="diag_reiniciar"): diagnostico.reiniciar(); st.rerun()
+        for titulo, df_diag in (("Páginas (tiempo total del rerun)", diagnostico.resumen_paginas()),
+                                ("Secciones", diagnostico.resumen_secciones()),
+                                ("Sentencias SQL por forma", diagnostico.resumen_sentencias()),
+                                ("Últimas consultas lentas", diagnostico.sentencias_lentas())):
+            st.subheader(titulo)
+            if df_diag.empty: st.info("Sin mediciones todavía.")
+            else: st.dataframe(df_diag, use_container_width=True, hide_index=True)
+
+        st.subheader("Mantenimiento de adjuntos y base")
+        st.caption(f"Archivos sin referencias en {os.path.abspath(mantenimiento.CARPETA_CUARENTENA)} durante {mantenimiento.DIAS_CUARENTENA} días")
+        if st.button("🧹 EJECUTAR MANTENIMIENTO AHORA", key="diag_mant"):
+            with st.spinner("Revisando archivos y optimizando la base..."): mantenimiento.ejecutar_mantenimiento(forzar=True)
+        df_mant = mantenimiento.ultimas_ejecuciones()
+        if df_mant.empty: st.info("Sin ejecuciones todavía.")
+        else: st.dataframe(df_mant, use_container_width=True, hide_index=True)
+
+diagnostico.terminar_pagina()
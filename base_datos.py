@@ -0,0 +1,531 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as TiempoAgotado
+from contextlib import contextmanager
+from datetime import datetime
+
+# --- CONFIGURACIÓN DE LA BASE DE DATOS ---
+RUTA_DB = os.environ.get('INVENTARIO_DB', 'inventario.db')
+TAMANO_POOL = 16
+CACHE_SENTENCIAS = 256
+TAMANO_COLA_ESCRITURA = 1000   # operaciones pendientes; con la cola llena, quien escribe espera
+ESPERA_COLA_ESCRITURA = 10     # segundos máximos esperando lugar en la cola
+ESPERA_ESCRITURA = float(os.environ.get('INVENTARIO_ESPERA_ESCRITURA', '30'))  # s que escribir() espera su turno
+MAX_LOTE_ESCRITURA = 64        # operaciones por transacción (group commit)
+REINTENTOS_ESCRITURA = 6
+ESPERA_REINTENTO = 0.05        # segundos antes del primer reintento; se duplica en cada uno
+BUSY_TIMEOUT_ESCRITOR = 2000   # ms que espera el escritor a otro proceso antes de reintentar
+
+# Se aplican a cada conexión nueva. WAL permite que los lectores no se bloqueen con los escritores.
+PRAGMAS_CONEXION = (
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-32000",      # ~32 MB de caché de páginas por conexión
+    "PRAGMA mmap_size=268435456",    # 256 MB mapeados en memoria
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=60000",
+)
+
+# --- POOL DE CONEXIONES ---
+# Vive a nivel de módulo: Streamlit re-ejecuta app.py en cada rerun, pero este módulo se importa
+# una sola vez por proceso, así que todas las sesiones comparten el mismo pool.
+_pool = queue.LifoQueue(maxsize=TAMANO_POOL)
+_wal_activado = False
+
+# Se incrementa cada vez que una conexión de este proceso modifica filas. Permite a las
+# cachés saber que no hubo escrituras locales sin tener que consultar SQLite.
+_generacion = 0
+_lock_generacion = threading.Lock()
+
+def generacion_escrituras():
+    return _generacion
+
+def _marcar_escritura():
+    global _generacion
+    with _lock_generacion: _generacion += 1
+
+# Funciones extra que recibe cada conexión nueva y cada conexión que vuelve al pool
+# (conteo de sentencias de benchmark.py, mediciones de diagnostico.py)
+_al_conectar = []
+_al_liberar = []
+
+def al_conectar(funcion):
+    _al_conectar.append(funcion)
+    return funcion
+
+def al_liberar(funcion):
+    _al_liberar.append(funcion)
+    return funcion
+
+_fabrica_conexion = sqlite3.Connection
+
+def usar_fabrica_conexion(fabrica):
+    # Subclase de sqlite3.Connection para las conexiones nuevas (diagnostico.py mide sus sentencias)
+    global _fabrica_conexion
+    _fabrica_conexion = fabrica
+
+def _nueva_conexion():
+    global _wal_activado
+    conn = sqlite3.connect(RUTA_DB, check_same_thread=False, timeout=60, cached_statements=CACHE_SENTENCIAS,
+                           factory=_fabrica_conexion)
+    if not _wal_activado:
+        # journal_mode=WAL es persistente en el archivo, basta con activarlo una vez por proceso
+        conn.execute("PRAGMA journal_mode=WAL")
+        _wal_activado = True
+    for pragma in PRAGMAS_CONEXION: conn.execute(pragma)
+    for funcion in _al_conectar: funcion(conn)
+    return conn
+
+@contextmanager
+def conectar_db():
+    try: conn = _pool.get_nowait()
+    except queue.Empty: conn = _nueva_conexion()
+    cambios_previos = conn.total_changes
+    try:
+        # Mismo comportamiento que "with sqlite3.connect(...)": commit al salir, rollback si hay error
+        with conn: yield conn
+    finally:
+        if conn.in_transaction: conn.rollback()
+        if conn.total_changes != cambios_previos: _marcar_escritura()
+        for funcion in _al_liberar: funcion(conn)
+        try: _pool.put_nowait(conn)
+        except queue.Full: conn.close()
+
+def cerrar_pool():
+    while True:
+        try: _pool.get_nowait().close()
+        except queue.Empty: break
+
+# --- ESCRITOR ÚNICO ---
+# Las escrituras de la app no se hacen en el hilo de cada sesión: se encolan para un solo hilo con
+# su propia conexión. Las operaciones que esperan se confirman juntas (group commit: un COMMIT por
+# lote); si una falla, el lote se deshace y se repite de a una operación, así el error de una no
+# deshace las demás. No se usa un SAVEPOINT por operación: con los triggers de activos su costo
+# crece con el cuadrado de las filas tocadas. Si otro proceso tiene el bloqueo, el lote se
+# reintenta con espera exponencial en lugar de congelar la sesión.
+# Una operación es una función (conn, *args) que no hace commit; quien la envía recibe un Future.
+# Con transaccion=False corre sola y sin BEGIN (VACUUM no admite transacción): las demás esperan en
+# la cola en lugar de fallar por bloqueo.
+# escribir() no espera para siempre: si la operación sigue en cola pasado el plazo se cancela (el
+# escritor la salta, nunca se aplica) y se lanza BaseOcupada para que la interfaz lo avise.
+
+class BaseOcupada(Exception):
+    pass
+
+_cola_escritura = queue.Queue(maxsize=TAMANO_COLA_ESCRITURA)
+_hilo_escritor = None
+_lock_escritor = threading.Lock()
+
+def _es_bloqueo(error):
+    return isinstance(error, sqlite3.OperationalError) and ("locked" in str(error) or "busy" in str(error))
+
+def _transaccion(conn, operaciones):
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        resultados = [funcion(conn, *args) for funcion, args, _, _ in operaciones]
+        conn.execute("COMMIT")
+    finally:
+        if conn.in_transaction: conn.execute("ROLLBACK")
+    return resultados
+
+def _con_reintentos(conn, operaciones):
+    for intento in range(REINTENTOS_ESCRITURA):
+        try: return _transaccion(conn, operaciones)
+        except Exception as e:
+            if not _es_bloqueo(e) or intento == REINTENTOS_ESCRITURA - 1: raise
+            time.sleep(ESPERA_REINTENTO * 2 ** intento)
+
+def _escribir_lote(conn, lote):
+    try: return [(resultado, None) for resultado in _con_reintentos(conn, lote)]
+    except Exception as e:
+        if len(lote) == 1: return [(None, e)]
+    # Alguna falló y el lote entero se deshizo: se aplican de a una para aislar el error
+    resultados = []
+    for operacion in lote:
+        try: resultados.append((_con_reintentos(conn, [operacion])[0], None))
+        except Exception as e: resultados.append((None, e))
+    return resultados
+
+def _sin_transaccion(conn, operacion):
+    funcion, args, _, _ = operacion
+    try: return [(funcion(conn, *args), None)]
+    except Exception as e: return [(None, e)]
+
+def en_transaccion(conn, funcion, *args):
+    # Para operaciones enviadas con transaccion=False que deben confirmar su parte en la base antes de
+    # seguir (p. ej. mover archivos solo después del COMMIT): BEGIN IMMEDIATE con los mismos reintentos
+    return _con_reintentos(conn, [(funcion, args, None, True)])[0]
+
+def _bucle_escritor():
+    conn = _nueva_conexion()
+    conn.isolation_level = None  # BEGIN/COMMIT explícitos
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_ESCRITOR}")
+    siguiente = None
+    while True:
+        lote = [siguiente or _cola_escritura.get()]
+        siguiente = None
+        # Sin esperas artificiales: se agrupa lo que llegó mientras se confirmaba el lote anterior
+        while lote[0][3] and len(lote) < MAX_LOTE_ESCRITURA:
+            try: operacion = _cola_escritura.get_nowait()
+            except queue.Empty: break
+            if not operacion[3]: siguiente = operacion; break
+            lote.append(operacion)
+        # Las que quien las envió ya canceló (se cansó de esperar) no se ejecutan
+        lote = [operacion for operacion in lote if operacion[2].set_running_or_notify_cancel()]
+        if not lote: continue
+        cambios_previos = conn.total_changes
+        try: resultados = _escribir_lote(conn, lote) if lote[0][3] else _sin_transaccion(conn, lote[0])
+        except BaseException as e: resultados = [(None, e)] * len(lote)  # el hilo no debe morir
+        if conn.total_changes != cambios_previos: _marcar_escritura()
+        for funcion in _al_liberar: funcion(conn)
+        for (_, _, futuro, _), (resultado, error) in zip(lote, resultados):
+            if error is None: futuro.set_result(resultado)
+            else: futuro.set_exception(error)
+
+def enviar_escritura(funcion, *args, transaccion=True):
+    global _hilo_escritor
+    if _hilo_escritor is None:
+        with _lock_escritor:
+            if _hilo_escritor is None:
+                _hilo_escritor = threading.Thread(target=_bucle_escritor, name="escritor_db", daemon=True)
+                _hilo_escritor.start()
+    futuro = Future()
+    try: _cola_escritura.put((funcion, args, futuro, transaccion), timeout=ESPERA_COLA_ESCRITURA)
+    except queue.Full: raise BaseOcupada("La base de datos está saturada de escrituras. No se guardó nada; intente de nuevo.")
+    return futuro
+
+def escribir(funcion, *args, transaccion=True, espera=ESPERA_ESCRITURA):
+    # Espera el resultado; las excepciones de la operación (p. ej. IntegrityError) se relanzan aquí.
+    # espera=None solo para trabajos de fondo (mantenimiento) que pueden esperar lo que haga falta.
+    futuro = enviar_escritura(funcion, *args, transaccion=transaccion)
+    try: return futuro.result(timeout=espera)
+    except TiempoAgotado:
+        # Si ya empezó a ejecutarse no se puede cancelar: termina pronto, se espera su resultado
+        if not futuro.cancel(): return futuro.result()
+        raise BaseOcupada("La base de datos está ocupada (mantenimiento u otra operación larga). "
+                          "No se guardó nada; intente de nuevo en unos minutos.")
+
+# --- ESQUEMA Y MIGRACIONES ---
+# Cada migración se aplica una sola vez y deja su número en PRAGMA user_version. Después de la
+# primera llamada en el proceso, inicializar_db() no ejecuta nada (ni siquiera lee la versión).
+# Las migraciones usan IF NOT EXISTS porque las bases creadas antes de este esquema de versiones
+# arrancan en user_version = 0 aunque ya tengan parte de las tablas.
+
+def _agregar_columna(c, tabla, columna, tipo):
+    if columna not in [col[1] for col in c.execute(f"PRAGMA table_info({tabla})")]:
+        c.execute(f"ALTER TABLE {tabla} ADD COLUMN {columna} {tipo}")
+
+def _m001_esquema_base(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS activos (
+                    id TEXT PRIMARY KEY, descripcion TEXT, ubicacion TEXT,
+                    ultima_revision DATE, estado TEXT, modelo TEXT,
+                    marca TEXT, motivo_estado TEXT, categoria TEXT, pais TEXT,
+                    placa TEXT)''')
+    # Bases anteriores a categoria/pais/placa
+    for columna in ("categoria", "pais", "placa"): _agregar_columna(c, "activos", columna, "TEXT")
+    c.execute('''CREATE TABLE IF NOT EXISTS ubicaciones (
+                    nombre TEXT,
+                    pais TEXT,
+                    PRIMARY KEY (nombre, pais))''')
+    c.execute('''CREATE TABLE IF NOT EXISTS fotos (id_activo TEXT, path TEXT)''')
+    c.execute('''CREATE TABLE IF NOT EXISTS documentos (id_activo TEXT, path TEXT, nombre_real TEXT)''')
+    c.execute('''CREATE TABLE IF NOT EXISTS historial (id_activo TEXT, origen TEXT, destino TEXT, fecha TIMESTAMP, motivo TEXT)''')
+    c.execute('''CREATE TABLE IF NOT EXISTS activos_eliminados (id TEXT, ubicacion TEXT, fecha_eliminacion TIMESTAMP, motivo TEXT)''')
+
+def _m002_indices(c):
+    # Dashboard: los filtros por selectbox van en el mismo orden que la UI
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_activos_filtros ON activos (categoria, pais, estado, ubicacion)''')
+    # Adjuntos: búsqueda por activo (carga de la página) y por ruta (borrado desde edición)
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_fotos_activo ON fotos (id_activo)''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_fotos_path ON fotos (path)''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_documentos_activo ON documentos (id_activo)''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_documentos_path ON documentos (path)''')
+    # Historiales: paginación por fecha y línea de tiempo por activo
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_historial_fecha ON historial (fecha)''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_historial_activo_fecha ON historial (id_activo, fecha)''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_eliminados_fecha ON activos_eliminados (fecha_eliminacion)''')
+
+def _m003_control_cambios(c):
+    # Contador por tabla que suben los triggers en cada escritura. Cada fila de activos guarda la
+    # versión en la que cambió por última vez y los borrados quedan en activos_borrados, así la
+    # instantánea compartida (instantanea.py) solo relee lo que cambió.
+    _agregar_columna(c, "activos", "version", "INTEGER DEFAULT 0")
+    c.execute('''CREATE TABLE IF NOT EXISTS contador_cambios (tabla TEXT PRIMARY KEY, version INTEGER NOT NULL DEFAULT 0)''')
+    c.executemany("INSERT OR IGNORE INTO contador_cambios (tabla, version) VALUES (?, 0)", [("activos",), ("ubicaciones",), ("historial",)])
+    c.execute('''CREATE TABLE IF NOT EXISTS activos_borrados (id TEXT, version INTEGER)''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_activos_borrados_version ON activos_borrados (version)''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_activos_version ON activos (version)''')
+
+    c.execute('''CREATE TRIGGER IF NOT EXISTS trg_activos_insert AFTER INSERT ON activos BEGIN
+                    UPDATE contador_cambios SET version = version + 1 WHERE tabla = 'activos';
+                    UPDATE activos SET version = (SELECT version FROM contador_cambios WHERE tabla = 'activos') WHERE rowid = NEW.rowid;
+                 END''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS trg_activos_update AFTER UPDATE ON activos WHEN NEW.version IS OLD.version BEGIN
+                    UPDATE contador_cambios SET version = version + 1 WHERE tabla = 'activos';
+                    UPDATE activos SET version = (SELECT version FROM contador_cambios WHERE tabla = 'activos') WHERE rowid = NEW.rowid;
+                 END''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS trg_activos_delete AFTER DELETE ON activos BEGIN
+                    UPDATE contador_cambios SET version = version + 1 WHERE tabla = 'activos';
+                    INSERT INTO activos_borrados (id, version) SELECT OLD.id, version FROM contador_cambios WHERE tabla = 'activos';
+                 END''')
+    for evento in ("INSERT", "UPDATE", "DELETE"):
+        c.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_ubicaciones_{evento.lower()} AFTER {evento} ON ubicaciones BEGIN
+                         UPDATE contador_cambios SET version = version + 1 WHERE tabla = 'ubicaciones';
+                      END''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS trg_historial_insert AFTER INSERT ON historial BEGIN
+                    UPDATE contador_cambios SET version = version + 1 WHERE tabla = 'historial';
+                 END''')
+
+def _m004_busqueda_fts(c):
+    # Índice trigram sobre activos (tabla de contenido externo): sirve para búsquedas por subcadena
+    # y prefijo de 3+ caracteres. Los triggers lo mantienen sincronizado con activos.
+    existe_fts = c.execute("SELECT 1 FROM sqlite_master WHERE name = 'activos_fts'").fetchone()
+    c.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS activos_fts USING fts5(
+                    id, placa, marca, modelo, descripcion, motivo_estado,
+                    content='activos', tokenize='trigram')''')
+    columnas_fts = "id, placa, marca, modelo, descripcion, motivo_estado"
+    valores_new = ", ".join(f"new.{col}" for col in columnas_fts.split(", "))
+    valores_old = ", ".join(f"old.{col}" for col in columnas_fts.split(", "))
+    c.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_activos_fts_insert AFTER INSERT ON activos BEGIN
+                     INSERT INTO activos_fts (rowid, {columnas_fts}) VALUES (new.rowid, {valores_new});
+                  END''')
+    c.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_activos_fts_delete AFTER DELETE ON activos BEGIN
+                     INSERT INTO activos_fts (activos_fts, rowid, {columnas_fts}) VALUES ('delete', old.rowid, {valores_old});
+                  END''')
+    c.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_activos_fts_update AFTER UPDATE OF {columnas_fts} ON activos BEGIN
+                     INSERT INTO activos_fts (activos_fts, rowid, {columnas_fts}) VALUES ('delete', old.rowid, {valores_old});
+                     INSERT INTO activos_fts (rowid, {columnas_fts}) VALUES (new.rowid, {valores_new});
+                  END''')
+    if not existe_fts: c.execute("INSERT INTO activos_fts (activos_fts) VALUES ('rebuild')")
+
+def _m005_blobs(c):
+    # Un registro por archivo físico (almacenamiento.py); referencias = filas de fotos/documentos que lo usan
+    c.execute('''CREATE TABLE IF NOT EXISTS blobs (path TEXT PRIMARY KEY, sha256 TEXT, tamano INTEGER, referencias INTEGER NOT NULL DEFAULT 0)''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_blobs_sha256 ON blobs (sha256)''')
+    for tabla in ("fotos", "documentos"):
+        c.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_{tabla}_ref_insert AFTER INSERT ON {tabla} BEGIN
+                         UPDATE blobs SET referencias = referencias + 1 WHERE path = NEW.path;
+                      END''')
+        c.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_{tabla}_ref_delete AFTER DELETE ON {tabla} BEGIN
+                         UPDATE blobs SET referencias = referencias - 1 WHERE path = OLD.path;
+                      END''')
+
+def _m006_operaciones_masivas(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS operaciones_masivas (id TEXT PRIMARY KEY, tipo TEXT, fecha TIMESTAMP)''')
+
+def _m007_resumen_y_estados(c):
+    # Conteos precalculados por categoría × país × estado × ubicación; los triggers los mantienen al día
+    # para que métricas y gráficos lean unos cientos de filas en lugar de recorrer el inventario.
+    c.execute('''CREATE TABLE IF NOT EXISTS resumen_activos (
+                    categoria TEXT NOT NULL, pais TEXT NOT NULL, estado TEXT NOT NULL, ubicacion TEXT NOT NULL,
+                    cantidad INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (categoria, pais, estado, ubicacion))''')
+    claves_new = "coalesce(NEW.categoria, ''), coalesce(NEW.pais, ''), coalesce(NEW.estado, ''), coalesce(NEW.ubicacion, '')"
+    filtro_old = ("categoria = coalesce(OLD.categoria, '') AND pais = coalesce(OLD.pais, '') "
+                  "AND estado = coalesce(OLD.estado, '') AND ubicacion = coalesce(OLD.ubicacion, '')")
+    sumar = f'''INSERT INTO resumen_activos (categoria, pais, estado, ubicacion, cantidad) VALUES ({claves_new}, 1)
+                 ON CONFLICT (categoria, pais, estado, ubicacion) DO UPDATE SET cantidad = cantidad + 1;'''
+    restar = f"UPDATE resumen_activos SET cantidad = cantidad - 1 WHERE {filtro_old};"
+    c.execute(f"CREATE TRIGGER IF NOT EXISTS trg_resumen_insert AFTER INSERT ON activos BEGIN {sumar} END")
+    c.execute(f"CREATE TRIGGER IF NOT EXISTS trg_resumen_delete AFTER DELETE ON activos BEGIN {restar} END")
+    c.execute(f"CREATE TRIGGER IF NOT EXISTS trg_resumen_update AFTER UPDATE OF categoria, pais, estado, ubicacion ON activos BEGIN {restar} {sumar} END")
+    c.execute("DELETE FROM resumen_activos")
+    c.execute('''INSERT INTO resumen_activos (categoria, pais, estado, ubicacion, cantidad)
+                 SELECT coalesce(categoria, ''), coalesce(pais, ''), coalesce(estado, ''), coalesce(ubicacion, ''), COUNT(*)
+                 FROM activos GROUP BY 1, 2, 3, 4''')
+
+    # Cambios de estado (historial solo registra traslados). Se parte del estado actual de cada activo.
+    fecha_actual = "strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime')"
+    c.execute('''CREATE TABLE IF NOT EXISTS historial_estados (id_activo TEXT, estado_anterior TEXT, estado_nuevo TEXT, fecha TIMESTAMP)''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_historial_estados_fecha ON historial_estados (fecha)''')
+    c.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_estados_insert AFTER INSERT ON activos BEGIN
+                     INSERT INTO historial_estados VALUES (NEW.id, NULL, NEW.estado, {fecha_actual});
+                  END''')
+    c.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_estados_update AFTER UPDATE OF estado ON activos WHEN OLD.estado IS NOT NEW.estado BEGIN
+                     INSERT INTO historial_estados VALUES (NEW.id, OLD.estado, NEW.estado, {fecha_actual});
+                  END''')
+    c.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_estados_delete AFTER DELETE ON activos BEGIN
+                     INSERT INTO historial_estados VALUES (OLD.id, OLD.estado, NULL, {fecha_actual});
+                  END''')
+    if not c.execute("SELECT 1 FROM historial_estados LIMIT 1").fetchone():
+        c.execute(f"INSERT INTO historial_estados SELECT id, NULL, estado, {fecha_actual} FROM activos")
+
+def _m008_mantenimiento(c):
+    # Una fila por ejecución de mantenimiento.py; la fila se crea al empezar (reserva el turno entre procesos)
+    c.execute('''CREATE TABLE IF NOT EXISTS mantenimiento_ejecuciones (
+                    fecha TIMESTAMP PRIMARY KEY, segundos REAL, archivos_cuarentena INTEGER, bytes_cuarentena INTEGER,
+                    restaurados INTEGER, derivados_borrados INTEGER, purgados INTEGER, bytes_liberados INTEGER,
+                    activos_sin_ubicacion INTEGER, tareas_base TEXT, bytes_base_liberados INTEGER)''')
+
+def _m009_contador_adjuntos(c):
+    # Versiones de fotos y documentos para los ETag de la API (api.py)
+    c.executemany("INSERT OR IGNORE INTO contador_cambios (tabla, version) VALUES (?, 0)", [("fotos",), ("documentos",)])
+    for tabla in ("fotos", "documentos"):
+        for evento in ("INSERT", "UPDATE", "DELETE"):
+            c.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_{tabla}_version_{evento.lower()} AFTER {evento} ON {tabla} BEGIN
+                             UPDATE contador_cambios SET version = version + 1 WHERE tabla = '{tabla}';
+                          END''')
+
+# Tablas del diario de cambios (sincronizacion.py): columnas que identifican la fila y columnas que se copian
+TABLAS_DIARIO = {
+    "activos": (("id",), ("id", "placa", "marca", "modelo", "categoria", "pais", "ubicacion", "estado", "motivo_estado",
+                          "descripcion", "ultima_revision")),
+    "ubicaciones": (("nombre", "pais"), ("nombre", "pais")),
+    "fotos": (("id_activo", "path"), ("id_activo", "path")),
+    "documentos": (("id_activo", "path"), ("id_activo", "path", "nombre_real")),
+    "historial": (("id_activo", "fecha", "destino"), ("id_activo", "origen", "destino", "fecha", "motivo")),
+}
+
+def _m010_diario_cambios(c):
+    # Cada escritura en las tablas de TABLAS_DIARIO deja una entrada con número de secuencia creciente
+    # y su estampa (fecha UTC, sitio de origen). Al importar cambios de otro sitio, sincronizacion.py
+    # llena sincronizacion_contexto dentro de la misma transacción para que la entrada conserve la
+    # estampa original; fuera de una importación esa tabla está vacía.
+    c.execute('''CREATE TABLE IF NOT EXISTS diario_cambios (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT, tabla TEXT NOT NULL, clave TEXT NOT NULL,
+                    operacion TEXT NOT NULL, fila TEXT, fecha TEXT NOT NULL, origen TEXT NOT NULL)''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_diario_clave ON diario_cambios (tabla, clave, fecha, origen)''')
+    c.execute('''CREATE TABLE IF NOT EXISTS sincronizacion_sitio (id TEXT NOT NULL)''')
+    if not c.execute("SELECT 1 FROM sincronizacion_sitio").fetchone():
+        c.execute("INSERT INTO sincronizacion_sitio VALUES (lower(hex(randomblob(8))))")
+    c.execute('''CREATE TABLE IF NOT EXISTS sincronizacion_contexto (fecha TEXT, origen TEXT)''')
+    c.execute('''CREATE TABLE IF NOT EXISTS sincronizacion_pares (
+                    sitio TEXT PRIMARY KEY, recibido INTEGER NOT NULL DEFAULT 0, confirmado INTEGER NOT NULL DEFAULT 0,
+                    faltan_aqui TEXT NOT NULL DEFAULT '[]', faltan_alla TEXT NOT NULL DEFAULT '[]')''')
+    c.execute('''CREATE TABLE IF NOT EXISTS blobs_en_par (sitio TEXT, path TEXT, PRIMARY KEY (sitio, path))''')
+
+    fecha = "COALESCE((SELECT fecha FROM sincronizacion_contexto), strftime('%Y-%m-%d %H:%M:%f', 'now'))"
+    origen = "COALESCE((SELECT origen FROM sincronizacion_contexto), (SELECT id FROM sincronizacion_sitio))"
+    for tabla, (claves, columnas) in TABLAS_DIARIO.items():
+        clave_new = f"json_array({', '.join(f'NEW.{col}' for col in claves)})"
+        clave_old = f"json_array({', '.join(f'OLD.{col}' for col in claves)})"
+        fila_new = "json_object(" + ", ".join(f"'{col}', NEW.{col}" for col in columnas) + ")"
+        registrar = "INSERT INTO diario_cambios (tabla, clave, operacion, fila, fecha, origen)"
+        c.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_{tabla}_diario_insert AFTER INSERT ON {tabla} BEGIN
+                         {registrar} VALUES ('{tabla}', {clave_new}, 'I', {fila_new}, {fecha}, {origen});
+                      END''')
+        c.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_{tabla}_diario_delete AFTER DELETE ON {tabla} BEGIN
+                         {registrar} VALUES ('{tabla}', {clave_old}, 'D', NULL, {fecha}, {origen});
+                      END''')
+        # Si cambia la clave, para los demás sitios es un borrado de la fila vieja más la fila nueva
+        c.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_{tabla}_diario_update AFTER UPDATE OF {', '.join(columnas)} ON {tabla} BEGIN
+                         {registrar} SELECT '{tabla}', {clave_old}, 'D', NULL, {fecha}, {origen} WHERE {clave_old} IS NOT {clave_new};
+                         {registrar} VALUES ('{tabla}', {clave_new}, 'U', {fila_new}, {fecha}, {origen});
+                      END''')
+
+# Intervalo inicial entre revisiones por categoría (días); se ajusta desde la página REVISIONES
+INTERVALOS_REVISION = {"Maquinaria Pesada": 90, "Maquinaria Ligera": 120, "Vehículos (Flota)": 180,
+                       "Equipos Industriales/Planta": 180, "Equipos de T.I.": 365}
+FORMATOS_FECHA_ANTIGUOS = ("%d/%m/%Y", "%d-%m-%Y", "%Y/%m/%d", "%Y-%m-%d %H:%M:%S", "%d/%m/%y")
+
+def _fecha_iso(texto):
+    for formato in FORMATOS_FECHA_ANTIGUOS:
+        try: return datetime.strptime(texto.strip(), formato).strftime("%Y-%m-%d")
+        except ValueError: pass
+    return None
+
+def _m011_revisiones(c):
+    # ultima_revision queda siempre como AAAA-MM-DD (las fechas antiguas en otros formatos se convierten una vez)
+    # y proxima_revision = ultima_revision + intervalo de la categoría, mantenida por triggers. Así la lista de
+    # vencidos es un rango sobre un índice y no hace falta leer y convertir cada fila.
+    c.execute('''CREATE TABLE IF NOT EXISTS intervalos_revision (categoria TEXT PRIMARY KEY, dias INTEGER NOT NULL CHECK (dias > 0))''')
+    c.executemany("INSERT OR IGNORE INTO intervalos_revision (categoria, dias) VALUES (?, ?)", INTERVALOS_REVISION.items())
+    antiguas = c.execute("""SELECT rowid, ultima_revision FROM activos WHERE ultima_revision IS NOT NULL AND ultima_revision != ''
+                            AND ultima_revision NOT GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'""").fetchall()
+    c.executemany("UPDATE activos SET ultima_revision=? WHERE rowid=?", [(_fecha_iso(str(f)), r) for r, f in antiguas if _fecha_iso(str(f))])
+
+    _agregar_columna(c, "activos", "proxima_revision", "TEXT")
+    proxima = "date(NEW.ultima_revision, '+' || (SELECT dias FROM intervalos_revision WHERE categoria = NEW.categoria) || ' days')"
+    c.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_activos_proxima_insert AFTER INSERT ON activos BEGIN
+                     UPDATE activos SET proxima_revision = {proxima} WHERE rowid = NEW.rowid;
+                  END''')
+    c.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_activos_proxima_update AFTER UPDATE OF ultima_revision, categoria ON activos BEGIN
+                     UPDATE activos SET proxima_revision = {proxima} WHERE rowid = NEW.rowid;
+                  END''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS trg_intervalos_update AFTER UPDATE OF dias ON intervalos_revision BEGIN
+                    UPDATE activos SET proxima_revision = date(ultima_revision, '+' || NEW.dias || ' days') WHERE categoria = NEW.categoria;
+                 END''')
+    c.execute('''UPDATE activos SET proxima_revision = date(ultima_revision, '+' ||
+                    (SELECT dias FROM intervalos_revision i WHERE i.categoria = activos.categoria) || ' days')''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_activos_revision ON activos (ultima_revision, categoria, pais)''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_activos_proxima ON activos (proxima_revision, pais, categoria)''')
+
+def _m012_contador_historial(c):
+    # La sincronización también corrige y borra movimientos: el ETag de /historial debe cambiar con ellos
+    for evento in ("UPDATE", "DELETE"):
+        c.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_historial_{evento.lower()} AFTER {evento} ON historial BEGIN
+                         UPDATE contador_cambios SET version = version + 1 WHERE tabla = 'historial';
+                      END''')
+
+def _m013_proxima_en_version(c):
+    # proxima_revision se calcula en el mismo UPDATE que fija la versión de la fila. Con triggers aparte,
+    # su UPDATE volvía a disparar trg_activos_update y cada alta o edición subía el contador dos veces.
+    proxima = "date(NEW.ultima_revision, '+' || (SELECT dias FROM intervalos_revision WHERE categoria = NEW.categoria) || ' days')"
+    for nombre in ("trg_activos_proxima_insert", "trg_activos_proxima_update", "trg_activos_insert", "trg_activos_update"):
+        c.execute(f"DROP TRIGGER IF EXISTS {nombre}")
+    c.execute(f'''CREATE TRIGGER trg_activos_insert AFTER INSERT ON activos BEGIN
+                     UPDATE contador_cambios SET version = version + 1 WHERE tabla = 'activos';
+                     UPDATE activos SET version = (SELECT version FROM contador_cambios WHERE tabla = 'activos'),
+                                        proxima_revision = {proxima} WHERE rowid = NEW.rowid;
+                  END''')
+    c.execute(f'''CREATE TRIGGER trg_activos_update AFTER UPDATE ON activos WHEN NEW.version IS OLD.version BEGIN
+                     UPDATE contador_cambios SET version = version + 1 WHERE tabla = 'activos';
+                     UPDATE activos SET version = (SELECT version FROM contador_cambios WHERE tabla = 'activos'),
+                                        proxima_revision = {proxima} WHERE rowid = NEW.rowid;
+                  END''')
+
+def _m014_poda_borrados(c):
+    # Las lápidas de activos_borrados llevan fecha para que mantenimiento.py borre las viejas. La fila
+    # 'activos_borrados' de contador_cambios guarda la versión más alta podada: una instantánea anterior
+    # a ella ya no puede refrescarse por deltas y se recarga entera.
+    _agregar_columna(c, "activos_borrados", "fecha", "TIMESTAMP")
+    _agregar_columna(c, "mantenimiento_ejecuciones", "borrados_podados", "INTEGER")
+    c.execute("INSERT OR IGNORE INTO contador_cambios (tabla, version) VALUES ('activos_borrados', 0)")
+    c.execute("DROP TRIGGER IF EXISTS trg_activos_delete")
+    c.execute('''CREATE TRIGGER trg_activos_delete AFTER DELETE ON activos BEGIN
+                    UPDATE contador_cambios SET version = version + 1 WHERE tabla = 'activos';
+                    INSERT INTO activos_borrados (id, version, fecha)
+                        SELECT OLD.id, version, datetime('now') FROM contador_cambios WHERE tabla = 'activos';
+                 END''')
+
+# El número de cada migración es su posición en la lista: solo se agregan al final, nunca se reordenan
+MIGRACIONES = [
+    _m001_esquema_base,
+    _m002_indices,
+    _m003_control_cambios,
+    _m004_busqueda_fts,
+    _m005_blobs,
+    _m006_operaciones_masivas,
+    _m007_resumen_y_estados,
+    _m008_mantenimiento,
+    _m009_contador_adjuntos,
+    _m010_diario_cambios,
+    _m011_revisiones,
+    _m012_contador_historial,
+    _m013_proxima_en_version,
+    _m014_poda_borrados,
+]
+
+_migrado = False
+_lock_migracion = threading.Lock()
+
+def version_esquema(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def inicializar_db():
+    global _migrado
+    if _migrado: return
+    with _lock_migracion:
+        if _migrado: return
+        with conectar_db() as conn:
+            for numero, migracion in enumerate(MIGRACIONES, start=1):
+                if version_esquema(conn) >= numero: continue
+                # BEGIN IMMEDIATE toma el bloqueo de escritura; si otro proceso la aplicó mientras tanto, se salta
+                conn.execute("BEGIN IMMEDIATE")
+                if version_esquema(conn) < numero:
+                    migracion(conn.cursor())
+                    conn.execute(f"PRAGMA user_version = {numero}")
+                conn.commit()
+        _migrado = True
@@ -0,0 +1,205 @@
+import argparse
+import json
+import os
+import resource
+import statistics
+import sys
+import time
+from contextlib import contextmanager
+from unittest import mock
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+from streamlit.testing.v1 import AppTest, local_script_runner
+import base_datos
+
+# --- BENCHMARK DE LA INTERFAZ ---
+# Recorre cada opción del menú de app.py sin navegador (AppTest) sobre una base ya poblada
+# (generar_datos.py) y mide por cada rerun: latencia, sentencias SQL, bytes enviados al navegador
+# y el pico de memoria del proceso por escenario. Compara contra una línea base guardada y
+# termina con código 1 si algo empeoró más de la tolerancia.
+# Uso: python benchmark.py --directorio bench --guardar-base   (primera vez)
+#      python benchmark.py --directorio bench                  (compara contra bench/benchmark_base.json)
+
+RUTA_APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+METRICAS = ("latencia_ms", "sentencias", "bytes")
+
+# Cada escenario arranca una sesión nueva en esa página y aplica los pasos en orden (un rerun por paso)
+ESCENARIOS = {
+    "DASHBOARD": [
+        ("categoria", lambda at: at.selectbox[0].select("Maquinaria Pesada")),
+        ("pagina_siguiente", lambda at: at.button(key="btn_next_VENEZUELA").click()),
+        ("filtro_estado", lambda at: at.selectbox(key="est_VENEZUELA").select("DAÑADO")),
+        ("busqueda_pais", lambda at: at.text_input(key="busq_VENEZUELA").input("CAT")),
+        ("vista_grilla", lambda at: at.segmented_control(key="vista_VENEZUELA").set_value("GRILLA")),
+        ("grilla_500_filas", lambda at: at.select_slider(key="filas_VENEZUELA").set_value(500)),
+        ("busqueda_global", lambda at: at.text_input(key="busq_global").input("HIDRAULICO")),
+    ],
+    "REGISTRAR ACTIVO": [
+        ("pais", lambda at: at.selectbox(key="reg_pais").select("COLOMBIA")),
+    ],
+    "IMPORTAR ACTIVOS": [],
+    "TRASLADOS": [
+        ("pagina_siguiente", lambda at: at.button(key="next_hist").click()),
+        ("filtro_pais", lambda at: at.selectbox(key="h_pais").select("COLOMBIA")),
+        ("seleccion_masiva", lambda at: at.selectbox(key="tm_pais").select("COLOMBIA")),
+    ],
+    "GESTIONAR UBICACIONES": [
+        ("pagina_siguiente", lambda at: at.button(key="next_u").click()),
+    ],
+    "HISTORIAL ELIMINADOS": [
+        ("pagina_siguiente", lambda at: at.button(key="next_elim").click()),
+    ],
+    "ANALÍTICA": [
+        ("categoria", lambda at: at.selectbox(key="ana_cat").select("Equipos de T.I.")),
+    ],
+    "REVISIONES": [
+        ("pagina_siguiente", lambda at: at.button(key="next_rev").click()),
+        ("filtro_pais", lambda at: at.selectbox(key="rev_pais").select("COLOMBIA")),
+        ("ventana", lambda at: at.selectbox(key="rev_ventana").select("PRÓXIMOS 30 DÍAS")),
+    ],
+}
+
+# --- CONTADORES ---
+class Contadores:
+    def __init__(self):
+        self.sentencias = 0
+        self.bytes = 0
+
+    def instalar(self, conn):
+        ultima = None
+        def contar(sql):
+            nonlocal ultima
+            # Los triggers repiten el texto de la sentencia que los disparó: no es una sentencia nueva
+            if sql != ultima and not sql.startswith("--"): self.sentencias += 1
+            ultima = sql
+        conn.set_trace_callback(contar)
+
+    def instantanea(self):
+        return self.sentencias, self.bytes
+
+@contextmanager
+def medir_envios(contadores):
+    # Bytes de los mensajes que el servidor manda al navegador más los archivos multimedia que sirve
+    original_parse = local_script_runner.parse_tree_from_messages
+    original_media = MemoryMediaFileStorage.load_and_get_id
+
+    def parse(mensajes):
+        contadores.bytes += sum(m.ByteSize() for m in mensajes)
+        return original_parse(mensajes)
+
+    def media(self, path_or_data, *args, **kwargs):
+        contadores.bytes += os.path.getsize(path_or_data) if isinstance(path_or_data, str) else len(path_or_data)
+        return original_media(self, path_or_data, *args, **kwargs)
+
+    with mock.patch.object(local_script_runner, "parse_tree_from_messages", parse), \
+         mock.patch.object(MemoryMediaFileStorage, "load_and_get_id", media):
+        yield
+
+# --- MEMORIA ---
+def reiniciar_pico_memoria():
+    # En Linux, escribir 5 en clear_refs reinicia VmHWM; si no se puede, se informa el pico del proceso
+    try:
+        with open("/proc/self/clear_refs", "w") as f: f.write("5")
+    except OSError:
+        pass
+
+def pico_memoria_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for linea in f:
+                if linea.startswith("VmHWM:"): return int(linea.split()[1]) / 1024
+    except OSError:
+        pass
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico / (1024 * 1024) if sys.platform == "darwin" else pico / 1024
+
+# --- EJECUCIÓN ---
+def ejecutar_escenario(menu, pasos, contadores, timeout):
+    resultados = []
+    at = AppTest.from_file(RUTA_APP, default_timeout=timeout)
+    at.session_state["navegacion_interna"] = menu
+    for nombre, accion in [("inicio", None)] + pasos:
+        if accion: accion(at)
+        sentencias, enviados = contadores.instantanea()
+        inicio = time.perf_counter()
+        at.run()
+        latencia = (time.perf_counter() - inicio) * 1000
+        if at.exception: raise RuntimeError(f"{menu} / {nombre}: {at.exception[0].message}")
+        resultados.append((nombre, {"latencia_ms": latencia, "sentencias": contadores.sentencias - sentencias,
+                                    "bytes": contadores.bytes - enviados}))
+    return resultados
+
+def ejecutar(repeticiones, timeout, escenarios):
+    contadores = Contadores()
+    base_datos.cerrar_pool()  # las conexiones nuevas ya nacen con el contador de sentencias
+    base_datos.al_conectar(contadores.instalar)
+    muestras, memoria = {}, {}
+    with medir_envios(contadores):
+        for menu in escenarios:
+            reiniciar_pico_memoria()
+            for _ in range(repeticiones):
+                for paso, valores in ejecutar_escenario(menu, ESCENARIOS[menu], contadores, timeout):
+                    muestras.setdefault(f"{menu} / {paso}", []).append(valores)
+            memoria[menu] = pico_memoria_mb()
+    # Mediana de cada métrica: la primera repetición paga las cachés frías
+    pasos = {clave: {m: statistics.median(v[m] for v in valores) for m in METRICAS} for clave, valores in muestras.items()}
+    return {"pasos": pasos, "memoria_mb": memoria}
+
+# --- COMPARACIÓN ---
+def _empeoro(actual, base, tolerancia, minimo):
+    return actual > base * (1 + tolerancia) and actual - base > minimo
+
+def comparar(resultado, base, tolerancia):
+    # Los mínimos absolutos evitan marcar como regresión el ruido de pasos que tardan pocos ms
+    minimos = {"latencia_ms": 5, "sentencias": 0, "bytes": 1024, "memoria_mb": 10}
+    regresiones = []
+    print(f"{'PASO':<45}{'LATENCIA ms':>22}{'SENTENCIAS':>18}{'BYTES':>26}")
+    for clave, valores in resultado["pasos"].items():
+        previo = base.get("pasos", {}).get(clave)
+        columnas = []
+        for m in METRICAS:
+            texto = f"{valores[m]:.1f}" if m == "latencia_ms" else f"{valores[m]:.0f}"
+            if previo and m in previo:
+                if previo[m]: texto += f" ({(valores[m] - previo[m]) / previo[m] * 100:+.0f}%)"
+                elif valores[m]: texto += " (antes 0)"
+                if _empeoro(valores[m], previo[m], tolerancia, minimos[m]): regresiones.append(f"{clave}: {m} {previo[m]:.0f} -> {valores[m]:.0f}")
+            columnas.append(texto)
+        print(f"{clave:<45}{columnas[0]:>22}{columnas[1]:>18}{columnas[2]:>26}")
+    print()
+    for menu, mb in resultado["memoria_mb"].items():
+        previo = base.get("memoria_mb", {}).get(menu)
+        print(f"{'PICO RSS ' + menu:<45}{mb:>14.1f} MB" + (f" (base {previo:.1f} MB)" if previo else ""))
+        if previo and _empeoro(mb, previo, tolerancia, minimos["memoria_mb"]): regresiones.append(f"{menu}: memoria_mb {previo:.0f} -> {mb:.0f}")
+    return regresiones
+
+def main():
+    parser = argparse.ArgumentParser(description="Mide cada página de app.py con AppTest y compara contra una línea base.")
+    parser.add_argument("--directorio", default=".", help="carpeta con la base y los adjuntos (ver generar_datos.py)")
+    parser.add_argument("--db", default="inventario.db")
+    parser.add_argument("--base", default="benchmark_base.json", help="archivo de línea base, relativo a --directorio")
+    parser.add_argument("--guardar-base", action="store_true", help="guardar el resultado como nueva línea base")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--tolerancia", type=float, default=0.20, help="empeoramiento relativo admitido (0.20 = 20%%)")
+    parser.add_argument("--escenario", action="append", choices=list(ESCENARIOS), help="limitar a estas páginas (repetible)")
+    parser.add_argument("--timeout", type=float, default=120)
+    args = parser.parse_args()
+
+    os.chdir(args.directorio)
+    if not os.path.exists(args.db): raise SystemExit(f"No existe {args.db} en {os.getcwd()}: genere datos con generar_datos.py")
+    base_datos.RUTA_DB = args.db
+    resultado = ejecutar(args.repeticiones, args.timeout, args.escenario or list(ESCENARIOS))
+
+    base = {}
+    if os.path.exists(args.base) and not args.guardar_base:
+        with open(args.base, encoding="utf-8") as f: base = json.load(f)
+    regresiones = comparar(resultado, base, args.tolerancia)
+    if args.guardar_base:
+        with open(args.base, "w", encoding="utf-8") as f: json.dump(resultado, f, indent=2, ensure_ascii=False)
+        print(f"\nLínea base guardada en {os.path.abspath(args.base)}")
+    elif regresiones:
+        print("\nREGRESIONES:\n  " + "\n  ".join(regresiones))
+        sys.exit(1)
+    elif not base:
+        print("\nSin línea base para comparar (use --guardar-base).")
+
+if __name__ == "__main__":
+    main()
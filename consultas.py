@@ -0,0 +1,233 @@
+import csv
+import io
+from datetime import timedelta
+import pandas as pd
+from base_datos import conectar_db
+
+# --- CONSULTAS DEL DASHBOARD ---
+# Los filtros de la interfaz se traducen a cláusulas WHERE parametrizadas para que
+# cada rerun lea únicamente las filas de la página visible.
+
+def _escapar_like(texto):
+    return texto.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+# Columnas que cubre el índice activos_fts y su peso en el ranking bm25
+COLUMNAS_BUSQUEDA = ["id", "placa", "marca", "modelo", "descripcion", "motivo_estado"]
+PESOS_BUSQUEDA = (10.0, 10.0, 4.0, 4.0, 1.0, 1.0)
+MIN_CARACTERES_FTS = 3  # el tokenizador trigram necesita al menos 3 caracteres por término
+
+def _separar_terminos(busqueda):
+    # Cada palabra se busca como subcadena literal y todas deben aparecer (AND implícito).
+    # Las de 3+ caracteres van al índice FTS; las más cortas no tienen trigramas y se resuelven con LIKE.
+    terminos = busqueda.upper().split()
+    largos = [t for t in terminos if len(t) >= MIN_CARACTERES_FTS]
+    cortos = [t for t in terminos if len(t) < MIN_CARACTERES_FTS]
+    consulta = " ".join('"' + t.replace('"', '""') + '"' for t in largos) or None
+    return consulta, cortos
+
+def _condiciones_like(cortos, alias=""):
+    condiciones, params = [], []
+    for termino in cortos:
+        condiciones.append("(" + " OR ".join(f"{alias}{col} LIKE ? ESCAPE '\\'" for col in COLUMNAS_BUSQUEDA) + ")")
+        params.extend([f"%{_escapar_like(termino)}%"] * len(COLUMNAS_BUSQUEDA))
+    return condiciones, params
+
+def _condiciones_busqueda(busqueda):
+    consulta, cortos = _separar_terminos(busqueda)
+    condiciones, params = _condiciones_like(cortos)
+    if consulta:
+        condiciones.insert(0, "rowid IN (SELECT rowid FROM activos_fts WHERE activos_fts MATCH ?)")
+        params.insert(0, consulta)
+    return condiciones, params
+
+def construir_filtros(categoria=None, pais=None, estado=None, ubicacion=None, busqueda=None):
+    condiciones, params = [], []
+    for columna, valor in (("categoria", categoria), ("pais", pais), ("estado", estado), ("ubicacion", ubicacion)):
+        if valor is not None:
+            condiciones.append(f"{columna} = ?")
+            params.append(valor)
+    if busqueda:
+        condiciones_busq, params_busq = _condiciones_busqueda(busqueda)
+        condiciones.extend(condiciones_busq)
+        params.extend(params_busq)
+    where = f" WHERE {' AND '.join(condiciones)}" if condiciones else ""
+    return where, params
+
+def contar_activos(**filtros):
+    where, params = construir_filtros(**filtros)
+    with conectar_db() as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM activos{where}", params).fetchone()[0]
+
+def pagina_activos(limite, offset, **filtros):
+    where, params = construir_filtros(**filtros)
+    with conectar_db() as conn:
+        return pd.read_sql_query(f"SELECT * FROM activos{where} ORDER BY rowid LIMIT ? OFFSET ?", conn, params=params + [limite, offset])
+
+def pagina_grilla(limite, cursor=None, **filtros):
+    # Vista de grilla: páginas de cientos de filas por cursor sobre rowid (sin OFFSET) y la
+    # primera foto de cada activo en la misma consulta, por idx_fotos_activo
+    where, params = construir_filtros(**filtros)
+    if cursor is not None:
+        where += f"{' AND' if where else ' WHERE'} rowid > ?"
+        params.append(cursor)
+    with conectar_db() as conn:
+        df = pd.read_sql_query(f"""SELECT rowid AS rowid_k, *, (SELECT f.path FROM fotos f WHERE f.id_activo = activos.id ORDER BY f.rowid LIMIT 1) AS foto
+                                   FROM activos{where} ORDER BY rowid LIMIT ?""", conn, params=params + [limite + 1])
+    siguiente = None
+    if len(df) > limite:
+        df = df.iloc[:limite]
+        siguiente = int(df["rowid_k"].iloc[-1])
+    return df.drop(columns="rowid_k"), siguiente
+
+def adjuntos_por_activo(ids):
+    # Una sola consulta por tabla para todos los activos de la página (evita N+1)
+    fotos = {id_activo: [] for id_activo in ids}
+    docs = {id_activo: [] for id_activo in ids}
+    if not ids: return fotos, docs
+    marcadores = ",".join("?" * len(ids))
+    with conectar_db() as conn:
+        for id_activo, path in conn.execute(f"SELECT id_activo, path FROM fotos WHERE id_activo IN ({marcadores}) ORDER BY rowid", ids):
+            fotos[id_activo].append(path)
+        for id_activo, path, nombre in conn.execute(f"SELECT id_activo, path, nombre_real FROM documentos WHERE id_activo IN ({marcadores}) ORDER BY rowid", ids):
+            docs[id_activo].append((path, nombre))
+    return fotos, docs
+
+def buscar_activos(busqueda, limite=50):
+    # Búsqueda global (todos los países y categorías) ordenada por relevancia
+    consulta, cortos = _separar_terminos(busqueda)
+    with conectar_db() as conn:
+        if consulta:
+            condiciones, params = _condiciones_like(cortos, alias="a.")
+            extra = "".join(f" AND {cond}" for cond in condiciones)
+            pesos = ", ".join(str(p) for p in PESOS_BUSQUEDA)
+            return pd.read_sql_query(f"""SELECT a.* FROM activos_fts f JOIN activos a ON a.rowid = f.rowid
+                                        WHERE activos_fts MATCH ?{extra} ORDER BY bm25(activos_fts, {pesos}) LIMIT ?""",
+                                     conn, params=[consulta] + params + [limite])
+        where, params = construir_filtros(busqueda=busqueda)
+        return pd.read_sql_query(f"SELECT * FROM activos{where} ORDER BY rowid LIMIT ?", conn, params=params + [limite])
+
+# --- HISTORIALES (PAGINACIÓN POR CURSOR) ---
+# En lugar de OFFSET se usa el último (fecha, rowid) de la página como cursor: cada página cuesta
+# lo mismo sin importar cuántos años de movimientos haya registrados.
+
+def _pagina_keyset(tabla, columna_fecha, limite, cursor, condiciones, params, columnas="*", ascendente=False):
+    condiciones, params = list(condiciones), list(params)
+    if cursor is not None:
+        condiciones.append(f"({columna_fecha}, rowid) {'>' if ascendente else '<'} (?, ?)")
+        params.extend(cursor)
+    where = f" WHERE {' AND '.join(condiciones)}" if condiciones else ""
+    orden = "ASC" if ascendente else "DESC"
+    with conectar_db() as conn:
+        df = pd.read_sql_query(f"SELECT rowid AS rowid_k, {columnas} FROM {tabla}{where} ORDER BY {columna_fecha} {orden}, rowid {orden} LIMIT ?",
+                               conn, params=params + [limite + 1])
+    siguiente = None
+    if len(df) > limite:
+        df = df.iloc[:limite]
+        siguiente = (df[columna_fecha].iloc[-1], int(df["rowid_k"].iloc[-1]))
+    return df.drop(columns="rowid_k"), siguiente
+
+def filtros_historial(id_activo=None, pais=None, destino=None, desde=None, hasta=None):
+    condiciones, params = [], []
+    if id_activo:
+        condiciones.append("id_activo = ?"); params.append(id_activo)
+    if destino:
+        condiciones.append("destino = ?"); params.append(destino)
+    if pais:
+        patron = f"{_escapar_like(pais)}-%"
+        condiciones.append("(origen LIKE ? ESCAPE '\\' OR destino LIKE ? ESCAPE '\\')"); params.extend([patron, patron])
+    if desde:
+        condiciones.append("fecha >= ?"); params.append(str(desde))
+    if hasta:
+        condiciones.append("fecha < date(?, '+1 day')"); params.append(str(hasta))
+    return condiciones, params
+
+def pagina_historial(limite, cursor=None, **filtros):
+    return _pagina_keyset("historial", "fecha", limite, cursor, *filtros_historial(**filtros))
+
+def pagina_eliminados(limite, cursor=None):
+    return _pagina_keyset("activos_eliminados", "fecha_eliminacion", limite, cursor, [], [])
+
+def historial_por_activo(ids, limite=5):
+    # Últimos movimientos de cada activo de la página en una sola consulta (índice id_activo, fecha)
+    movimientos = {id_activo: [] for id_activo in ids}
+    if not ids: return movimientos
+    with conectar_db() as conn:
+        filas = conn.execute(f"""SELECT id_activo, origen, destino, fecha, motivo FROM (
+                                    SELECT *, ROW_NUMBER() OVER (PARTITION BY id_activo ORDER BY fecha DESC) AS n
+                                    FROM historial WHERE id_activo IN ({','.join('?' * len(ids))}))
+                                 WHERE n <= ? ORDER BY id_activo, fecha DESC""", list(ids) + [limite]).fetchall()
+    for id_activo, origen, destino, fecha, motivo in filas:
+        movimientos[id_activo].append((origen, destino, fecha, motivo))
+    return movimientos
+
+# --- RESUMEN Y ANALÍTICA ---
+# Todo sale de resumen_activos / historial_estados / activos_eliminados agrupados: pocas filas por consulta.
+
+def conteos_por_pais(categoria):
+    with conectar_db() as conn:
+        return dict(conn.execute("SELECT pais, SUM(cantidad) FROM resumen_activos WHERE categoria = ? GROUP BY pais", (categoria,)).fetchall())
+
+def estado_por_pais(categoria=None):
+    where, params = (" WHERE categoria = ?", [categoria]) if categoria else ("", [])
+    with conectar_db() as conn:
+        return pd.read_sql_query(f"""SELECT pais, estado, SUM(cantidad) AS cantidad FROM resumen_activos{where}
+                                     GROUP BY pais, estado HAVING SUM(cantidad) > 0 ORDER BY pais, estado""", conn, params=params)
+
+def en_reparacion_por_mes():
+    # Saldo mensual de entradas y salidas de REPARACION; el acumulado da los activos en reparación
+    with conectar_db() as conn:
+        df = pd.read_sql_query("""SELECT substr(fecha, 1, 7) AS mes,
+                                         SUM(CASE WHEN estado_nuevo = 'REPARACION' THEN 1 ELSE 0 END)
+                                         - SUM(CASE WHEN estado_anterior = 'REPARACION' THEN 1 ELSE 0 END) AS saldo
+                                  FROM historial_estados GROUP BY mes ORDER BY mes""", conn)
+    df["en_reparacion"] = df["saldo"].cumsum()
+    return df
+
+def eliminados_por_mes():
+    with conectar_db() as conn:
+        return pd.read_sql_query("""SELECT substr(fecha_eliminacion, 1, 7) AS mes, COUNT(*) AS eliminados
+                                    FROM activos_eliminados GROUP BY mes ORDER BY mes""", conn)
+
+# --- REVISIONES ---
+# Todo se resuelve con rangos sobre proxima_revision (índice idx_activos_proxima): vencidos son los
+# de fecha anterior a hoy, y "esta semana" los que vencen entre hoy y dentro de 7 días.
+
+COLUMNAS_REVISION = "id, categoria, pais, ubicacion, estado, marca, modelo, ultima_revision, proxima_revision"
+DIAS_SEMANA = 7
+FILAS_POR_BLOQUE_CSV = 5000
+
+def filtros_revision(hasta, desde=None, pais=None, categoria=None):
+    condiciones, params = ["proxima_revision < ?"], [str(hasta)]
+    if desde:
+        condiciones.append("proxima_revision >= ?"); params.append(str(desde))
+    for columna, valor in (("pais", pais), ("categoria", categoria)):
+        if valor:
+            condiciones.append(f"{columna} = ?"); params.append(valor)
+    return condiciones, params
+
+def resumen_revisiones(hoy):
+    # Solo se lee el tramo del índice anterior a hoy + 7 días
+    with conectar_db() as conn:
+        return pd.read_sql_query("""SELECT pais, SUM(proxima_revision < ?) AS vencidos, SUM(proxima_revision >= ?) AS esta_semana
+                                    FROM activos WHERE proxima_revision < ? GROUP BY pais""",
+                                 conn, params=[str(hoy), str(hoy), str(hoy + timedelta(days=DIAS_SEMANA))])
+
+def pagina_revisiones(limite, cursor=None, **filtros):
+    # Lo más atrasado primero
+    return _pagina_keyset("activos", "proxima_revision", limite, cursor, *filtros_revision(**filtros), columnas=COLUMNAS_REVISION, ascendente=True)
+
+def revisiones_csv(**filtros):
+    # st.download_button necesita el archivo completo en bytes: se arma en memoria, pero directo desde el
+    # cursor por bloques, sin pasar por un DataFrame
+    condiciones, params = filtros_revision(**filtros)
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    with conectar_db() as conn:
+        cursor = conn.execute(f"SELECT {COLUMNAS_REVISION} FROM activos WHERE {' AND '.join(condiciones)} ORDER BY proxima_revision, rowid", params)
+        escritor.writerow([d[0] for d in cursor.description])
+        for filas in iter(lambda: cursor.fetchmany(FILAS_POR_BLOQUE_CSV), []): escritor.writerows(filas)
+    return buffer.getvalue().encode('utf-8')
+
+def intervalos_revision():
+    with conectar_db() as conn:
+        return pd.read_sql_query("SELECT categoria, dias FROM intervalos_revision ORDER BY categoria", conn)
@@ -0,0 +1,179 @@
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import weakref
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+import pandas as pd
+import base_datos
+
+# --- DIAGNÓSTICO DE RENDIMIENTO ---
+# Apagado por defecto. Con INVENTARIO_DIAGNOSTICO=1 las conexiones nuevas son _Conexion y registran sus
+# sentencias (texto, tiempo dentro de SQLite y filas), y app.py mide el tiempo de
+# cada página y de sus secciones. Las consultas lentas van a un log rotativo y el resumen (p50/p95)
+# se ve en la página DIAGNÓSTICO, protegida con INVENTARIO_CLAVE_ADMIN.
+# Apagado no se instala nada en las conexiones y seccion() devuelve un contexto vacío.
+
+ACTIVO = os.environ.get('INVENTARIO_DIAGNOSTICO', '0') == '1'
+UMBRAL_LENTA_MS = float(os.environ.get('INVENTARIO_LENTA_MS', '250'))
+CARPETA_DIAGNOSTICO = 'diagnostico'
+RUTA_LOG_LENTAS = os.path.join(CARPETA_DIAGNOSTICO, 'consultas_lentas.log')
+MAX_BYTES_LOG = 5 * 1024 * 1024
+COPIAS_LOG = 5
+MAX_REGISTROS = 20000  # por tipo de medición; las más viejas se descartan
+
+_sentencias = deque(maxlen=MAX_REGISTROS)  # (fecha, pagina, sql, ms, filas)
+_secciones = deque(maxlen=MAX_REGISTROS)   # (pagina, seccion, ms)
+_paginas = deque(maxlen=MAX_REGISTROS)     # (pagina, ms, sentencias, ms_sql)
+_hilo = threading.local()  # página y acumulados del rerun que corre en este hilo
+_log_lentas = logging.getLogger('inventario.consultas_lentas')
+_SIN_MEDICION = nullcontext()
+_LITERALES = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+# --- SENTENCIAS SQL ---
+# Se mide solo el tiempo dentro de SQLite: la llamada a execute y cada fetch o paso del iterador. Lo que
+# hace Python entre un fetch y otro (armar el DataFrame, dibujar la página) no cuenta. La sentencia se
+# registra cuando el cursor ejecuta otra, se cierra o se descarta, o cuando la conexión vuelve al pool.
+class _Cursor(sqlite3.Cursor):
+    sql, ms, filas = None, 0.0, 0
+
+    def _medir(self, metodo, *args):
+        inicio = time.perf_counter()
+        try: return metodo(*args)
+        finally: self.ms += (time.perf_counter() - inicio) * 1000
+
+    def _ejecutar(self, metodo, sql, *args):
+        self.terminar()
+        self.sql, self.ms, self.filas = sql, 0.0, 0
+        self.connection.cursores.add(self)
+        self._medir(metodo, sql, *args)
+        if self.rowcount > 0: self.filas = self.rowcount  # INSERT/UPDATE/DELETE
+        return self
+
+    def execute(self, sql, parametros=()): return self._ejecutar(super().execute, sql, parametros)
+    def executemany(self, sql, parametros): return self._ejecutar(super().executemany, sql, parametros)
+    def executescript(self, script): return self._ejecutar(super().executescript, script)
+
+    def _contar(self, filas):
+        if self.sql is not None: self.filas += len(filas)
+        return filas
+
+    def fetchone(self):
+        fila = self._medir(super().fetchone)
+        if fila is not None and self.sql is not None: self.filas += 1
+        return fila
+
+    def fetchmany(self, size=None): return self._contar(self._medir(super().fetchmany, size or self.arraysize))
+    def fetchall(self): return self._contar(self._medir(super().fetchall))
+
+    def __next__(self):
+        fila = self._medir(super().__next__)
+        if self.sql is not None: self.filas += 1
+        return fila
+
+    def close(self):
+        self.terminar()
+        super().close()
+
+    def __del__(self): self.terminar()
+
+    def terminar(self):
+        if self.sql is None: return
+        sql, self.sql = self.sql, None
+        _registrar_sentencia(sql, self.ms, self.filas)
+
+class _Conexion(sqlite3.Connection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cursores = weakref.WeakSet()
+
+    def cursor(self, factory=_Cursor): return super().cursor(factory)
+    def execute(self, sql, parametros=()): return self.cursor().execute(sql, parametros)
+    def executemany(self, sql, parametros): return self.cursor().executemany(sql, parametros)
+    def executescript(self, script): return self.cursor().executescript(script)
+
+    def terminar(self):
+        for cursor in list(self.cursores): cursor.terminar()
+
+def _registrar_sentencia(sql, ms, filas):
+    pagina = getattr(_hilo, 'pagina', None) or '(segundo plano)'
+    _sentencias.append((datetime.now(), pagina, sql, ms, filas))
+    if getattr(_hilo, 'pagina', None):
+        _hilo.sentencias += 1
+        _hilo.ms_sql += ms
+    if ms >= UMBRAL_LENTA_MS: _log_lentas.warning("%.1f ms | %d filas | %s | %s", ms, filas, pagina, ' '.join(sql.split()))
+
+def _al_liberar(conn):
+    if isinstance(conn, _Conexion): conn.terminar()
+
+def activar():
+    os.makedirs(CARPETA_DIAGNOSTICO, exist_ok=True)
+    if not _log_lentas.handlers:
+        manejador = RotatingFileHandler(RUTA_LOG_LENTAS, maxBytes=MAX_BYTES_LOG, backupCount=COPIAS_LOG, encoding='utf-8')
+        manejador.setFormatter(logging.Formatter('%(asctime)s | %(message)s'))
+        _log_lentas.addHandler(manejador)
+        _log_lentas.propagate = False
+    base_datos.cerrar_pool()  # las conexiones ya abiertas no son _Conexion
+    base_datos.usar_fabrica_conexion(_Conexion)
+    base_datos.al_liberar(_al_liberar)
+
+# --- PÁGINAS Y SECCIONES ---
+def iniciar_pagina(pagina):
+    if not ACTIVO: return
+    _hilo.pagina, _hilo.inicio, _hilo.sentencias, _hilo.ms_sql = pagina, time.perf_counter(), 0, 0.0
+
+def terminar_pagina():
+    # Un st.rerun() corta el script antes de llegar aquí: ese rerun no se registra. La página queda
+    # asignada al hilo para que las sentencias de los reruns de fragmentos se atribuyan a ella.
+    if not ACTIVO or getattr(_hilo, 'inicio', None) is None: return
+    _paginas.append((_hilo.pagina, (time.perf_counter() - _hilo.inicio) * 1000, _hilo.sentencias, _hilo.ms_sql))
+    _hilo.inicio = None
+
+@contextmanager
+def _medir_seccion(nombre):
+    inicio = time.perf_counter()
+    try: yield
+    finally: _secciones.append((getattr(_hilo, 'pagina', None) or '-', nombre, (time.perf_counter() - inicio) * 1000))
+
+def seccion(nombre):
+    return _medir_seccion(nombre) if ACTIVO else _SIN_MEDICION
+
+# --- RESÚMENES PARA EL PANEL ---
+def _percentiles(df, claves, columna):
+    agrupado = df.groupby(claves, observed=True)[columna]
+    return pd.DataFrame({'n': agrupado.size(), 'p50_ms': agrupado.quantile(0.5), 'p95_ms': agrupado.quantile(0.95),
+                         'max_ms': agrupado.max()}).round(1).reset_index()
+
+def resumen_paginas():
+    df = pd.DataFrame(list(_paginas), columns=['pagina', 'ms', 'sentencias', 'ms_sql'])
+    if df.empty: return df
+    resumen = _percentiles(df, 'pagina', 'ms')
+    extra = df.groupby('pagina').agg(sentencias_p50=('sentencias', 'median'), ms_sql_p50=('ms_sql', 'median')).round(1).reset_index()
+    return resumen.merge(extra, on='pagina').sort_values('p95_ms', ascending=False)
+
+def resumen_secciones():
+    df = pd.DataFrame(list(_secciones), columns=['pagina', 'seccion', 'ms'])
+    return df if df.empty else _percentiles(df, ['pagina', 'seccion'], 'ms').sort_values('p95_ms', ascending=False)
+
+def resumen_sentencias(limite=30):
+    # Se agrupan por forma: los valores literales se reemplazan por ?
+    df = pd.DataFrame(list(_sentencias), columns=['fecha', 'pagina', 'sql', 'ms', 'filas'])
+    if df.empty: return df
+    df['sql'] = df['sql'].map(lambda s: _LITERALES.sub('?', ' '.join(s.split()))[:300])
+    resumen = _percentiles(df, 'sql', 'ms')
+    filas = df.groupby('sql')['filas'].median().rename('filas_p50').reset_index()
+    return resumen.merge(filas, on='sql').sort_values('p95_ms', ascending=False).head(limite)
+
+def sentencias_lentas(limite=50):
+    lentas = [(f, p, ' '.join(sql.split()), ms, n) for f, p, sql, ms, n in _sentencias if ms >= UMBRAL_LENTA_MS][-limite:]
+    return pd.DataFrame(lentas[::-1], columns=['fecha', 'pagina', 'sql', 'ms', 'filas']).round({'ms': 1})
+
+def reiniciar():
+    for registros in (_sentencias, _secciones, _paginas): registros.clear()
+
+if ACTIVO: activar()
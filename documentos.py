@@ -0,0 +1,77 @@
+import os
+import shutil
+from imagenes import en_segundo_plano, encolar_rendiciones, ruta_rendicion
+
+try:
+    import pypdfium2 as pdfium  # opcional: pip install pypdfium2 para portadas de PDF
+except ImportError:
+    pdfium = None
+
+# --- PUBLICACIÓN DE DOCUMENTOS ---
+# Streamlit sirve la carpeta static/ (server.enableStaticServing) con soporte de Range, así el
+# visor del navegador va pidiendo el PDF por partes y el archivo nunca se carga en el proceso.
+# Los documentos se publican como enlaces duros dentro de static/: no ocupan espacio extra y la
+# ruta real sigue dentro de la raíz estática.
+
+# Streamlit sirve static/ junto al script principal, no la del directorio desde el que se lanzó
+CARPETA_ESTATICA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+CARPETA_PUBLICA = os.path.join(CARPETA_ESTATICA, 'documentos')
+URL_PUBLICA = 'app/static/documentos'
+CARPETA_MINIATURAS = os.path.join(CARPETA_ESTATICA, 'miniaturas')
+URL_MINIATURAS = 'app/static/miniaturas'
+CARPETA_PORTADAS = os.path.join('docs_activos', 'portadas')
+ANCHO_PORTADA = 800
+
+def publicar_documento(path, carpeta=CARPETA_PUBLICA):
+    destino = os.path.join(carpeta, os.path.basename(path))
+    if not os.path.exists(destino):
+        os.makedirs(carpeta, exist_ok=True)
+        try: os.link(path, destino)
+        except FileExistsError: pass
+        except OSError: shutil.copyfile(path, destino)  # p. ej. otro sistema de archivos: copia por bloques
+    return destino
+
+def url_documento(path):
+    return f"{URL_PUBLICA}/{os.path.basename(publicar_documento(path))}"
+
+def url_miniatura(path):
+    # La grilla del dashboard pide las imágenes por URL: solo se publica la miniatura, nunca el original.
+    # Si todavía no existe se encola y la celda queda vacía hasta el próximo rerun.
+    ruta = ruta_rendicion(path, "miniatura")
+    if not os.path.exists(ruta):
+        encolar_rendiciones([path])
+        return None
+    return f"{URL_MINIATURAS}/{os.path.basename(publicar_documento(ruta, CARPETA_MINIATURAS))}"
+
+# --- PORTADAS DE PDF ---
+def ruta_portada(path):
+    nombre = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(CARPETA_PORTADAS, f"{nombre}_p1.png")
+
+def generar_portada(path):
+    if pdfium is None or not path.lower().endswith('.pdf') or os.path.exists(ruta_portada(path)): return False
+    os.makedirs(CARPETA_PORTADAS, exist_ok=True)
+    pdf = pdfium.PdfDocument(path)  # solo se lee la primera página, no el archivo completo
+    try:
+        pagina = pdf[0]
+        escala = ANCHO_PORTADA / pagina.get_width()
+        img = pagina.render(scale=escala).to_pil()
+    finally:
+        pdf.close()
+    destino = ruta_portada(path)
+    img.save(f"{destino}.tmp", "PNG", optimize=True)
+    os.replace(f"{destino}.tmp", destino)
+    return True
+
+def _generar_portada_segura(path):
+    try: return generar_portada(path)
+    except Exception: return False  # PDF dañado o protegido: el visor funciona igual sin portada
+
+def encolar_portadas(paths):
+    return [en_segundo_plano(_generar_portada_segura, path) for path in paths if path.lower().endswith('.pdf')]
+
+def portada_disponible(path):
+    ruta = ruta_portada(path)
+    if os.path.exists(ruta): return ruta
+    if pdfium is not None: encolar_portadas([path])  # documentos anteriores a esta función: se genera para la próxima vez
+    return None
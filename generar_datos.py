@@ -0,0 +1,165 @@
+import argparse
+import io
+import os
+import random
+import shutil
+import time
+from datetime import datetime, timedelta
+from PIL import Image, ImageDraw
+import base_datos
+from almacenamiento import CARPETAS, guardar_blob, registrar_blob
+from imagenes import rellenar_rendiciones
+
+# --- DATOS SINTÉTICOS ---
+# Llena una base (y las carpetas de adjuntos) con datos realistas para medir el rendimiento.
+# Uso: python generar_datos.py --directorio bench --activos 100000 --historial 1000000 --fotos 500000
+# Las fotos y documentos se generan como un conjunto pequeño de archivos distintos que las filas
+# reparten al azar: el almacenamiento por contenido los guarda una sola vez, como pasaría con
+# adjuntos repetidos, y la base tiene el volumen de filas pedido sin llenar el disco.
+
+# Mismas listas que app.py
+CATEGORIAS = ["Maquinaria Pesada", "Maquinaria Ligera", "Vehículos (Flota)", "Equipos Industriales/Planta", "Equipos de T.I."]
+PAISES = ["VENEZUELA", "COLOMBIA", "ESTADOS UNIDOS"]
+ESTADOS = (["OPERATIVO"] * 17) + (["DAÑADO"] * 2) + ["REPARACION"]
+TIPOS_UBICACION = ["PATIO", "TALLER", "BODEGA", "OBRA", "PLANTA", "OFICINA"]
+MARCAS = ["CATERPILLAR", "KOMATSU", "JOHN DEERE", "VOLVO", "TOYOTA", "FORD", "HYUNDAI", "LIEBHERR", "DELL", "HP", "LENOVO", "SIEMENS"]
+PALABRAS = ["EQUIPO", "REVISADO", "CAMBIO", "ACEITE", "FILTRO", "MOTOR", "HIDRAULICO", "LLANTAS", "NUEVO", "USADO",
+            "ASIGNADO", "PROYECTO", "TURNO", "NOCTURNO", "FUGA", "FRENOS", "BATERIA", "PINTURA", "GARANTIA", "CONTRATO"]
+MOTIVOS = ["FALLA DE MOTOR", "FUGA HIDRAULICA", "MANTENIMIENTO PREVENTIVO", "PANTALLA ROTA", "CAMBIO DE FRENOS", "SIN REPUESTOS"]
+TAMANO_LOTE = 10000
+DIAS_HISTORIA = 3 * 365
+
+def _lotes(filas, tamano=TAMANO_LOTE):
+    lote = []
+    for fila in filas:
+        lote.append(fila)
+        if len(lote) == tamano:
+            yield lote
+            lote = []
+    if lote: yield lote
+
+def _insertar(sql, filas, total, etiqueta):
+    inicio, hechas = time.perf_counter(), 0
+    for lote in _lotes(filas):
+        with base_datos.conectar_db() as conn: conn.executemany(sql, lote)
+        hechas += len(lote)
+        print(f"\r{etiqueta}: {hechas}/{total}", end="", flush=True)
+    print(f"\r{etiqueta}: {hechas} filas en {time.perf_counter() - inicio:.1f}s")
+
+def _texto(rnd, minimo, maximo):
+    return " ".join(rnd.choices(PALABRAS, k=rnd.randint(minimo, maximo)))
+
+def _fecha(rnd, ahora):
+    return ahora - timedelta(seconds=rnd.randint(0, DIAS_HISTORIA * 86400))
+
+# --- FILAS ---
+def generar_ubicaciones(por_pais):
+    return [(f"{TIPOS_UBICACION[i % len(TIPOS_UBICACION)]} {i // len(TIPOS_UBICACION) + 1}", pais) for pais in PAISES for i in range(por_pais)]
+
+def filas_activos(rnd, total, ubicaciones, ahora):
+    ubis_pais = {p: [n for n, pu in ubicaciones if pu == p] for p in PAISES}
+    for n in range(1, total + 1):
+        pais = rnd.choice(PAISES)
+        estado = rnd.choice(ESTADOS)
+        marca = rnd.choice(MARCAS)
+        yield (f"SIN-{n:07d}", f"{rnd.choice('ABCDEFGH')}{rnd.randint(10, 99)}{rnd.choice('XYZ')}{rnd.randint(100, 999)}",
+               marca, f"{marca[:3]}-{rnd.randint(100, 999)}", rnd.choice(CATEGORIAS), pais, rnd.choice(ubis_pais[pais]),
+               estado, "" if estado == "OPERATIVO" else rnd.choice(MOTIVOS), _texto(rnd, 3, 12),
+               (ahora - timedelta(days=rnd.randint(0, 730))).strftime('%Y-%m-%d'))
+
+def filas_historial(rnd, total, num_activos, ubicaciones, ahora):
+    for _ in range(total):
+        (u_o, p_o), (u_d, p_d) = rnd.choice(ubicaciones), rnd.choice(ubicaciones)
+        yield (f"SIN-{rnd.randint(1, num_activos):07d}", f"{p_o}-{u_o}", f"{p_d}-{u_d}", _fecha(rnd, ahora), _texto(rnd, 1, 4))
+
+def filas_eliminados(rnd, total, ubicaciones, ahora):
+    for n in range(1, total + 1):
+        yield (f"ELIM-{n:07d}", rnd.choice(ubicaciones)[0], _fecha(rnd, ahora), _texto(rnd, 1, 4))
+
+# --- ARCHIVOS ---
+def _foto(rnd, ancho, alto):
+    img = Image.new("RGB", (ancho, alto), tuple(rnd.randint(0, 255) for _ in range(3)))
+    dibujo = ImageDraw.Draw(img)
+    for _ in range(30):
+        x, y = rnd.randint(0, ancho), rnd.randint(0, alto)
+        dibujo.rectangle((x, y, x + rnd.randint(20, ancho // 3), y + rnd.randint(20, alto // 3)), fill=tuple(rnd.randint(0, 255) for _ in range(3)))
+    buf = io.BytesIO()
+    img.save(buf, "JPEG", quality=90)
+    return buf
+
+def _pdf(rnd, paginas):
+    hojas = [Image.new("RGB", (1240, 1754), "white") for _ in range(paginas)]
+    for hoja in hojas:
+        dibujo = ImageDraw.Draw(hoja)
+        for linea in range(40): dibujo.text((100, 100 + linea * 40), _texto(rnd, 6, 12), fill="black")
+    buf = io.BytesIO()
+    hojas[0].save(buf, "PDF", save_all=True, append_images=hojas[1:], resolution=150)
+    return buf
+
+def generar_archivos(rnd, fotos, documentos):
+    for carpeta in CARPETAS.values(): os.makedirs(carpeta, exist_ok=True)
+    guardados = {'foto': [], 'doc': []}
+    for tipo, cantidad, crear, ext in (('foto', fotos, lambda: _foto(rnd, rnd.choice([1600, 2400, 4000]), rnd.choice([1200, 1800, 3000])), '.jpg'),
+                                       ('doc', documentos, lambda: _pdf(rnd, rnd.randint(1, 8)), '.pdf')):
+        for _ in range(cantidad):
+            ruta, sha, tamano, _ = guardar_blob(crear(), tipo, f"x{ext}")
+            guardados[tipo].append((ruta, sha, tamano))
+    with base_datos.conectar_db() as conn:
+        for ruta, sha, tamano in guardados['foto'] + guardados['doc']: registrar_blob(conn, ruta, sha, tamano)
+    return [r for r, _, _ in guardados['foto']], [r for r, _, _ in guardados['doc']]
+
+# --- PROGRAMA ---
+def main():
+    parser = argparse.ArgumentParser(description="Genera datos sintéticos para pruebas de rendimiento.")
+    parser.add_argument("--directorio", default=".", help="carpeta de trabajo (base y carpetas de adjuntos)")
+    parser.add_argument("--db", default="inventario.db")
+    parser.add_argument("--activos", type=int, default=100000)
+    parser.add_argument("--historial", type=int, default=1000000)
+    parser.add_argument("--fotos", type=int, default=500000, help="filas en la tabla fotos")
+    parser.add_argument("--documentos", type=int, default=100000, help="filas en la tabla documentos")
+    parser.add_argument("--eliminados", type=int, default=5000)
+    parser.add_argument("--ubicaciones-por-pais", type=int, default=30)
+    parser.add_argument("--fotos-distintas", type=int, default=200, help="archivos de imagen reales a generar")
+    parser.add_argument("--documentos-distintos", type=int, default=50, help="archivos PDF reales a generar")
+    parser.add_argument("--rendiciones", action="store_true", help="generar también miniaturas y vistas")
+    parser.add_argument("--semilla", type=int, default=42)
+    args = parser.parse_args()
+
+    logo = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logo.png")
+    os.makedirs(args.directorio, exist_ok=True)
+    os.chdir(args.directorio)
+    if os.path.exists(logo) and not os.path.exists("logo.png"): shutil.copy(logo, "logo.png")  # app.py lo lee de la carpeta de trabajo
+    if os.path.exists(args.db): raise SystemExit(f"{args.db} ya existe en {os.getcwd()}: use otra ruta o bórrela antes.")
+    base_datos.RUTA_DB = args.db
+    base_datos.inicializar_db()
+    rnd, ahora = random.Random(args.semilla), datetime.now().replace(microsecond=0)
+
+    ubicaciones = generar_ubicaciones(args.ubicaciones_por_pais)
+    _insertar("INSERT INTO ubicaciones (nombre, pais) VALUES (?,?)", ubicaciones, len(ubicaciones), "ubicaciones")
+    _insertar("""INSERT INTO activos (id, placa, marca, modelo, categoria, pais, ubicacion, estado, motivo_estado, descripcion, ultima_revision)
+                 VALUES (?,?,?,?,?,?,?,?,?,?,?)""", filas_activos(rnd, args.activos, ubicaciones, ahora), args.activos, "activos")
+    _insertar("INSERT INTO historial (id_activo, origen, destino, fecha, motivo) VALUES (?,?,?,?,?)",
+              filas_historial(rnd, args.historial, args.activos, ubicaciones, ahora), args.historial, "historial")
+    _insertar("INSERT INTO activos_eliminados (id, ubicacion, fecha_eliminacion, motivo) VALUES (?,?,?,?)",
+              filas_eliminados(rnd, args.eliminados, ubicaciones, ahora), args.eliminados, "eliminados")
+
+    if args.activos:
+        rutas_fotos, rutas_docs = generar_archivos(rnd, min(args.fotos, args.fotos_distintas), min(args.documentos, args.documentos_distintos))
+        if rutas_fotos:
+            _insertar("INSERT INTO fotos (id_activo, path) VALUES (?,?)",
+                      ((f"SIN-{rnd.randint(1, args.activos):07d}", rnd.choice(rutas_fotos)) for _ in range(args.fotos)), args.fotos, "fotos")
+        if rutas_docs:
+            _insertar("INSERT INTO documentos (id_activo, path, nombre_real) VALUES (?,?,?)",
+                      ((f"SIN-{rnd.randint(1, args.activos):07d}", ruta, f"{rnd.choice(PALABRAS).lower()}_{n}.pdf")
+                       for n, ruta in enumerate(rnd.choice(rutas_docs) for _ in range(args.documentos))), args.documentos, "documentos")
+        if args.rendiciones and rutas_fotos:
+            total, generadas = rellenar_rendiciones()
+            print(f"rendiciones: {total} fotos revisadas, {generadas} con rendiciones nuevas")
+
+    with base_datos.conectar_db() as conn:
+        conn.execute("DELETE FROM diario_cambios")  # los datos generados son la línea base, no cambios a sincronizar
+        conn.execute("ANALYZE")
+    base_datos.cerrar_pool()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import argparse
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageOps, features
+from base_datos import conectar_db
+
+# --- RENDICIONES DE FOTOS ---
+# Cada foto subida genera versiones reducidas (miniatura y vista) con la orientación EXIF aplicada
+# y sin metadatos. El original se conserva intacto para descargas. El dashboard sirve siempre
+# la rendición más pequeña que sirva; mientras no exista, se usa el original.
+
+CARPETA_RENDICIONES = os.path.join('fotos_activos', 'rendiciones')
+TAMANOS_RENDICION = {"vista": 1024, "miniatura": 320}  # lado mayor en píxeles, de mayor a menor
+FORMATO = "WEBP" if features.check("webp") else "JPEG"
+EXTENSION = ".webp" if FORMATO == "WEBP" else ".jpg"
+OPCIONES_GUARDADO = {"quality": 80, "method": 4} if FORMATO == "WEBP" else {"quality": 80, "optimize": True}
+HILOS_RENDICION = 2
+
+# Pool compartido por todas las sesiones: la subida no espera a que se generen las rendiciones
+_ejecutor = ThreadPoolExecutor(max_workers=HILOS_RENDICION, thread_name_prefix="rendiciones")
+# Trabajos encolados o en curso: pedir de nuevo el mismo (p. ej. la grilla en cada rerun) devuelve el
+# existente. Así no se llena la cola ni dos hilos escriben el mismo .tmp a la vez.
+_en_curso = {}
+_lock_en_curso = threading.Lock()
+
+def ruta_rendicion(path, tamano):
+    nombre = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(CARPETA_RENDICIONES, f"{nombre}_{tamano}{EXTENSION}")
+
+def ruta_para_mostrar(path, tamano="vista"):
+    ruta = ruta_rendicion(path, tamano)
+    return ruta if os.path.exists(ruta) else path
+
+def generar_rendiciones(path):
+    pendientes = [t for t in TAMANOS_RENDICION if not os.path.exists(ruta_rendicion(path, t))]
+    if not pendientes or not os.path.exists(path): return False
+    os.makedirs(CARPETA_RENDICIONES, exist_ok=True)
+    with Image.open(path) as img:
+        # En JPEG el decodificador puede reducir por 1/2, 1/4, 1/8 directamente: mucho menos trabajo
+        img.draft("RGB", (TAMANOS_RENDICION["vista"], TAMANOS_RENDICION["vista"]))
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ("RGB", "RGBA"): img = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+        if FORMATO == "JPEG" and img.mode == "RGBA": img = img.convert("RGB")
+        # Se reduce en cascada: cada tamaño parte del anterior, que ya es más pequeño
+        for tamano, lado in TAMANOS_RENDICION.items():
+            img.thumbnail((lado, lado), Image.Resampling.LANCZOS)
+            if tamano not in pendientes: continue
+            destino = ruta_rendicion(path, tamano)
+            temporal = f"{destino}.tmp"
+            img.save(temporal, FORMATO, **OPCIONES_GUARDADO)
+            os.replace(temporal, destino)  # quien lea nunca ve un archivo a medio escribir
+    return True
+
+def _generar_seguro(path):
+    try: return generar_rendiciones(path)
+    except (OSError, Image.DecompressionBombError): return False
+
+def en_segundo_plano(funcion, *args):
+    clave = (funcion, args)
+    with _lock_en_curso:
+        futuro = _en_curso.get(clave)
+        nuevo = futuro is None
+        if nuevo: futuro = _en_curso[clave] = _ejecutor.submit(funcion, *args)
+    # Fuera del lock: si ya terminó, el callback corre aquí mismo y vuelve a tomarlo
+    if nuevo: futuro.add_done_callback(lambda _: _terminar(clave))
+    return futuro
+
+def _terminar(clave):
+    with _lock_en_curso: _en_curso.pop(clave, None)
+
+def encolar_rendiciones(paths):
+    return [en_segundo_plano(_generar_seguro, path) for path in paths]
+
+# --- RELLENO DE FOTOS EXISTENTES ---
+# Uso: python imagenes.py [--hilos N]
+def rellenar_rendiciones(hilos=os.cpu_count() or 2):
+    with conectar_db() as conn:
+        paths = [f[0] for f in conn.execute("SELECT DISTINCT path FROM fotos").fetchall()]
+    with ThreadPoolExecutor(max_workers=hilos) as ejecutor:
+        generadas = sum(ejecutor.map(_generar_seguro, paths))
+    return len(paths), generadas
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Genera las rendiciones que falten para las fotos registradas.")
+    parser.add_argument("--hilos", type=int, default=os.cpu_count() or 2)
+    args = parser.parse_args()
+    total, generadas = rellenar_rendiciones(args.hilos)
+    print(f"{total} fotos revisadas, {generadas} con rendiciones nuevas.")
@@ -0,0 +1,88 @@
+import os
+import pandas as pd
+from base_datos import BaseOcupada, escribir
+
+# --- IMPORTACIÓN MASIVA DE ACTIVOS ---
+# Lee un CSV/XLSX, valida todas las filas de una vez con operaciones vectorizadas de pandas
+# e inserta las válidas con executemany en transacciones por lotes.
+
+COLUMNAS_IMPORTACION = ["id", "placa", "marca", "modelo", "categoria", "pais", "ubicacion",
+                        "estado", "motivo_estado", "descripcion", "ultima_revision"]
+ESTADOS_VALIDOS = ["OPERATIVO", "DAÑADO", "REPARACION"]
+TAMANO_LOTE = 5000
+
+def plantilla_csv():
+    return pd.DataFrame(columns=COLUMNAS_IMPORTACION).to_csv(index=False).encode('utf-8')
+
+def leer_archivo(archivo, nombre):
+    if os.path.splitext(nombre)[1].lower() == '.xlsx':
+        df = pd.read_excel(archivo, dtype=str)
+    else:
+        df = pd.read_csv(archivo, dtype=str, sep=None, engine='python', encoding='utf-8-sig')
+    df.columns = [str(c).strip().lower().replace(' ', '_') for c in df.columns]
+    faltantes = [c for c in ("id", "categoria", "pais", "ubicacion") if c not in df.columns]
+    if faltantes: raise ValueError(f"Faltan columnas obligatorias: {', '.join(faltantes)}")
+    for col in COLUMNAS_IMPORTACION:
+        if col not in df.columns: df[col] = ""
+    return df[COLUMNAS_IMPORTACION].fillna("")
+
+def validar(df_original, categorias, paises, df_ubicaciones, ids_existentes):
+    df = df_original.copy()
+    for col in COLUMNAS_IMPORTACION:
+        if col not in ("categoria", "ultima_revision"): df[col] = df[col].astype(str).str.strip().str.upper()
+    # Categoría sin distinguir mayúsculas, guardada con el nombre oficial de la lista
+    df["categoria"] = df["categoria"].astype(str).str.strip().str.upper().map({c.upper(): c for c in categorias})
+    df.loc[df["estado"] == "", "estado"] = "OPERATIVO"
+
+    texto_fecha = df["ultima_revision"].astype(str).str.strip()
+    fecha_vacia = texto_fecha == ""
+    # ISO (el formato que guarda la app y el de la plantilla) se lee estricto; día/mes/año solo para el resto.
+    # Una fecha con forma ISO que no es válida (2024-13-01) se rechaza, no se reinterpreta.
+    forma_iso = texto_fecha.str.match(r"^\d{4}-\d{1,2}-\d{1,2}")
+    fechas = pd.to_datetime(texto_fecha.where(forma_iso), errors="coerce", format="ISO8601")
+    otras = ~forma_iso & ~fecha_vacia
+    if otras.any():
+        fechas[otras] = pd.to_datetime(texto_fecha[otras], errors="coerce", format="mixed", dayfirst=True)
+    df["ultima_revision"] = fechas.dt.strftime('%Y-%m-%d')
+    df.loc[fecha_vacia, "ultima_revision"] = pd.Timestamp.now().strftime('%Y-%m-%d')
+
+    ubicaciones_validas = pd.MultiIndex.from_frame(df_ubicaciones[["pais", "nombre"]].astype(str))
+    ubicacion_existe = pd.MultiIndex.from_arrays([df["pais"], df["ubicacion"]]).isin(ubicaciones_validas)
+
+    reglas = [
+        (df["id"] == "", "ID vacío"),
+        ((df["id"] != "") & df["id"].duplicated(keep=False), "ID repetido en el archivo"),
+        (df["id"].isin(ids_existentes), "ID ya existe en la base de datos"),
+        (df["categoria"].isna(), "Categoría no válida"),
+        (~df["pais"].isin(paises), "País no válido"),
+        (df["pais"].isin(paises) & ~ubicacion_existe, "Ubicación no registrada para el país"),
+        (~df["estado"].isin(ESTADOS_VALIDOS), "Estado no válido"),
+        (df["estado"].isin(["DAÑADO", "REPARACION"]) & (df["motivo_estado"] == ""), "Falta motivo de daño/reparación"),
+        (fechas.isna() & ~fecha_vacia, "Fecha de revisión no válida"),
+    ]
+    errores = pd.Series("", index=df.index)
+    for mascara, mensaje in reglas:
+        errores = errores.where(~mascara, errores + mensaje + "; ")
+    errores = errores.str.rstrip("; ")
+
+    valido = errores == ""
+    # El reporte de rechazados conserva los valores tal como venían en el archivo
+    rechazados = df_original[~valido].assign(error=errores[~valido])
+    return df[valido], rechazados
+
+def _insertar_lote(conn, lote):
+    return conn.executemany(f"""INSERT OR IGNORE INTO activos ({', '.join(COLUMNAS_IMPORTACION)})
+                               VALUES ({','.join('?' * len(COLUMNAS_IMPORTACION))})""", lote).rowcount
+
+def insertar(df_validos, al_avanzar=None, tamano_lote=TAMANO_LOTE):
+    # Un lote por operación del escritor: otras escrituras pueden entrar entre lotes y el progreso es visible
+    filas = list(df_validos[COLUMNAS_IMPORTACION].itertuples(index=False, name=None))
+    insertados = 0
+    for inicio in range(0, len(filas), tamano_lote):
+        try: insertados += escribir(_insertar_lote, filas[inicio:inicio + tamano_lote])
+        except BaseOcupada as e:
+            # Los lotes anteriores ya quedaron guardados: quien reintente debe saber cuántos
+            raise BaseOcupada(f"{e} Antes de la espera se importaron {insertados} de {len(filas)} filas.") from e
+        if al_avanzar: al_avanzar(min(inicio + tamano_lote, len(filas)), len(filas))
+    # Las filas que otro usuario registró mientras tanto se ignoran en lugar de abortar el lote
+    return insertados, len(filas) - insertados
@@ -0,0 +1,64 @@
+import threading
+import time
+import pandas as pd
+from base_datos import conectar_db, generacion_escrituras
+
+# --- INSTANTÁNEA COMPARTIDA ---
+# Copia en memoria de activos y ubicaciones compartida por todas las sesiones del proceso.
+# Se refresca de forma incremental usando contador_cambios: solo se releen las filas de activos con
+# versión mayor a la última vista y los borrados de activos_borrados. Si mantenimiento.py ya podó
+# lápidas que esta copia no alcanzó a ver, se recarga entera. El historial no se copia: crece
+# sin límite con los años y las pantallas lo leen paginado de la base (consultas.py).
+# Los DataFrames devueltos se comparten entre sesiones: tratarlos como solo lectura.
+
+COLUMNAS_ACTIVOS = ["id", "categoria", "pais", "estado", "ubicacion", "marca", "modelo", "placa", "ultima_revision"]
+COLUMNAS_CATEGORICAS = ["categoria", "pais", "estado", "ubicacion", "marca"]
+SEGUNDOS_REVISION = 5  # si este proceso no escribió, cada cuánto se mira si otro proceso cambió la DB
+
+_lock = threading.Lock()
+_estado = {"activos": None, "ubicaciones": None, "versiones": {}, "generacion": None, "revisado_en": 0.0}
+
+def _compactar(df):
+    for col in COLUMNAS_CATEGORICAS: df[col] = df[col].astype("category")
+    return df
+
+def _refrescar_activos(conn, version_previa):
+    columnas = ", ".join(COLUMNAS_ACTIVOS)
+    if _estado["activos"] is None:
+        _estado["activos"] = _compactar(pd.read_sql_query(f"SELECT {columnas} FROM activos ORDER BY rowid", conn))
+        return
+    delta = pd.read_sql_query(f"SELECT {columnas} FROM activos WHERE version > ? ORDER BY rowid", conn, params=(version_previa,))
+    borrados = [b[0] for b in conn.execute("SELECT id FROM activos_borrados WHERE version > ?", (version_previa,))]
+    df = _estado["activos"]
+    df = df[~df["id"].isin(set(delta["id"]) | set(borrados))]
+    if not delta.empty:
+        df = pd.concat([df.astype({col: object for col in COLUMNAS_CATEGORICAS}), delta], ignore_index=True)
+    _estado["activos"] = _compactar(df.reset_index(drop=True))
+
+def _actualizar():
+    generacion = generacion_escrituras()
+    with _lock:
+        if generacion == _estado["generacion"] and time.monotonic() - _estado["revisado_en"] < SEGUNDOS_REVISION:
+            return
+        with conectar_db() as conn:
+            # Lectura consistente del contador y de los deltas dentro de una misma transacción
+            conn.execute("BEGIN")
+            versiones = dict(conn.execute("SELECT tabla, version FROM contador_cambios").fetchall())
+            previas = _estado["versiones"]
+            if previas.get("activos", 0) < versiones.get("activos_borrados", 0): _estado["activos"] = None
+            if _estado["activos"] is None or versiones.get("activos") != previas.get("activos"):
+                _refrescar_activos(conn, previas.get("activos", 0))
+            if _estado["ubicaciones"] is None or versiones.get("ubicaciones") != previas.get("ubicaciones"):
+                _estado["ubicaciones"] = pd.read_sql_query("SELECT nombre, pais FROM ubicaciones ORDER BY nombre", conn)
+            conn.commit()
+        _estado["versiones"] = versiones
+        _estado["generacion"] = generacion
+        _estado["revisado_en"] = time.monotonic()
+
+def activos_en_cache():
+    _actualizar()
+    return _estado["activos"]
+
+def ubicaciones_en_cache():
+    _actualizar()
+    return _estado["ubicaciones"]
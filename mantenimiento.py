@@ -0,0 +1,274 @@
+import argparse
+import logging
+import os
+import shutil
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+import pandas as pd
+import base_datos
+from almacenamiento import CARPETAS
+from base_datos import conectar_db, escribir
+from documentos import CARPETA_MINIATURAS, CARPETA_PORTADAS, CARPETA_PUBLICA
+from imagenes import CARPETA_RENDICIONES, TAMANOS_RENDICION
+
+# --- MANTENIMIENTO DE ADJUNTOS Y BASE ---
+# Borrar un activo o quitar un adjunto elimina la fila de fotos/documentos, pero el archivo queda en
+# disco. Este trabajo compara el disco con la base: los archivos que ninguna fila usa se mueven a
+# cuarentena/AAAAMMDD/ (misma ruta relativa) y se borran definitivamente pasados DIAS_CUARENTENA.
+# Si un archivo en cuarentena vuelve a estar referenciado se devuelve a su lugar. Rendiciones,
+# portadas y copias publicadas se regeneran solas: las de archivos que ya no existen se borran.
+# Al final corre PRAGMA optimize y, cuando toca, ANALYZE y VACUUM. VACUUM ocupa el hilo escritor mientras
+# reescribe el archivo (las escrituras de la app esperan ESPERA_ESCRITURA y luego avisan "base ocupada"),
+# por eso solo se hace dentro de VENTANA_VACUUM; el programador además solo arranca dentro de esa ventana.
+# Uso: python mantenimiento.py [--forzar] [--sin-vacuum] [--vacuum-ahora]
+
+CARPETA_CUARENTENA = 'cuarentena'
+DIAS_CUARENTENA = int(os.environ.get('INVENTARIO_DIAS_CUARENTENA', '30'))
+HORAS_ENTRE_EJECUCIONES = float(os.environ.get('INVENTARIO_MANTENIMIENTO_HORAS', '24'))  # 0 desactiva el programador
+EDAD_MINIMA = 3600          # s: un archivo recién guardado todavía no tiene su fila en la base
+EDAD_MINIMA_TEMPORAL = 86400  # s: .subida_* y .tmp que quedaron de una subida o rendición interrumpida
+DIAS_ANALYZE = 7
+DIAS_BORRADOS = 7           # lápidas de activos_borrados; las instantáneas se refrescan cada pocos segundos
+LIBRE_PARA_VACUUM = 0.20    # fracción de páginas libres a partir de la cual se compacta el archivo
+VENTANA_VACUUM = os.environ.get('INVENTARIO_VENTANA_VACUUM', '1-5')  # horas locales [inicio-fin); vacío = sin restricción
+ESPERA_INICIAL = 300        # s después de arrancar el proceso antes de la primera revisión
+ESPERA_REVISION = 900       # s entre revisiones de si ya toca ejecutar
+TAMANO_BLOQUE_RUTAS = 500
+
+_log = logging.getLogger('inventario.mantenimiento')
+_hilo_programador = None
+_lock_programador = threading.Lock()
+
+def _antiguedad(ruta, ahora):
+    try: return ahora - os.path.getmtime(ruta)
+    except FileNotFoundError: return None
+
+def _tamano(ruta):
+    try: return os.path.getsize(ruta)
+    except FileNotFoundError: return 0
+
+def _archivos(carpeta, excluir=()):
+    for raiz, dirs, nombres in os.walk(carpeta):
+        dirs[:] = [d for d in dirs if os.path.join(raiz, d) not in excluir]
+        for nombre in nombres: yield os.path.normpath(os.path.join(raiz, nombre))
+
+def _referenciados(conn):
+    return {os.path.normpath(f[0]) for f in conn.execute("SELECT path FROM fotos UNION SELECT path FROM documentos")}
+
+def _nombre_base(ruta):
+    return os.path.splitext(os.path.basename(ruta))[0]
+
+# --- HUÉRFANOS ---
+def buscar_huerfanos(referenciados, ahora):
+    huerfanos, temporales = [], []
+    excluir = {CARPETA_RENDICIONES, CARPETA_PORTADAS}
+    for carpeta in CARPETAS.values():
+        for ruta in _archivos(carpeta, excluir):
+            edad = _antiguedad(ruta, ahora)
+            if edad is None: continue
+            if os.path.basename(ruta).startswith('.subida_'):
+                if edad >= EDAD_MINIMA_TEMPORAL: temporales.append(ruta)
+            elif ruta not in referenciados and edad >= EDAD_MINIMA: huerfanos.append(ruta)
+    return huerfanos, temporales
+
+def _confirmar_huerfanos(conn, candidatos, ahora):
+    # Solo base de datos: si el lote se reintenta no hay archivos movidos a medias
+    confirmados = []
+    for inicio in range(0, len(candidatos), TAMANO_BLOQUE_RUTAS):
+        bloque = candidatos[inicio:inicio + TAMANO_BLOQUE_RUTAS]
+        marcas = ','.join('?' * len(bloque))
+        usados = {os.path.normpath(f[0]) for f in conn.execute(
+            f"SELECT path FROM fotos WHERE path IN ({marcas}) UNION SELECT path FROM documentos WHERE path IN ({marcas})", bloque * 2)}
+        for ruta in bloque:
+            edad = _antiguedad(ruta, ahora)
+            if ruta in usados or edad is None or edad < EDAD_MINIMA: continue
+            conn.execute("DELETE FROM blobs WHERE path=? AND referencias <= 0", (ruta,))
+            confirmados.append(ruta)
+    return confirmados
+
+def _mover_a_cuarentena(conn, candidatos, carpeta_dia, ahora):
+    # Corre sola en el hilo escritor (transaccion=False): ninguna escritura del proceso entra entre la
+    # revisión y el movimiento, y los archivos se mueven recién después del COMMIT
+    movidos = []
+    for ruta in base_datos.en_transaccion(conn, _confirmar_huerfanos, candidatos, ahora):
+        tamano = _tamano(ruta)
+        destino = os.path.join(carpeta_dia, ruta)
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        try: shutil.move(ruta, destino)
+        except FileNotFoundError: continue
+        movidos.append((ruta, tamano))
+    return movidos
+
+def _restaurar(conn, pendientes):
+    # Solo lee la base; va con transaccion=False para no repetirse si otra operación del lote falla
+    restaurados = 0
+    for origen, ruta in pendientes:
+        usado = conn.execute("SELECT 1 FROM fotos WHERE path=? UNION SELECT 1 FROM documentos WHERE path=?", (ruta, ruta)).fetchone()
+        if not usado or os.path.exists(ruta): continue
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        shutil.move(origen, ruta)
+        restaurados += 1
+    return restaurados
+
+def revisar_cuarentena(referenciados, ahora):
+    # Devuelve los archivos a restaurar y purga las carpetas de días vencidos
+    restaurar, purgados, liberados = [], 0, 0
+    if not os.path.isdir(CARPETA_CUARENTENA): return restaurar, purgados, liberados
+    limite = (datetime.fromtimestamp(ahora) - timedelta(days=DIAS_CUARENTENA)).strftime('%Y%m%d')
+    for dia in sorted(os.listdir(CARPETA_CUARENTENA)):
+        carpeta_dia = os.path.join(CARPETA_CUARENTENA, dia)
+        if not os.path.isdir(carpeta_dia): continue
+        for ruta in _archivos(carpeta_dia):
+            original = os.path.relpath(ruta, carpeta_dia)
+            if original in referenciados: restaurar.append((ruta, original))
+            elif dia < limite:
+                liberados += _tamano(ruta)
+                os.remove(ruta)
+                purgados += 1
+    return restaurar, purgados, liberados
+
+def _borrar_carpetas_vacias(carpeta):
+    for raiz, _, _ in os.walk(carpeta, topdown=False):
+        if raiz != carpeta and not os.listdir(raiz): os.rmdir(raiz)
+
+# --- DERIVADOS (rendiciones, portadas, publicados) ---
+def borrar_derivados(referenciados, ahora):
+    fotos = {_nombre_base(r) for r in referenciados if r.startswith(CARPETAS['foto'] + os.sep)}
+    docs = {os.path.basename(r) for r in referenciados if r.startswith(CARPETAS['doc'] + os.sep)}
+    nombres_docs = {os.path.splitext(n)[0] for n in docs}
+    sufijos = tuple(f"_{t}" for t in TAMANOS_RENDICION)
+
+    def vigente(carpeta, ruta):
+        nombre = _nombre_base(ruta)
+        if carpeta in (CARPETA_RENDICIONES, CARPETA_MINIATURAS):
+            return nombre.endswith(sufijos) and nombre.rsplit('_', 1)[0] in fotos
+        if carpeta == CARPETA_PORTADAS:
+            return nombre.endswith('_p1') and nombre[:-3] in nombres_docs
+        return os.path.basename(ruta) in docs
+
+    borrados, liberados = 0, 0
+    for carpeta in (CARPETA_RENDICIONES, CARPETA_MINIATURAS, CARPETA_PORTADAS, CARPETA_PUBLICA):
+        for ruta in _archivos(carpeta):
+            edad = _antiguedad(ruta, ahora)
+            temporal = ruta.endswith('.tmp')
+            if edad is None or edad < (EDAD_MINIMA_TEMPORAL if temporal else EDAD_MINIMA): continue
+            if not temporal and vigente(carpeta, ruta): continue
+            # Las copias publicadas son enlaces duros: solo se libera espacio con el último enlace
+            if os.stat(ruta).st_nlink == 1: liberados += _tamano(ruta)
+            os.remove(ruta)
+            borrados += 1
+    return borrados, liberados
+
+# --- BASE DE DATOS ---
+def _optimizar_base(conn, analyze, vacuum):
+    # Corre en el hilo escritor, fuera de transacción (transaccion=False)
+    tareas, antes = ["OPTIMIZE"], os.path.getsize(base_datos.RUTA_DB)
+    if analyze:
+        conn.execute("ANALYZE")
+        tareas.append("ANALYZE")
+    conn.execute("PRAGMA optimize")
+    if vacuum:
+        conn.execute("VACUUM")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")  # en WAL el archivo principal se achica al hacer checkpoint
+        tareas.append("VACUUM")
+    return tareas, max(antes - os.path.getsize(base_datos.RUTA_DB), 0)
+
+def en_ventana_vacuum(ahora):
+    if not VENTANA_VACUUM.strip(): return True
+    inicio, fin = (int(h) for h in VENTANA_VACUUM.split('-'))
+    return inicio <= ahora.hour < fin if inicio <= fin else (ahora.hour >= inicio or ahora.hour < fin)
+
+def _tareas_pendientes(conn, ahora, permitir_vacuum):
+    ultimo_analyze = conn.execute("SELECT MAX(fecha) FROM mantenimiento_ejecuciones WHERE tareas_base LIKE '%ANALYZE%'").fetchone()[0]
+    analyze = ultimo_analyze is None or datetime.fromisoformat(str(ultimo_analyze)) < ahora - timedelta(days=DIAS_ANALYZE)
+    paginas, libres = conn.execute("PRAGMA page_count").fetchone()[0], conn.execute("PRAGMA freelist_count").fetchone()[0]
+    return analyze, permitir_vacuum and paginas > 0 and libres / paginas >= LIBRE_PARA_VACUUM
+
+def _podar_borrados(conn, ahora):
+    limite = (ahora - timedelta(days=DIAS_BORRADOS)).astimezone(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+    condicion = "fecha IS NULL OR fecha < ?"
+    podada = conn.execute(f"SELECT MAX(version) FROM activos_borrados WHERE {condicion}", (limite,)).fetchone()[0]
+    if podada is None: return 0
+    conn.execute("UPDATE contador_cambios SET version = MAX(version, ?) WHERE tabla = 'activos_borrados'", (podada,))
+    return conn.execute(f"DELETE FROM activos_borrados WHERE {condicion}", (limite,)).rowcount
+
+# --- EJECUCIÓN ---
+def _reservar_turno(conn, ahora, horas):
+    # Con varios procesos de la app solo uno ejecuta: la fila nueva marca el turno tomado
+    ultima = conn.execute("SELECT MAX(fecha) FROM mantenimiento_ejecuciones").fetchone()[0]
+    if horas and ultima and datetime.fromisoformat(str(ultima)) > ahora - timedelta(hours=horas): return False
+    conn.execute("INSERT INTO mantenimiento_ejecuciones (fecha) VALUES (?)", (ahora,))
+    return True
+
+def _guardar_reporte(conn, fecha, reporte):
+    columnas = [c for c in reporte if c != 'fecha']
+    conn.execute(f"UPDATE mantenimiento_ejecuciones SET {', '.join(f'{c}=?' for c in columnas)} WHERE fecha=?",
+                 [reporte[c] for c in columnas] + [fecha])
+
+def ejecutar_mantenimiento(forzar=False, vacuum=True, vacuum_fuera_de_ventana=False):
+    # Devuelve el reporte de la ejecución, o None si todavía no tocaba
+    inicio, fecha = time.time(), datetime.now()
+    if not escribir(_reservar_turno, fecha, 0 if forzar else HORAS_ENTRE_EJECUCIONES, espera=None): return None
+    with conectar_db() as conn:
+        referenciados = _referenciados(conn)
+        sin_ubicacion = conn.execute('''SELECT COUNT(*) FROM activos a WHERE NOT EXISTS
+                                        (SELECT 1 FROM ubicaciones u WHERE u.nombre = a.ubicacion AND u.pais = a.pais)''').fetchone()[0]
+        analyze, hacer_vacuum = _tareas_pendientes(conn, fecha, vacuum and (vacuum_fuera_de_ventana or en_ventana_vacuum(fecha)))
+
+    restaurar, purgados, bytes_purgados = revisar_cuarentena(referenciados, inicio)
+    restaurados = escribir(_restaurar, restaurar, transaccion=False, espera=None) if restaurar else 0
+    _borrar_carpetas_vacias(CARPETA_CUARENTENA)
+    huerfanos, temporales = buscar_huerfanos(referenciados, inicio)
+    carpeta_dia = os.path.join(CARPETA_CUARENTENA, fecha.strftime('%Y%m%d'))
+    movidos = escribir(_mover_a_cuarentena, huerfanos, carpeta_dia, inicio, transaccion=False, espera=None) if huerfanos else []
+    bytes_temporales = sum(_tamano(r) for r in temporales)
+    for ruta in temporales:
+        try: os.remove(ruta)
+        except FileNotFoundError: pass
+    derivados, bytes_derivados = borrar_derivados(referenciados, inicio)
+    borrados_podados = escribir(_podar_borrados, fecha, espera=None)
+    tareas, bytes_base = escribir(_optimizar_base, analyze, hacer_vacuum, transaccion=False, espera=None)
+
+    reporte = dict(fecha=fecha, segundos=round(time.time() - inicio, 1), archivos_cuarentena=len(movidos),
+                   bytes_cuarentena=sum(t for _, t in movidos), restaurados=restaurados,
+                   derivados_borrados=derivados + len(temporales), purgados=purgados,
+                   bytes_liberados=bytes_purgados + bytes_derivados + bytes_temporales,
+                   activos_sin_ubicacion=sin_ubicacion, borrados_podados=borrados_podados, tareas_base=", ".join(tareas), bytes_base_liberados=bytes_base)
+    escribir(_guardar_reporte, fecha, reporte, espera=None)
+    _log.info("Mantenimiento: %s", reporte)
+    return reporte
+
+def ultimas_ejecuciones(limite=20):
+    with conectar_db() as conn:
+        return pd.read_sql_query("SELECT * FROM mantenimiento_ejecuciones ORDER BY fecha DESC LIMIT ?", conn, params=(limite,))
+
+# --- PROGRAMADOR ---
+def _bucle_programador():
+    time.sleep(ESPERA_INICIAL)
+    while True:
+        try:
+            if en_ventana_vacuum(datetime.now()): ejecutar_mantenimiento()
+        except Exception: _log.exception("Falló el mantenimiento programado")
+        time.sleep(ESPERA_REVISION)
+
+def iniciar_programador():
+    # Un hilo por proceso; revisa cada ESPERA_REVISION s si ya pasaron HORAS_ENTRE_EJECUCIONES
+    global _hilo_programador
+    if not HORAS_ENTRE_EJECUCIONES or _hilo_programador is not None: return
+    with _lock_programador:
+        if _hilo_programador is None:
+            _hilo_programador = threading.Thread(target=_bucle_programador, name="mantenimiento", daemon=True)
+            _hilo_programador.start()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mueve a cuarentena los adjuntos sin referencias y optimiza la base.")
+    parser.add_argument("--forzar", action="store_true", help="ejecutar aunque no hayan pasado las horas configuradas")
+    parser.add_argument("--sin-vacuum", action="store_true", help="no compactar el archivo de la base")
+    parser.add_argument("--vacuum-ahora", action="store_true", help="compactar aunque sea fuera de la ventana configurada")
+    args = parser.parse_args()
+    base_datos.inicializar_db()
+    reporte = ejecutar_mantenimiento(args.forzar, not args.sin_vacuum, args.vacuum_ahora)
+    if reporte is None: print(f"La última ejecución tiene menos de {HORAS_ENTRE_EJECUCIONES:g} h (use --forzar).")
+    else:
+        for clave, valor in reporte.items(): print(f"{clave}: {valor}")
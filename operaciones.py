@@ -0,0 +1,117 @@
+import sqlite3
+from datetime import datetime
+from almacenamiento import registrar_blob
+from base_datos import escribir
+
+# --- OPERACIONES MASIVAS ---
+# Cada operación se aplica completa en una sola transacción. El id de operación lo genera la
+# interfaz al preparar el formulario: si el mismo envío llega dos veces (doble clic, reintento),
+# el segundo choca con la clave primaria de operaciones_masivas y no se aplica de nuevo.
+# Todas las escrituras de este módulo corren en el hilo escritor (base_datos.escribir).
+
+TAMANO_BLOQUE_IDS = 500  # ids por consulta IN (...)
+
+def _leer_activos(conn, ids, columnas):
+    filas = []
+    for inicio in range(0, len(ids), TAMANO_BLOQUE_IDS):
+        bloque = ids[inicio:inicio + TAMANO_BLOQUE_IDS]
+        filas += conn.execute(f"SELECT {columnas} FROM activos WHERE id IN ({','.join('?' * len(bloque))})", bloque).fetchall()
+    return filas
+
+def _registrar_operacion(conn, id_operacion, tipo, fecha):
+    try:
+        conn.execute("INSERT INTO operaciones_masivas (id, tipo, fecha) VALUES (?,?,?)", (id_operacion, tipo, fecha))
+        return True
+    except sqlite3.IntegrityError:
+        return False
+
+def _trasladar(conn, ids, pais_destino, ubi_destino, motivo, id_operacion, fecha):
+    if id_operacion and not _registrar_operacion(conn, id_operacion, "TRASLADO", fecha): return None
+    # Los que ya están en el destino no generan movimiento
+    a_mover = [(i, p, u) for i, p, u in _leer_activos(conn, list(ids), "id, pais, ubicacion") if (p, u) != (pais_destino, ubi_destino)]
+    conn.executemany("UPDATE activos SET ubicacion=?, pais=? WHERE id=?", [(ubi_destino, pais_destino, i) for i, _, _ in a_mover])
+    conn.executemany("INSERT INTO historial (id_activo, origen, destino, fecha, motivo) VALUES (?,?,?,?,?)",
+                     [(i, f"{p}-{u}", f"{pais_destino}-{ubi_destino}", fecha, motivo) for i, p, u in a_mover])
+    return len(a_mover)
+
+def trasladar_activos(ids, pais_destino, ubi_destino, motivo, id_operacion=None):
+    # Devuelve cuántos activos se movieron, o None si la operación ya se había aplicado
+    return escribir(_trasladar, ids, pais_destino, ubi_destino, motivo, id_operacion, datetime.now())
+
+def _cambiar_estado(conn, ids, estado, motivo, id_operacion, fecha):
+    if not _registrar_operacion(conn, id_operacion, "ESTADO", fecha): return None
+    a_cambiar = [i for i, e, m in _leer_activos(conn, list(ids), "id, estado, motivo_estado") if (e, m or "") != (estado, motivo)]
+    conn.executemany("UPDATE activos SET estado=?, motivo_estado=? WHERE id=?", [(estado, motivo, i) for i in a_cambiar])
+    return len(a_cambiar)
+
+def cambiar_estado_activos(ids, estado, motivo, id_operacion):
+    return escribir(_cambiar_estado, ids, estado, motivo, id_operacion, datetime.now())
+
+# --- ACTIVOS Y ADJUNTOS ---
+# Los archivos ya están guardados en disco (almacenamiento.guardar_blob) antes de encolar la
+# operación; aquí solo se registran. Cada adjunto es (ruta, sha256, tamano, nombre_real).
+
+def _insertar_adjuntos(conn, id_activo, fotos, docs):
+    for ruta, sha, tamano, _ in fotos + docs: registrar_blob(conn, ruta, sha, tamano)
+    conn.executemany("INSERT INTO fotos (id_activo, path) SELECT ?, ? WHERE NOT EXISTS (SELECT 1 FROM fotos WHERE id_activo=? AND path=?)",
+                     [(id_activo, ruta, id_activo, ruta) for ruta, _, _, _ in fotos])
+    conn.executemany("INSERT INTO documentos (id_activo, path, nombre_real) SELECT ?, ?, ? WHERE NOT EXISTS (SELECT 1 FROM documentos WHERE id_activo=? AND path=?)",
+                     [(id_activo, ruta, nombre, id_activo, ruta) for ruta, _, _, nombre in docs])
+
+def _registrar_activo(conn, datos, fotos, docs):
+    conn.execute(f"INSERT INTO activos ({', '.join(datos)}) VALUES ({','.join('?' * len(datos))})", list(datos.values()))
+    _insertar_adjuntos(conn, datos['id'], fotos, docs)
+
+def registrar_activo(datos, fotos=(), docs=()):
+    # IntegrityError si el id ya existe: en ese caso no queda nada registrado
+    escribir(_registrar_activo, datos, list(fotos), list(docs))
+
+def _editar_activo(conn, id_activo, cambios, quitar_fotos, quitar_docs, fotos, docs):
+    conn.execute(f"UPDATE activos SET {', '.join(f'{c}=?' for c in cambios)} WHERE id=?", [*cambios.values(), id_activo])
+    # Un mismo archivo puede estar en varios activos: solo se quita la referencia de este
+    conn.executemany("DELETE FROM fotos WHERE id_activo=? AND path=?", [(id_activo, path) for path in quitar_fotos])
+    conn.executemany("DELETE FROM documentos WHERE id_activo=? AND path=?", [(id_activo, path) for path in quitar_docs])
+    _insertar_adjuntos(conn, id_activo, fotos, docs)
+
+def editar_activo(id_activo, cambios, quitar_fotos=(), quitar_docs=(), fotos=(), docs=()):
+    escribir(_editar_activo, id_activo, cambios, list(quitar_fotos), list(quitar_docs), list(fotos), list(docs))
+
+def _eliminar_activo(conn, id_activo, motivo, fecha):
+    res = conn.execute("SELECT ubicacion FROM activos WHERE id=?", (id_activo,)).fetchone()
+    conn.execute("INSERT INTO activos_eliminados (id, ubicacion, fecha_eliminacion, motivo) VALUES (?, ?, ?, ?)",
+                 (id_activo, res[0] if res else "DESCONOCIDA", fecha, motivo))
+    conn.execute("DELETE FROM activos WHERE id=?", (id_activo,))
+    conn.execute("DELETE FROM fotos WHERE id_activo=?", (id_activo,))
+    conn.execute("DELETE FROM documentos WHERE id_activo=?", (id_activo,))
+
+def eliminar_activo(id_activo, motivo="ELIMINACIÓN MANUAL"):
+    escribir(_eliminar_activo, id_activo, motivo, datetime.now())
+
+# --- UBICACIONES ---
+def _crear_ubicacion(conn, nombre, pais):
+    conn.execute("INSERT INTO ubicaciones (nombre, pais) VALUES (?, ?)", (nombre, pais))
+
+def crear_ubicacion(nombre, pais):
+    escribir(_crear_ubicacion, nombre, pais)
+
+def _renombrar_ubicacion(conn, nombre, pais, nuevo_nombre):
+    conn.execute("UPDATE ubicaciones SET nombre=? WHERE nombre=? AND pais=?", (nuevo_nombre, nombre, pais))
+    conn.execute("UPDATE activos SET ubicacion=? WHERE ubicacion=? AND pais=?", (nuevo_nombre, nombre, pais))
+
+def renombrar_ubicacion(nombre, pais, nuevo_nombre):
+    escribir(_renombrar_ubicacion, nombre, pais, nuevo_nombre)
+
+def _eliminar_ubicacion(conn, nombre, pais):
+    conn.execute("DELETE FROM ubicaciones WHERE nombre=? AND pais=?", (nombre, pais))
+
+def eliminar_ubicacion(nombre, pais):
+    escribir(_eliminar_ubicacion, nombre, pais)
+
+# --- REVISIONES ---
+def _actualizar_intervalos(conn, intervalos):
+    # El trigger trg_intervalos_update recalcula proxima_revision de la categoría
+    conn.executemany("""INSERT INTO intervalos_revision (categoria, dias) VALUES (?, ?)
+                        ON CONFLICT (categoria) DO UPDATE SET dias = excluded.dias WHERE dias != excluded.dias""", list(intervalos.items()))
+
+def actualizar_intervalos(intervalos):
+    escribir(_actualizar_intervalos, intervalos)
@@ -0,0 +1,228 @@
+import argparse
+import hashlib
+import io
+import json
+import os
+import re
+import tempfile
+import zipfile
+import base_datos
+from almacenamiento import CARPETAS, TAMANO_BLOQUE, registrar_blob, ruta_blob
+from base_datos import TABLAS_DIARIO, conectar_db, escribir
+
+# --- SINCRONIZACIÓN ENTRE SITIOS ---
+# Cada instalación (VENEZUELA, COLOMBIA, ESTADOS UNIDOS) anota sus cambios en diario_cambios
+# (triggers, migración 10). Un paquete es un .zip con las entradas que el otro sitio todavía no
+# confirmó, los archivos adjuntos que se sabe que le faltan y un acuse de lo que este sitio ya
+# recibió de él. El costo depende de los cambios, no del tamaño del inventario.
+#
+# - Entradas: se exportan en orden de secuencia; al importar se saltan las ya aplicadas
+#   (sincronizacion_pares.recibido), así que repetir un paquete o recibir uno viejo no hace nada.
+# - Conflictos: gana la estampa (fecha UTC, sitio) mayor de cada fila. La entrada aplicada conserva
+#   la estampa original, así todos los sitios llegan al mismo resultado sin importar el orden.
+# - Adjuntos: los archivos van identificados por su SHA-256. Cada archivo se envía una sola vez
+#   a cada sitio (blobs_en_par), salvo que el acuse del otro sitio diga que no le llegó.
+# - Los cambios se reenvían: lo que COLOMBIA recibió de VENEZUELA llega a ESTADOS UNIDOS a través
+#   de COLOMBIA. Nunca se devuelve a un sitio lo que él mismo originó.
+#
+# Las bases arrancan de una misma copia (el diario empieza vacío); después de copiar inventario.db
+# hay que darle a cada sitio su nombre:
+#   python sincronizacion.py sitio COLOMBIA
+#   python sincronizacion.py exportar --para VENEZUELA --archivo co_a_ve.zip [--solo-hashes]
+#   python sincronizacion.py importar ve_a_co.zip
+#   python sincronizacion.py estado
+
+CAMBIOS_POR_OPERACION = 2000  # entradas por transacción del escritor al importar
+VERSION_PAQUETE = 1
+
+# --- SITIO Y PARES ---
+def sitio_actual(conn=None):
+    if conn is None:
+        with conectar_db() as conn: return sitio_actual(conn)
+    return conn.execute("SELECT id FROM sincronizacion_sitio").fetchone()[0]
+
+def _renombrar_sitio(conn, nombre):
+    conn.execute("UPDATE sincronizacion_sitio SET id=?", (nombre,))
+
+def renombrar_sitio(nombre):
+    escribir(_renombrar_sitio, nombre)
+
+def _par(conn, sitio):
+    fila = conn.execute("SELECT recibido, confirmado, faltan_aqui, faltan_alla FROM sincronizacion_pares WHERE sitio=?", (sitio,)).fetchone()
+    recibido, confirmado, faltan_aqui, faltan_alla = fila or (0, 0, '[]', '[]')
+    return recibido, confirmado, json.loads(faltan_aqui), json.loads(faltan_alla)
+
+def _asegurar_par(conn, sitio):
+    conn.execute("INSERT OR IGNORE INTO sincronizacion_pares (sitio) VALUES (?)", (sitio,))
+
+def estado():
+    with conectar_db() as conn:
+        ultimo = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM diario_cambios").fetchone()[0]
+        pares = conn.execute("""SELECT sitio, recibido, confirmado, json_array_length(faltan_aqui), json_array_length(faltan_alla),
+                                       (SELECT COUNT(*) FROM diario_cambios WHERE seq > confirmado AND origen != sitio)
+                                FROM sincronizacion_pares ORDER BY sitio""").fetchall()
+        return sitio_actual(conn), ultimo, pares
+
+# --- EXPORTACIÓN ---
+def _marcar_enviados(conn, sitio, rutas):
+    conn.executemany("INSERT OR IGNORE INTO blobs_en_par (sitio, path) VALUES (?, ?)", [(sitio, r) for r in rutas])
+
+def exportar(archivo, para, solo_hashes=False):
+    with conectar_db() as conn:
+        conn.execute("BEGIN")  # entradas, blobs y acuse de una misma lectura
+        sitio = sitio_actual(conn)
+        if para == sitio: raise ValueError("El destino es este mismo sitio.")
+        recibido, confirmado, faltan_aqui, faltan_alla = _par(conn, para)
+        hasta = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM diario_cambios").fetchone()[0]
+        cambios, referenciados = 0, set()
+        with zipfile.ZipFile(archivo, "w", zipfile.ZIP_DEFLATED) as zf:
+            with zf.open("cambios.jsonl", "w", force_zip64=True) as salida:
+                for entrada in conn.execute("""SELECT seq, tabla, clave, operacion, fila, fecha, origen FROM diario_cambios
+                                               WHERE seq > ? AND seq <= ? AND origen != ? ORDER BY seq""", (confirmado, hasta, para)):
+                    salida.write((json.dumps(entrada, ensure_ascii=False) + "\n").encode("utf-8"))
+                    cambios += 1
+                    if entrada[1] in ("fotos", "documentos") and entrada[3] != "D": referenciados.add(json.loads(entrada[2])[1])
+            # Hash y tamaño de cada archivo referenciado que este sitio tiene
+            blobs = {}
+            for ruta in referenciados | set(faltan_alla):
+                fila = conn.execute("SELECT sha256, tamano FROM blobs WHERE path=?", (ruta,)).fetchone()
+                if fila and os.path.exists(ruta): blobs[ruta] = fila
+            ya_enviado = lambda r: conn.execute("SELECT 1 FROM blobs_en_par WHERE sitio=? AND path=?", (para, r)).fetchone()
+            incluir = set(faltan_alla) if solo_hashes else {r for r in blobs if not ya_enviado(r)} | set(faltan_alla)
+            incluidos = sorted(r for r in incluir if r in blobs)
+            for ruta in incluidos: zf.write(ruta, f"blobs/{ruta}", compress_type=zipfile.ZIP_STORED)  # fotos y PDF ya vienen comprimidos
+            zf.writestr("manifiesto.json", json.dumps({
+                "version": VERSION_PAQUETE, "origen": sitio, "destino": para, "desde": confirmado, "hasta": hasta,
+                "cambios": cambios, "blobs": blobs, "incluidos": incluidos,
+                "acuse": {"recibido": recibido, "faltantes": faltan_aqui}}, ensure_ascii=False))
+    if incluidos: escribir(_marcar_enviados, para, incluidos)
+    return {"cambios": cambios, "hasta": hasta, "archivos": len(incluidos), "bytes_archivos": sum(blobs[r][1] for r in incluidos)}
+
+# --- IMPORTACIÓN ---
+def _ruta_valida(ruta, sha256):
+    # La ruta viene del paquete: solo se acepta la que el almacén daría a ese hash (nada de ../ ni rutas absolutas)
+    if not isinstance(ruta, str) or not isinstance(sha256, str) or not re.fullmatch(r"[0-9a-f]{64}", sha256): return False
+    ext = os.path.splitext(ruta)[1]
+    return any(ruta == ruta_blob(carpeta, sha256, ext) for carpeta in CARPETAS.values())
+
+def _guardar_recibido(zf, ruta, sha256):
+    # Se guarda con la misma ruta que en el sitio de origen (las filas la referencian), verificando el hash
+    if os.path.exists(ruta): return True
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    sha = hashlib.sha256()
+    with zf.open(f"blobs/{ruta}") as origen, tempfile.NamedTemporaryFile(dir=os.path.dirname(ruta), prefix='.subida_', delete=False) as tmp:
+        for bloque in iter(lambda: origen.read(TAMANO_BLOQUE), b''):
+            sha.update(bloque)
+            tmp.write(bloque)
+    if sha.hexdigest() != sha256:
+        os.remove(tmp.name)
+        return False
+    os.replace(tmp.name, ruta)
+    return True
+
+def _gana(conn, tabla, clave, fecha, origen):
+    local = conn.execute("SELECT fecha, origen FROM diario_cambios WHERE tabla=? AND clave=? ORDER BY fecha DESC, origen DESC LIMIT 1",
+                         (tabla, clave)).fetchone()
+    return local is None or (fecha, origen) > tuple(local)
+
+def _aplicar(conn, tabla, clave, operacion, fila):
+    claves, columnas = TABLAS_DIARIO[tabla]
+    donde = " AND ".join(f"{col} IS ?" for col in claves)
+    valores_clave = json.loads(clave)
+    if operacion == "D":
+        conn.execute(f"DELETE FROM {tabla} WHERE {donde}", valores_clave)
+        return
+    datos = json.loads(fila)
+    resto = [col for col in columnas if col not in claves]
+    if conn.execute(f"SELECT 1 FROM {tabla} WHERE {donde}", valores_clave).fetchone():
+        if resto: conn.execute(f"UPDATE {tabla} SET {', '.join(f'{col}=?' for col in resto)} WHERE {donde}", [datos[col] for col in resto] + valores_clave)
+    else:
+        conn.execute(f"INSERT INTO {tabla} ({', '.join(columnas)}) VALUES ({','.join('?' * len(columnas))})", [datos[col] for col in columnas])
+
+def _aplicar_cambios(conn, origen, cambios):
+    # Una transacción por bloque: si la importación se corta, se retoma desde el último bloque confirmado
+    _asegurar_par(conn, origen)
+    aplicados = 0
+    conn.execute("INSERT INTO sincronizacion_contexto (fecha, origen) VALUES (NULL, NULL)")
+    try:
+        for _, tabla, clave, operacion, fila, fecha, origen_cambio in cambios:
+            if tabla not in TABLAS_DIARIO or not _gana(conn, tabla, clave, fecha, origen_cambio): continue
+            conn.execute("UPDATE sincronizacion_contexto SET fecha=?, origen=?", (fecha, origen_cambio))
+            _aplicar(conn, tabla, clave, operacion, fila)
+            aplicados += 1
+    finally:
+        conn.execute("DELETE FROM sincronizacion_contexto")
+    conn.execute("UPDATE sincronizacion_pares SET recibido=MAX(recibido, ?) WHERE sitio=?", (cambios[-1][0], origen))
+    return aplicados
+
+def _registrar_blobs(conn, blobs):
+    for ruta, sha256, tamano in blobs: registrar_blob(conn, ruta, sha256, tamano)
+
+def _cerrar_importacion(conn, manifiesto, faltan_aqui):
+    origen = manifiesto["origen"]
+    _asegurar_par(conn, origen)
+    _marcar_enviados(conn, origen, list(manifiesto["blobs"]))  # el otro sitio tiene todo lo que declaró
+    acuse = manifiesto["acuse"]
+    conn.execute("""UPDATE sincronizacion_pares SET recibido=MAX(recibido, ?), confirmado=MAX(confirmado, ?), faltan_aqui=?, faltan_alla=?
+                    WHERE sitio=?""", (manifiesto["hasta"], acuse["recibido"], json.dumps(sorted(faltan_aqui)), json.dumps(acuse["faltantes"]), origen))
+
+def importar(archivo):
+    with zipfile.ZipFile(archivo) as zf:
+        manifiesto = json.loads(zf.read("manifiesto.json"))
+        if manifiesto.get("version") != VERSION_PAQUETE: raise ValueError(f"Versión de paquete no soportada: {manifiesto.get('version')}")
+        sitio, origen = sitio_actual(), manifiesto["origen"]
+        if origen == sitio: raise ValueError("El paquete fue generado por este mismo sitio.")
+        if manifiesto["destino"] != sitio: raise ValueError(f"El paquete es para {manifiesto['destino']}, este sitio es {sitio}.")
+
+        invalidas = [r for r in manifiesto["incluidos"] if not _ruta_valida(r, manifiesto["blobs"].get(r, [None])[0])]
+        if invalidas: raise ValueError(f"El paquete trae archivos con rutas no válidas: {', '.join(map(str, invalidas[:5]))}")
+        # Los archivos primero: cuando las filas que los referencian aparezcan, ya están en disco
+        recibidos = [r for r in manifiesto["incluidos"] if _guardar_recibido(zf, r, manifiesto["blobs"][r][0])]
+        if recibidos: escribir(_registrar_blobs, [(r, *manifiesto["blobs"][r]) for r in recibidos])
+
+        with conectar_db() as conn: recibido, _, faltan_aqui, _ = _par(conn, origen)
+        aplicados, bloque, referenciados = 0, [], set()
+        with zf.open("cambios.jsonl") as entrada:
+            for linea in io.TextIOWrapper(entrada, encoding="utf-8"):
+                cambio = json.loads(linea)
+                if cambio[0] <= recibido: continue
+                if cambio[1] in ("fotos", "documentos") and cambio[3] != "D": referenciados.add(json.loads(cambio[2])[1])
+                bloque.append(cambio)
+                if len(bloque) == CAMBIOS_POR_OPERACION:
+                    aplicados += escribir(_aplicar_cambios, origen, bloque)
+                    bloque = []
+        if bloque: aplicados += escribir(_aplicar_cambios, origen, bloque)
+
+    # Lo que sigue faltando se pide en el acuse del próximo paquete hacia ese sitio
+    faltan = {r for r in set(faltan_aqui) | referenciados if not os.path.exists(r)}
+    escribir(_cerrar_importacion, manifiesto, faltan)
+    return {"origen": origen, "cambios": manifiesto["cambios"], "aplicados": aplicados, "archivos": len(recibidos), "faltantes": len(faltan)}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sincroniza el inventario entre sitios con paquetes de cambios.")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+    p_sitio = comandos.add_parser("sitio", help="mostrar o fijar el nombre de este sitio")
+    p_sitio.add_argument("nombre", nargs="?")
+    p_exp = comandos.add_parser("exportar", help="generar un paquete con los cambios que el otro sitio no confirmó")
+    p_exp.add_argument("--para", required=True, help="sitio destino")
+    p_exp.add_argument("--archivo", required=True)
+    p_exp.add_argument("--solo-hashes", action="store_true", help="no incluir archivos, salvo los que el destino pidió")
+    p_imp = comandos.add_parser("importar", help="aplicar un paquete recibido")
+    p_imp.add_argument("archivo")
+    comandos.add_parser("estado", help="secuencia local y estado de cada sitio conocido")
+    args = parser.parse_args()
+
+    base_datos.inicializar_db()
+    if args.comando == "sitio":
+        if args.nombre: renombrar_sitio(args.nombre.strip().upper())
+        print(sitio_actual())
+    elif args.comando == "exportar":
+        print(exportar(args.archivo, args.para.strip().upper(), args.solo_hashes))
+    elif args.comando == "importar":
+        print(importar(args.archivo))
+    else:
+        sitio, ultimo, pares = estado()
+        print(f"Sitio {sitio}, última secuencia {ultimo}")
+        for par, recibido, confirmado, faltan_aqui, faltan_alla, pendientes in pares:
+            print(f"  {par}: recibido hasta {recibido}, confirmó hasta {confirmado}, {pendientes} cambios por enviar, "
+                  f"faltan {faltan_aqui} archivos aquí y {faltan_alla} allá")
@@ -0,0 +1,25 @@
+import threading
+import pytest
+import base_datos
+from base_datos import BaseOcupada, escribir
+
+@pytest.fixture(autouse=True)
+def base_temporal(tmp_path, monkeypatch):
+    # El hilo escritor abre su conexión al arrancar: la prueba debe ser la primera en escribir del proceso
+    if base_datos._hilo_escritor is not None: pytest.skip("el escritor ya arrancó con otra base")
+    monkeypatch.setattr(base_datos, "RUTA_DB", str(tmp_path / "inventario.db"))
+
+def test_escritura_en_cola_se_cancela_al_agotar_la_espera():
+    empezo, liberar, ejecutadas = threading.Event(), threading.Event(), []
+    def lenta(conn): empezo.set(); liberar.wait(10)
+    def anotar(conn): ejecutadas.append(True)
+
+    hilo = threading.Thread(target=escribir, args=(lenta,), kwargs={"espera": None})
+    hilo.start()
+    empezo.wait(5)  # ocupa el escritor; la siguiente queda en cola, no en el mismo lote
+    with pytest.raises(BaseOcupada):
+        escribir(anotar, espera=0.2)
+    liberar.set()
+    hilo.join()
+    escribir(lambda conn: None)  # el escritor sigue vivo y ya pasó por la operación cancelada
+    assert ejecutadas == []
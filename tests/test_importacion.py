@@ -0,0 +1,24 @@
+import pandas as pd
+from importacion import COLUMNAS_IMPORTACION, validar
+
+UBICACIONES = pd.DataFrame({"pais": ["VENEZUELA"], "nombre": ["PATIO"]})
+
+def _validar_fechas(*fechas):
+    filas = [dict(zip(COLUMNAS_IMPORTACION, [f"A{i}", "", "CAT", "M1", "Maquinaria Pesada", "VENEZUELA", "PATIO", "OPERATIVO", "", "", f]))
+             for i, f in enumerate(fechas)]
+    validos, rechazados = validar(pd.DataFrame(filas), ["Maquinaria Pesada"], ["VENEZUELA"], UBICACIONES, [])
+    return dict(zip(validos["id"], validos["ultima_revision"])), dict(zip(rechazados["id"], rechazados["error"]))
+
+def test_fecha_iso_se_conserva():
+    validos, rechazados = _validar_fechas("2024-01-02", "2024-03-11", "2024-03-11 10:30:00")
+    assert validos == {"A0": "2024-01-02", "A1": "2024-03-11", "A2": "2024-03-11"}
+    assert rechazados == {}
+
+def test_fecha_iso_invalida_se_rechaza():
+    validos, rechazados = _validar_fechas("2024-13-01")
+    assert validos == {}
+    assert rechazados == {"A0": "Fecha de revisión no válida"}
+
+def test_fecha_no_iso_se_lee_dia_primero():
+    validos, _ = _validar_fechas("02/01/2024", "31/12/2023")
+    assert validos == {"A0": "2024-01-02", "A1": "2023-12-31"}
@@ -0,0 +1,25 @@
+import sqlite3
+from datetime import datetime
+import pytest
+from base_datos import MIGRACIONES
+from mantenimiento import _podar_borrados
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    for migracion in MIGRACIONES: migracion(conn.cursor())
+    yield conn
+    conn.close()
+
+def test_poda_lapidas_viejas_y_marca_la_version(conn):
+    conn.executemany("INSERT INTO activos (id, categoria, pais, ubicacion, estado) VALUES (?, 'Equipos de T.I.', 'VENEZUELA', 'PATIO', 'OPERATIVO')",
+                     [("A0",), ("A1",), ("A2",)])
+    conn.execute("DELETE FROM activos WHERE id IN ('A0', 'A1')")
+    conn.execute("UPDATE activos_borrados SET fecha = '2020-01-01 00:00:00' WHERE id = 'A0'")
+    conn.execute("DELETE FROM activos WHERE id = 'A2'")
+    podada = conn.execute("SELECT version FROM activos_borrados WHERE id = 'A0'").fetchone()[0]
+
+    assert _podar_borrados(conn, datetime.now()) == 1
+    assert [f[0] for f in conn.execute("SELECT id FROM activos_borrados ORDER BY version")] == ["A1", "A2"]
+    assert conn.execute("SELECT version FROM contador_cambios WHERE tabla = 'activos_borrados'").fetchone()[0] == podada
+    assert _podar_borrados(conn, datetime.now()) == 0
@@ -0,0 +1,36 @@
+import sqlite3
+import pytest
+from base_datos import MIGRACIONES
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    for migracion in MIGRACIONES: migracion(conn.cursor())
+    yield conn
+    conn.close()
+
+def _version(conn):
+    return conn.execute("SELECT version FROM contador_cambios WHERE tabla = 'activos'").fetchone()[0]
+
+def _insertar(conn, n):
+    conn.executemany("INSERT INTO activos (id, categoria, pais, ubicacion, estado, ultima_revision) VALUES (?, 'Equipos de T.I.', 'VENEZUELA', 'PATIO', 'OPERATIVO', '2026-01-01')",
+                     [(f"A{i}",) for i in range(n)])
+
+def test_alta_calcula_proxima_y_sube_version_una_vez(conn):
+    previa = _version(conn)
+    _insertar(conn, 2000)
+    assert _version(conn) - previa == 2000
+    assert conn.execute("SELECT proxima_revision FROM activos WHERE id = 'A0'").fetchone()[0] == "2027-01-01"
+
+def test_edicion_recalcula_proxima_y_sube_version_una_vez(conn):
+    _insertar(conn, 1)
+    previa = _version(conn)
+    conn.execute("UPDATE activos SET ultima_revision = '2026-06-01' WHERE id = 'A0'")
+    conn.execute("UPDATE activos SET categoria = 'Maquinaria Pesada' WHERE id = 'A0'")
+    assert _version(conn) - previa == 2
+    assert conn.execute("SELECT proxima_revision FROM activos WHERE id = 'A0'").fetchone()[0] == "2026-08-30"
+
+def test_cambio_de_intervalo_recalcula_la_categoria(conn):
+    _insertar(conn, 3)
+    conn.execute("UPDATE intervalos_revision SET dias = 30 WHERE categoria = 'Equipos de T.I.'")
+    assert {f[0] for f in conn.execute("SELECT proxima_revision FROM activos")} == {"2026-01-31"}
@@ -0,0 +1,91 @@
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+import zipfile
+import pytest
+from conftest import RAIZ
+
+# Dos copias locales del inventario (VENEZUELA y COLOMBIA), cada una en su carpeta y su propio proceso,
+# como dos instalaciones reales que se pasan paquetes.
+
+PREAMBULO = "import io, base_datos, operaciones, sincronizacion\nfrom almacenamiento import guardar_blob\nbase_datos.inicializar_db()\n"
+
+def _en_sitio(carpeta, codigo):
+    resultado = subprocess.run([sys.executable, "-c", PREAMBULO + codigo], cwd=carpeta, capture_output=True, text=True,
+                               env={**os.environ, "PYTHONPATH": RAIZ, "INVENTARIO_MANTENIMIENTO_HORAS": "0"})
+    assert resultado.returncode == 0, resultado.stderr
+    return resultado.stdout.strip()
+
+def _sincronizar(ve, co, tmp_path, ronda):
+    # Cada sitio exporta para el otro y los dos importan: así también viajan los acuses
+    a_co, a_ve = tmp_path / f"ve_co_{ronda}.zip", tmp_path / f"co_ve_{ronda}.zip"
+    _en_sitio(ve, f"sincronizacion.exportar({str(a_co)!r}, 'COLOMBIA')")
+    _en_sitio(co, f"sincronizacion.exportar({str(a_ve)!r}, 'VENEZUELA')")
+    _en_sitio(co, f"sincronizacion.importar({str(a_co)!r})")
+    _en_sitio(ve, f"sincronizacion.importar({str(a_ve)!r})")
+    return a_co
+
+def _activos(carpeta):
+    with sqlite3.connect(os.path.join(carpeta, "inventario.db")) as conn:
+        return conn.execute("SELECT id, pais, ubicacion, marca FROM activos ORDER BY id").fetchall()
+
+def _fotos(carpeta):
+    with sqlite3.connect(os.path.join(carpeta, "inventario.db")) as conn:
+        return conn.execute("SELECT id_activo, path FROM fotos ORDER BY id_activo").fetchall()
+
+@pytest.fixture
+def sitios(tmp_path):
+    ve, co = tmp_path / "ve", tmp_path / "co"
+    for carpeta in (ve, co):
+        for sub in ("fotos_activos", "docs_activos"): os.makedirs(carpeta / sub)
+    _en_sitio(ve, "operaciones.crear_ubicacion('PATIO', 'VENEZUELA'); operaciones.crear_ubicacion('BODEGA', 'COLOMBIA')")
+    # Las dos bases arrancan de la misma copia; después cada una recibe su nombre
+    with sqlite3.connect(ve / "inventario.db") as origen, sqlite3.connect(co / "inventario.db") as destino: origen.backup(destino)
+    _en_sitio(ve, "sincronizacion.renombrar_sitio('VENEZUELA')")
+    _en_sitio(co, "sincronizacion.renombrar_sitio('COLOMBIA')")
+    return ve, co
+
+def test_los_sitios_convergen(sitios, tmp_path):
+    ve, co = sitios
+    _en_sitio(ve, """ruta, sha, tamano, _ = guardar_blob(io.BytesIO(b'foto' * 1000), 'foto', 'a.jpg')
+operaciones.registrar_activo(dict(id='V1', categoria='Maquinaria Pesada', pais='VENEZUELA', ubicacion='PATIO', estado='OPERATIVO', marca='CAT'),
+                             [(ruta, sha, tamano, 'a.jpg')])
+operaciones.registrar_activo(dict(id='V2', categoria='Maquinaria Pesada', pais='VENEZUELA', ubicacion='PATIO', estado='OPERATIVO', marca='CAT'))""")
+    _sincronizar(ve, co, tmp_path, 1)
+    assert _activos(co) == _activos(ve)
+    # El adjunto llega con la misma ruta (su hash) y el mismo contenido
+    (_, ruta), = _fotos(co)
+    assert _fotos(co) == _fotos(ve) and open(co / ruta, "rb").read() == b"foto" * 1000
+
+    # Edición en conflicto: gana la última en los dos sitios, sin importar el orden de importación
+    _en_sitio(ve, "operaciones.editar_activo('V1', {'marca': 'DESDE VE'})")
+    time.sleep(0.05)
+    _en_sitio(co, "operaciones.editar_activo('V1', {'marca': 'DESDE CO'})")
+    # Borrado remoto: COLOMBIA elimina un activo que VENEZUELA no tocó
+    _en_sitio(co, "operaciones.eliminar_activo('V2')")
+    _sincronizar(ve, co, tmp_path, 2)
+    assert _activos(ve) == _activos(co) == [("V1", "VENEZUELA", "PATIO", "DESDE CO")]
+
+    # El archivo ya confirmado no se vuelve a enviar: el paquete siguiente solo lleva cambios
+    paquete = _sincronizar(ve, co, tmp_path, 3)
+    with zipfile.ZipFile(paquete) as zf:
+        assert json.loads(zf.read("manifiesto.json"))["incluidos"] == []
+    assert _activos(ve) == _activos(co)
+
+def test_rechaza_rutas_fuera_del_almacen(sitios, tmp_path):
+    ve, co = sitios
+    sha = "0" * 64
+    paquete = tmp_path / "malicioso.zip"
+    with zipfile.ZipFile(paquete, "w") as zf:
+        zf.writestr("cambios.jsonl", "")
+        zf.writestr("blobs/../../fuera.txt", b"x")
+        zf.writestr("manifiesto.json", json.dumps({
+            "version": 1, "origen": "VENEZUELA", "destino": "COLOMBIA", "desde": 0, "hasta": 0, "cambios": 0,
+            "blobs": {"../../fuera.txt": [sha, 1]}, "incluidos": ["../../fuera.txt"], "acuse": {"recibido": 0, "faltantes": []}}))
+    salida = _en_sitio(co, f"""try: sincronizacion.importar({str(paquete)!r})
+except ValueError as e: print(e)""")
+    assert "rutas no válidas" in salida
+    assert not os.path.exists(tmp_path / "fuera.txt") and not os.path.exists(tmp_path.parent / "fuera.txt")